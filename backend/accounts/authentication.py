@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from notes.cache import KEY_PREFIX, call_cache_bound, get_cache, record
+
+from .revocation import ais_token_revoked, is_token_revoked
+
+
+# cache_stats() resource name for the hit/miss counters
+USER_CACHE_RESOURCE = "auth_users"
+
+# The columns kept in the cache. The rest of the row (the password hash
+# included) stays out of it and is loaded only if a view reads it.
+CACHED_USER_FIELDS = ("id", "username", "email", "is_active", "is_staff")
+
+
+def user_cache_timeout() -> int:
+    return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 60)
+
+
+def record_user_cache(outcome: str) -> None:
+    # Two cache round trips per request, so only when asked for
+    if getattr(settings, "AUTH_USER_CACHE_STATS", False):
+        record(USER_CACHE_RESOURCE, outcome)
+
+
+def user_cache_key(user_id) -> str:
+    # "fields": entries are CACHED_USER_FIELDS dicts, no longer pickled User rows
+    return f"{KEY_PREFIX}:auth:user:fields:{user_id}"
+
+
+def forget_cached_user(user_id) -> None:
+    get_cache().delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the token's user (CACHED_USER_FIELDS only)
+    in the API cache for AUTH_USER_CACHE_TIMEOUT seconds instead of selecting
+    it on every request.
+
+    Saving or deleting a user drops its entry (see accounts.signals), so
+    deactivation and password changes apply immediately with a shared cache;
+    with the per-process default cache the timeout bounds how long other
+    workers may keep using the old copy. The active and password-change checks
+    run against the cached copy on every request, as JWTAuthentication does.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        # Access tokens revoked by logout; a Bloom filter lookup, no query
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_("Token is blacklisted"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        timeout = user_cache_timeout()
+        if timeout <= 0:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cache = get_cache()
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            record_user_cache("miss")
+            # Runs the lookup and the checks; failures are not cached
+            user = super().get_user(validated_token)
+            cache.set(key, self.cache_entry(user), timeout=timeout)
+            return user
+
+        record_user_cache("hit")
+        return self.cached_user(entry, validated_token)
+
+    def cache_entry(self, user) -> dict:
+        entry = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # The digest the tokens already carry, not the hash itself
+            entry["password_digest"] = get_md5_hash_password(user.password)
+        return entry
+
+    def cached_user(self, entry, validated_token):
+        """The user behind a cache entry, checked; fields that weren't cached load on first access."""
+        self.check_user(entry, validated_token)
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model),
+            CACHED_USER_FIELDS,
+            [entry[field] for field in CACHED_USER_FIELDS],
+        )
+
+    def check_user(self, entry, validated_token) -> None:
+        """JWTAuthentication.get_user()'s checks, against a cache entry."""
+        if api_settings.CHECK_USER_IS_ACTIVE and not entry["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry.get("password_digest"):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, with no thread hop when the user is cached."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        # JWTAuthentication's checks only; the revocation lookup may need a query
+        validated_token = super(CachedJWTAuthentication, self).get_validated_token(raw_token)
+        if await ais_token_revoked(validated_token):
+            raise InvalidToken(_("Token is blacklisted"))
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        timeout = user_cache_timeout()
+        cache = get_cache()
+        key = user_cache_key(user_id)
+        entry = await call_cache_bound(cache, cache.get, key) if timeout > 0 else None
+        if entry is not None:
+            await call_cache_bound(cache, record_user_cache, "hit")
+            return self.cached_user(entry, validated_token)
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        entry = self.cache_entry(user)
+        self.check_user(entry, validated_token)
+        if timeout > 0:
+            await call_cache_bound(cache, record_user_cache, "miss")
+            await call_cache_bound(cache, cache.set, key, entry, timeout=timeout)
+        return user
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+
+User = get_user_model()
+
+
+def users_matching(field, value):
+    """
+    Users whose ``field`` equals ``value`` ignoring case. Compares
+    ``LOWER(field)`` so the lookup uses the functional indexes added by
+    accounts/migrations/0001 (``__iexact`` compiles to ``LIKE`` on SQLite and
+    ``UPPER()`` on PostgreSQL, neither of which can use them).
+    """
+    return User._default_manager.alias(**{f"{field}_lower": Lower(field)}).filter(
+        **{f"{field}_lower": Lower(Value(value))}
+    )
+
+
+def get_login_user(email):
+    return users_matching("email", email).order_by("pk").first()
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """ModelBackend that also accepts ``email=`` and finds the user in a single query."""
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        if email is None or username is not None:
+            return super().authenticate(request, username=username, password=password, **kwargs)
+        if password is None:
+            return None
+        user = get_login_user(email)
+        if user is None:
+            # Hash anyway so response times don't reveal which emails are registered
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
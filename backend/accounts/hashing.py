@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HashingBusy(Exception):
+    """Raised instead of queueing when PASSWORD_HASHING_MAX_PENDING jobs are already waiting."""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            # Threads are enough: bcrypt, hashlib's PBKDF2/scrypt and argon2 release the GIL
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "PASSWORD_HASHING_WORKERS", 4),
+                thread_name_prefix="password-hashing",
+            )
+            _slots = threading.BoundedSemaphore(getattr(settings, "PASSWORD_HASHING_MAX_PENDING", 64))
+        return _executor, _slots
+
+
+async def run_hashing(func, *args):
+    """
+    Run ``func(*args)`` on the bounded hashing pool without blocking the event
+    loop. Running plus queued jobs are capped, so a login storm is turned away
+    with HashingBusy (a 503) instead of piling up unbounded latency.
+    """
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # Freed when the job ends, not when the caller stops waiting: a cancelled
+    # request's hash keeps running (and counting) until it is done
+    future.add_done_callback(lambda _: slots.release())
+    return await asyncio.wrap_future(future)
+
+
+def _verify(raw_password, encoded):
+    if encoded is None:
+        # Unknown user: hash anyway so timing doesn't reveal which accounts exist
+        make_password(raw_password)
+        return False, None
+    rehashed = []
+    # Django calls the setter when the hash was made with an outdated hasher or parameters
+    is_correct = check_password(raw_password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return is_correct, rehashed[0] if rehashed else None
+
+
+async def ahash_password(raw_password) -> str:
+    return await run_hashing(make_password, raw_password)
+
+
+async def averify_password(raw_password, encoded):
+    """
+    Check ``raw_password`` against ``encoded`` (None for an unknown user).
+    Returns ``(is_correct, new_encoded)``; ``new_encoded`` is set when the
+    stored hash should be upgraded to the current PASSWORD_HASHERS settings.
+    """
+    return await run_hashing(_verify, raw_password, encoded)
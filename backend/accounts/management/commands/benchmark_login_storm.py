@@ -0,0 +1,138 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from notes.models import Note
+from notes_backend.throttling import SlidingWindowRateThrottle
+
+
+PASSWORD = "Bench-Password-123!"
+
+
+async def asgi_request(app, method, path, body=b"", headers=()):
+    """Send one HTTP request straight to the ASGI application; returns the status code."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+        "client": ("127.0.0.1", 40000),
+        "server": ("localhost", 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client never disconnects; Django cancels this once the response is sent
+        await asyncio.Event().wait()
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure GET /api/notes/ latency under ASGI while a storm of logins hits the "
+        "sync login view, then the async one. Creates a temporary user and removes it afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=16, help="Concurrent clients logging in")
+        parser.add_argument("--requests", type=int, default=60, help="Note-list requests per scenario")
+        parser.add_argument("--workers", type=int, default=2, help="PASSWORD_HASHING_WORKERS for the async view")
+        parser.add_argument("--notes", type=int, default=20)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.create_user(
+            username=f"bench-{uuid.uuid4().hex[:12]}", email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password=PASSWORD
+        )
+        try:
+            Note.objects.bulk_create([
+                Note(user=user, title=f"Bench note {i}", content="Lorem ipsum " * 50) for i in range(options["notes"])
+            ])
+            # Throttles would turn the storm into 429s; this measures the hashing itself
+            with patch.object(SlidingWindowRateThrottle, "allow_request", return_value=True), \
+                    override_settings(PASSWORD_HASHING_WORKERS=options["workers"]):
+                self.run(user, options)
+        finally:
+            user.delete()
+
+    def run(self, user, options):
+        app = get_asgi_application()
+        access = str(RefreshToken.for_user(user).access_token)
+        login_body = json.dumps({"email": user.email, "password": PASSWORD}).encode()
+
+        self.stdout.write(
+            f"{'scenario':<14} {'list p50 ms':>12} {'p95':>8} {'max':>8} {'logins/s':>9} {'rejected':>9}"
+        )
+        for name, login_path in (("idle", None), ("sync login", "/api/auth/login/"), ("async login", "/api/auth/login/async/")):
+            latencies, logins, rejected, elapsed = asyncio.run(
+                self.scenario(app, access, login_path, login_body, options)
+            )
+            self.stdout.write(
+                f"{name:<14} {statistics.median(latencies):>12.1f} "
+                f"{statistics.quantiles(latencies, n=20)[-1]:>8.1f} {max(latencies):>8.1f} "
+                f"{logins / elapsed:>9.1f} {rejected:>9}"
+            )
+
+    async def scenario(self, app, access, login_path, login_body, options):
+        stop = asyncio.Event()
+        counts = {"ok": 0, "rejected": 0}
+
+        async def storm():
+            while not stop.is_set():
+                status = await asgi_request(app, "POST", login_path, login_body)
+                if status == 200:
+                    counts["ok"] += 1
+                else:
+                    counts["rejected"] += 1
+                    # Honour the 503's Retry-After, scaled down
+                    await asyncio.sleep(0.05)
+
+        clients = [asyncio.create_task(storm()) for _ in range(options["clients"] if login_path else 0)]
+        started = time.perf_counter()
+        # Let the storm build up before measuring
+        await asyncio.sleep(0.5 if clients else 0)
+        latencies = []
+        headers = [(b"authorization", f"Bearer {access}".encode())]
+        for _ in range(options["requests"]):
+            t0 = time.perf_counter()
+            status = await asgi_request(app, "GET", "/api/notes/", headers=headers)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if status != 200:
+                raise RuntimeError(f"GET /api/notes/ returned {status}")
+        stop.set()
+        await asyncio.gather(*clients)
+        return latencies, counts["ok"], counts["rejected"], time.perf_counter() - started
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.revocation import prune_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete revoked tokens that have expired anyway (kept at most REFRESH_TOKEN_LIFETIME)."
+
+    def handle(self, *args, **options):
+        deleted = prune_revoked_tokens()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} revoked tokens"))
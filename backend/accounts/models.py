@@ -1,3 +1,14 @@
 from django.db import models
 
+
+class RevokedToken(models.Model):
+    """A revoked JWT (logout, or a refresh token replaced by rotation), until it would have expired anyway."""
+
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f"RevokedToken({self.jti})"
+
 # Create your models here.
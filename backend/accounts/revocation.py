@@ -0,0 +1,158 @@
+import hashlib
+import math
+import threading
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from notes.cache import KEY_PREFIX, call_cache_bound, get_cache
+from notes_backend.querybudget import unaudited
+
+from .models import RevokedToken
+
+
+VERSION_KEY = f"{KEY_PREFIX}:auth:revocations"
+
+# Revocations committed this long before the previous sync are re-read, so
+# rows from transactions that were still open then aren't missed
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """Fixed-size set of strings without false negatives; ``in`` may rarely say yes wrongly."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationStore:
+    """
+    Per-process Bloom filter over the RevokedToken table. A token that isn't
+    in the filter is certainly not revoked, which is the common case and costs
+    no query; a filter hit is confirmed against the table.
+
+    Revocations bump a version in the API cache. Other processes pick the new
+    rows up on their next check when the cache is shared, and within
+    TOKEN_REVOCATION_SYNC_INTERVAL seconds otherwise. The filter is rebuilt
+    from scratch every TOKEN_REVOCATION_REBUILD_INTERVAL seconds, which also
+    drops pruned tokens from it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.version = None
+        self.synced_at = None
+        self.checked_at = self.built_at = 0.0
+
+    def reset(self) -> None:
+        with self.lock:
+            self.filter = None
+
+    def rebuild_due(self, now) -> bool:
+        return self.filter is None or now - self.built_at > getattr(settings, "TOKEN_REVOCATION_REBUILD_INTERVAL", 3600)
+
+    def sync_due(self, version, now) -> bool:
+        if self.rebuild_due(now) or version != self.version:
+            return True
+        return now - self.checked_at > getattr(settings, "TOKEN_REVOCATION_SYNC_INTERVAL", 5)
+
+    def sync(self) -> None:
+        now = time.monotonic()
+        version = get_cache().get(VERSION_KEY)
+        if not self.sync_due(version, now):
+            return
+        rebuild = self.rebuild_due(now)
+        # A rebuild is per-process (and hourly) upkeep, not the cost of the request
+        # that triggers it; the periodic sync is part of the views' query budgets
+        with self.lock, unaudited() if rebuild else nullcontext():
+            started = timezone.now()
+            if rebuild:
+                revoked = RevokedToken.objects.filter(expires_at__gt=started)
+                capacity = getattr(settings, "TOKEN_REVOCATION_BLOOM_CAPACITY", 100_000)
+                bloom = BloomFilter(max(capacity, 2 * revoked.count()))
+                self.built_at = now
+            else:
+                revoked = RevokedToken.objects.filter(revoked_at__gte=self.synced_at - SYNC_OVERLAP)
+                bloom = self.filter
+            for jti in revoked.values_list("jti", flat=True).iterator():
+                bloom.add(jti)
+            self.filter, self.version, self.synced_at, self.checked_at = bloom, version, started, now
+
+    def is_revoked(self, jti) -> bool:
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    async def ais_revoked(self, jti) -> bool:
+        """is_revoked() for async views: queries only when a sync is due or the filter matches."""
+        cache = get_cache()
+        if self.sync_due(await call_cache_bound(cache, cache.get, VERSION_KEY), time.monotonic()):
+            await sync_to_async(self.sync)()
+        if jti not in self.filter:
+            return False
+        return await RevokedToken.objects.filter(jti=jti).aexists()
+
+    def revoke(self, jti, expires_at) -> None:
+        RevokedToken.objects.get_or_create(jti=jti, defaults={"expires_at": expires_at})
+        self.sync()
+        with self.lock:
+            self.filter.add(jti)
+        _bump_version()
+        # Again once the row is visible to the other processes' sync
+        transaction.on_commit(_bump_version)
+
+
+def _bump_version() -> None:
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+revocations = RevocationStore()
+
+
+def revoke_token(token) -> None:
+    revocations.revoke(token[api_settings.JTI_CLAIM], datetime_from_epoch(token["exp"]))
+
+
+def is_token_revoked(token) -> bool:
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and revocations.is_revoked(jti)
+
+
+async def ais_token_revoked(token) -> bool:
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and await revocations.ais_revoked(jti)
+
+
+def prune_revoked_tokens(now=None) -> int:
+    """Forget revoked tokens past their expiry (at most REFRESH_TOKEN_LIFETIME after revocation)."""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
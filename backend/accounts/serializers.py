@@ -1,13 +1,20 @@
-from django.contrib.auth import get_user_model
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers, exceptions
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from notes_backend.metrics import TimedSerializerMixin
+
+from .backends import users_matching
+from .tokens import RevocableRefreshToken
 
 
 User = get_user_model()
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
     # Accept a single "name" field from the frontend and map to first_name
     name = serializers.CharField(write_only=True, required=False, allow_blank=True)
@@ -27,14 +34,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         if not email:
             raise serializers.ValidationError({"email": "Email is required"})
         # Email must be unique
-        if User.objects.filter(email__iexact=email).exists():
+        if users_matching("email", email).exists():
             raise serializers.ValidationError({"email": "An account with this email already exists"})
         # Enforce unique username policy
         provided = (username or '').strip()
         if not provided:
             raise serializers.ValidationError({"username": "Username is required"})
         # Ensure provided username is unique (case-insensitive)
-        if User.objects.filter(**{f"{User.USERNAME_FIELD}__iexact": provided}).exists():
+        if users_matching(User.USERNAME_FIELD, provided).exists():
             raise serializers.ValidationError({"username": "This username is already taken"})
         attrs["username"] = provided
         # Map name → first_name if provided and first_name missing
@@ -49,8 +56,13 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop("password")
+        # Async views hash off the event loop and pass the result in save(password_hash=...)
+        encoded = validated_data.pop("password_hash", None)
         user = User(**validated_data)
-        user.set_password(password)
+        if encoded is not None:
+            user.password = encoded
+        else:
+            user.set_password(password)
         user.save()
         return user
 
@@ -65,6 +77,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 class EmailOrUsernameTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Allow login with either username or email + password."""
 
+    token_class = RevocableRefreshToken
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Make the username field optional to prevent "username required" before validate runs
@@ -75,19 +89,25 @@ class EmailOrUsernameTokenObtainPairSerializer(TokenObtainPairSerializer):
         self.fields['email'] = _s.EmailField(required=False)
 
     def validate(self, attrs):
-        # Ensure username key exists to satisfy parent serializer
-        username = attrs.get('username') or self.initial_data.get('username') or ''
-        email = (attrs.get('email') or self.initial_data.get('email') or '').strip()
+        username = attrs.get(self.username_field) or ''
+        email = (attrs.get('email') or '').strip()
+        # EmailOrUsernameBackend resolves the email itself, so the user is loaded exactly once
+        credentials = {'password': attrs['password'], 'request': self.context.get('request')}
         if email and not username:
-            user = User.objects.filter(email__iexact=email).first()
-            if user is not None:
-                # map to expected username field
-                attrs['username'] = getattr(user, User.USERNAME_FIELD, user.username)
-            else:
-                # Set an empty username so parent validate doesn't KeyError; will fail auth cleanly
-                attrs['username'] = ''
+            credentials['email'] = email
         else:
-            # Propagate username value for parent validation
-            attrs['username'] = username
-        return super().validate(attrs)
+            credentials[self.username_field] = username
+        self.user = authenticate(**credentials)
+        if not api_settings.USER_AUTHENTICATION_RULE(self.user):
+            raise exceptions.AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        refresh = self.get_token(self.user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, self.user)
+        return data
+
 
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    # Rejects revoked refresh tokens and revokes the old one on rotation
+    token_class = RevocableRefreshToken
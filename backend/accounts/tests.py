@@ -1,4 +1,22 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import asyncio
+import threading
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.authentication import user_cache_key
+from accounts.hashing import run_hashing
+from accounts.models import RevokedToken
+from accounts.revocation import VERSION_KEY, BloomFilter, prune_revoked_tokens, revocations
+from notes.cache import cache_stats
 from django.urls import reverse
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
@@ -38,4 +56,247 @@ class AuthFlowTests(TestCase):
         r = self.client.post(self.login_url, {"email": "nouser@example.com", "password": "bad"}, format='json')
         self.assertEqual(r.status_code, 401)
 
+
+class LoginQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.login_url = reverse('auth-login')
+        self.user = get_user_model().objects.create_user(username='Lena', email='Lena@Example.com', password='Password123!')
+
+    def test_login_with_email_is_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post(self.login_url, {"email": "lena@example.COM", "password": "Password123!"}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data['user'], {"id": self.user.id, "email": self.user.email, "username": "Lena"})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('LOWER("auth_user"."email")', ctx.captured_queries[0]['sql'])
+
+    def test_login_with_username_is_one_query(self):
+        with self.assertNumQueries(1):
+            r = self.client.post(self.login_url, {"username": "Lena", "password": "Password123!"}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.data['success'])
+
+    def test_wrong_password_and_inactive_user(self):
+        r = self.client.post(self.login_url, {"email": "lena@example.com", "password": "nope"}, format='json')
+        self.assertEqual(r.status_code, 401)
+        self.user.is_active = False
+        self.user.save()
+        r = self.client.post(self.login_url, {"email": "lena@example.com", "password": "Password123!"}, format='json')
+        self.assertEqual(r.status_code, 401)
+
+    def test_user_save_does_not_touch_profile(self):
+        self.user.first_name = "Lena"
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertFalse([q for q in ctx.captured_queries if "notes_userprofile" in q['sql']])
+
+    def test_case_insensitive_lookups_use_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN SELECT id FROM auth_user WHERE LOWER(email) = LOWER(%s)", ["x@example.com"])
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("auth_user_email_lower_idx", plan)
+        r = self.client.post(reverse('auth-register'), {"email": "LENA@example.com", "username": "other", "password": "Password123!"}, format='json')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.post(reverse('auth-register'), {"email": "new@example.com", "username": "LENA", "password": "Password123!"}, format='json')
+        self.assertEqual(r.status_code, 400)
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.verify_url = reverse('auth-verify')
+        self.user = get_user_model().objects.create_user(username='mira', email='mira@example.com', password='Password123!')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def user_selects(self, ctx):
+        return [q for q in ctx.captured_queries if 'FROM "auth_user"' in q['sql']]
+
+    @override_settings(AUTH_USER_CACHE_STATS=True)
+    def test_user_loaded_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(3):
+                self.assertEqual(self.client.get(self.verify_url).status_code, 200)
+        self.assertEqual(len(self.user_selects(ctx)), 1)
+        self.assertEqual(cache_stats()["auth_users"], {"hits": 2, "misses": 1, "hit_ratio": 0.6667})
+
+    def test_cache_holds_no_password_hash(self):
+        self.client.get(self.verify_url)
+        entry = cache.get(user_cache_key(self.user.pk))
+        self.assertEqual(set(entry), {"id", "username", "email", "is_active", "is_staff"})
+        self.assertNotIn(self.user.password, repr(entry))
+        # Stats are opt-in
+        self.assertEqual(cache_stats()["auth_users"]["misses"], 0)
+
+    def test_deactivation_applies_immediately(self):
+        self.client.get(self.verify_url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.verify_url).status_code, 401)
+
+    def test_profile_change_reloads_user(self):
+        self.client.get(self.verify_url)
+        self.user.email = "mira@new.example.com"
+        self.user.save()
+        self.assertEqual(self.client.get(self.verify_url).data['user']['email'], "mira@new.example.com")
+
+    def test_cached_copy_is_still_checked(self):
+        self.client.get(self.verify_url)
+        # A copy cached before a deactivation this process didn't see
+        stale = cache.get(user_cache_key(self.user.pk))
+        cache.set(user_cache_key(self.user.pk), {**stale, "is_active": False})
+        self.assertEqual(self.client.get(self.verify_url).status_code, 401)
+
+    def test_timeout_zero_disables_cache(self):
+        with self.settings(AUTH_USER_CACHE_TIMEOUT=0):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(self.verify_url)
+                self.client.get(self.verify_url)
+        self.assertEqual(len(self.user_selects(ctx)), 2)
+
+class AsyncAuthViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = AsyncClient()
+        self.user = get_user_model().objects.create_user(username='nora', email='nora@example.com', password='Password123!')
+
+    async def login(self, **data):
+        return await self.client.post(reverse('auth-login-async'), data, content_type='application/json')
+
+    async def test_login_matches_sync_contract(self):
+        r = await self.login(email="NORA@example.com", password="Password123!")
+        self.assertEqual(r.status_code, 200)
+        body = r.json()
+        self.assertTrue(body['success'])
+        self.assertEqual(body['user'], {"id": self.user.id, "email": "nora@example.com", "username": "nora"})
+        self.assertEqual(set(body), {"access", "refresh", "success", "user"})
+        r = await self.client.get(reverse('auth-verify'), headers={"Authorization": f"Bearer {body['access']}"})
+        self.assertEqual(r.status_code, 200)
+
+        r = await self.login(username="nora", password="Password123!")
+        self.assertEqual(r.status_code, 200)
+
+    async def test_login_errors(self):
+        r = await self.login(email="nora@example.com", password="wrong")
+        self.assertEqual(r.status_code, 401)
+        self.assertIn("WWW-Authenticate", r.headers)
+        self.assertEqual(r.json()['detail'], "No active account found with the given credentials")
+        r = await self.login(email="nobody@example.com", password="Password123!")
+        self.assertEqual(r.status_code, 401)
+        r = await self.login(email="nora@example.com")
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("password", r.json())
+
+    async def test_register(self):
+        payload = {"email": "omar@example.com", "username": "omar", "password": "Password123!", "name": "Omar"}
+        r = await self.client.post(reverse('auth-register-async'), payload, content_type='application/json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()['username'], "omar")
+        user = await get_user_model().objects.aget(username="omar")
+        self.assertTrue(user.password.startswith("bcrypt_sha256$"))
+        self.assertEqual(user.first_name, "Omar")
+        r = await self.client.post(reverse('auth-register-async'), payload, content_type='application/json')
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("username", r.json())
+
+    async def test_rehash_on_login(self):
+        self.user.password = make_password("Password123!", hasher="pbkdf2_sha256")
+        await self.user.asave()
+        r = await self.login(email="nora@example.com", password="Password123!")
+        self.assertEqual(r.status_code, 200)
+        await self.user.arefresh_from_db()
+        self.assertTrue(self.user.password.startswith("bcrypt_sha256$"))
+        self.assertTrue(self.user.check_password("Password123!"))
+
+    async def test_backpressure(self):
+        with patch("accounts.hashing._pool", return_value=(None, threading.BoundedSemaphore(1))) as pool:
+            pool.return_value[1].acquire()
+            r = await self.login(email="nora@example.com", password="Password123!")
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(r.headers["Retry-After"], "1")
+
+    async def test_cancelled_hash_keeps_its_slot(self):
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            finish.wait(5)
+
+        executor, slots = ThreadPoolExecutor(max_workers=1), threading.BoundedSemaphore(1)
+        with patch("accounts.hashing._pool", return_value=(executor, slots)):
+            task = asyncio.ensure_future(run_hashing(slow_hash))
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        # The thread is still hashing, so the slot is still taken
+        self.assertFalse(slots.acquire(blocking=False))
+        finish.set()
+        executor.shutdown(wait=True)
+        self.assertTrue(slots.acquire(blocking=False))
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        revocations.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='pam', email='pam@example.com', password='Password123!')
+        r = self.client.post(reverse('auth-login'), {"email": "pam@example.com", "password": "Password123!"}, format='json')
+        self.access, self.refresh = r.data['access'], r.data['refresh']
+
+    def revocation_queries(self, ctx):
+        return [q for q in ctx.captured_queries if "accounts_revokedtoken" in q['sql']]
+
+    def test_refresh_rotates_and_revokes_old_token(self):
+        revocations.sync()
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post(reverse('auth-refresh'), {"refresh": self.refresh}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r.data['refresh'], self.refresh)
+        # Only the revocation of the old token; checking it was a filter miss
+        self.assertFalse([q for q in self.revocation_queries(ctx) if q['sql'].startswith('SELECT 1')])
+
+        r2 = self.client.post(reverse('auth-refresh'), {"refresh": self.refresh}, format='json')
+        self.assertEqual(r2.status_code, 401)
+        self.assertEqual(self.client.post(reverse('auth-refresh'), {"refresh": r.data['refresh']}, format='json').status_code, 200)
+
+    def test_logout_revokes_refresh_and_access_tokens(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        self.assertEqual(self.client.get(reverse('auth-verify')).status_code, 200)
+        r = self.client.post(reverse('auth-logout'), {"refresh": self.refresh}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+        self.assertEqual(self.client.get(reverse('auth-verify')).status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.post(reverse('auth-refresh'), {"refresh": self.refresh}, format='json').status_code, 401)
+
+    def test_other_process_revocation_is_seen(self):
+        revocations.sync()
+        jti = RefreshToken(self.refresh)['jti']
+        # Written by another worker: picked up once the shared version changes
+        RevokedToken.objects.create(jti=jti, expires_at=timezone.now() + timedelta(days=1))
+        self.assertFalse(revocations.is_revoked(jti))
+        cache.set(VERSION_KEY, 1)
+        self.assertTrue(revocations.is_revoked(jti))
+
+        RevokedToken.objects.create(jti="unannounced", expires_at=timezone.now() + timedelta(days=1))
+        # ... or after TOKEN_REVOCATION_SYNC_INTERVAL without a shared cache
+        with self.settings(TOKEN_REVOCATION_SYNC_INTERVAL=-1):
+            self.assertTrue(revocations.is_revoked("unannounced"))
+
+    def test_prune_expired(self):
+        RevokedToken.objects.create(jti="old", expires_at=timezone.now() - timedelta(minutes=1))
+        RevokedToken.objects.create(jti="live", expires_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(prune_revoked_tokens(), 1)
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), ["live"])
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        self.assertTrue(all(f"jti-{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 50)
+
 # Create your tests here.
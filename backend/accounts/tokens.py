@@ -0,0 +1,26 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import is_token_revoked, revoke_token
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    RefreshToken checked against accounts.revocation. Provides the
+    ``blacklist()``/``outstand()`` hooks simplejwt calls on logout and refresh
+    rotation, which the token_blacklist app would otherwise provide.
+    """
+
+    def verify(self, *args, **kwargs) -> None:
+        super().verify(*args, **kwargs)
+        # After the signature and expiry checks, so garbage tokens cost nothing
+        if is_token_revoked(self):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self) -> None:
+        revoke_token(self)
+
+    def outstand(self) -> None:
+        # Only revoked tokens are stored, not every issued one
+        return None
@@ -1,11 +1,22 @@
 from django.urls import path
 
-from .views import RegisterView, LoginView, RefreshTokenView, VerifyTokenView, LogoutView
+from .views import (
+    AsyncLoginView,
+    AsyncRegisterView,
+    LoginView,
+    LogoutView,
+    RefreshTokenView,
+    RegisterView,
+    VerifyTokenView,
+)
 
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='auth-register'),
     path('login/', LoginView.as_view(), name='auth-login'),
+    # Same contract, hashing off the event loop; for ASGI deployments
+    path('register/async/', AsyncRegisterView.as_view(), name='auth-register-async'),
+    path('login/async/', AsyncLoginView.as_view(), name='auth-login-async'),
     path('refresh/', RefreshTokenView.as_view(), name='auth-refresh'),
     path('verify/', VerifyTokenView.as_view(), name='auth-verify'),
     path('logout/', LogoutView.as_view(), name='auth-logout'),
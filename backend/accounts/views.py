@@ -1,11 +1,44 @@
-from rest_framework import generics, permissions
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model, user_login_failed
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import update_last_login
+from django.http import JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import APIException, AuthenticationFailed, Throttled
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings as drf_settings
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.throttling import ScopedRateThrottle
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import Token
 
-from .serializers import RegisterSerializer, EmailOrUsernameTokenObtainPairSerializer
+from notes_backend.async_api import error_response
+from notes_backend.throttling import ScopedRateThrottle
+
+from .backends import get_login_user
+from .hashing import HashingBusy, ahash_password, averify_password
+from .revocation import revoke_token
+from .serializers import RegisterSerializer, EmailOrUsernameTokenObtainPairSerializer, RevocableTokenRefreshSerializer
+from .tokens import RevocableRefreshToken
+
+
+User = get_user_model()
+
+
+def login_payload(tokens, user):
+    payload = dict(tokens)
+    payload['success'] = True
+    payload['user'] = {
+        'id': user.id,
+        'email': user.email,
+        'username': user.username,
+    }
+    return payload
 
 
 class RegisterView(generics.CreateAPIView):
@@ -20,38 +53,113 @@ class LoginView(TokenObtainPairView):
     serializer_class = EmailOrUsernameTokenObtainPairSerializer
     throttle_classes = (ScopedRateThrottle,)
     throttle_scope = 'auth'
+    # User lookup and the last_login update (see QueryAuditMiddleware)
+    query_budget = {"post": 2}
 
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        # On success (200), append a success indicator and basic user info
-        if response.status_code == 200:
-            try:
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                email = request.data.get('email')
-                username = request.data.get('username')
-                user = None
-                if email:
-                    user = User.objects.filter(email__iexact=email).first()
-                if user is None and username:
-                    user = User.objects.filter(username__iexact=username).first()
-                payload = response.data
-                payload['success'] = True
-                if user is not None:
-                    payload['user'] = {
-                        'id': user.id,
-                        'email': user.email,
-                        'username': user.username,
-                    }
-                response.data = payload
-            except Exception:
-                # If anything goes wrong, still return the original successful tokens
-                pass
-        return response
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0]) from e
+        # Reuse the authenticated user instead of looking it up again
+        return Response(login_payload(serializer.validated_data, serializer.user), status=status.HTTP_200_OK)
+
+
+class AsyncAuthView(View):
+    """
+    Base for the async register/login endpoints (for ASGI deployments): DRF
+    parsing, the 'auth' scoped throttle and DRF-shaped error responses around
+    an async ``handle()``. Password hashing runs on the bounded pool in
+    accounts.hashing, so a burst of sign-ins neither blocks the event loop nor
+    occupies the threads that serve sync views such as the notes API.
+    """
+
+    http_method_names = ['post', 'options']
+    throttle_scope = 'auth'
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Token endpoints, like DRF's APIView: no session, so no CSRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def initial(self, request):
+        drf_request = Request(request, parsers=[parser() for parser in drf_settings.DEFAULT_PARSER_CLASSES])
+        throttle = ScopedRateThrottle()
+        if not throttle.allow_request(drf_request, self):
+            raise Throttled(throttle.wait())
+        return drf_request.data
+
+    async def handle(self, request, data):
+        raise NotImplementedError
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = await sync_to_async(self.initial)(request)
+            return await self.handle(request, data)
+        except APIException as exc:
+            return self.error_response(exc)
+        except HashingBusy:
+            response = JsonResponse({'detail': 'Too many sign-ins in progress, please retry.'}, status=503)
+            response['Retry-After'] = '1'
+            return response
+
+    def error_response(self, exc):
+        return error_response(exc)
+
+
+class AsyncRegisterView(AsyncAuthView):
+    async def handle(self, request, data):
+        serializer = RegisterSerializer(data=data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        encoded = await ahash_password(serializer.validated_data['password'])
+        await sync_to_async(serializer.save)(password_hash=encoded)
+        return JsonResponse(serializer.data, status=201)
+
+
+def _find_login_user(email, username):
+    if email and not username:
+        return get_login_user(email)
+    # The lookup ModelBackend does for username logins
+    return User._default_manager.filter(**{User.USERNAME_FIELD: username}).first()
+
+
+class AsyncLoginView(AsyncAuthView):
+    serializer_class = EmailOrUsernameTokenObtainPairSerializer
+    query_budget = LoginView.query_budget
+
+    async def handle(self, request, data):
+        serializer = self.serializer_class(data=data, context={'request': request})
+        # Field checks only: validate() would authenticate (and hash) synchronously
+        attrs = serializer.to_internal_value(data)
+        username = attrs.get(serializer.username_field) or ''
+        email = (attrs.get('email') or '').strip()
+
+        user = await sync_to_async(_find_login_user)(email, username)
+        is_correct, rehashed = await averify_password(attrs['password'], user.password if user else None)
+        if not is_correct or not ModelBackend().user_can_authenticate(user):
+            user = None
+        if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            await user_login_failed.asend(
+                sender=__name__, credentials={'email': email} if email and not username else {'username': username},
+                request=request,
+            )
+            raise AuthenticationFailed(serializer.error_messages['no_active_account'], 'no_active_account')
+
+        if rehashed:
+            # The hasher or its parameters changed since this password was stored
+            user.password = rehashed
+            await user.asave(update_fields=['password'])
+        refresh = await sync_to_async(serializer.get_token)(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            await sync_to_async(update_last_login)(None, user)
+        tokens = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        return JsonResponse(login_payload(tokens, user))
 
 
 class RefreshTokenView(TokenRefreshView):
     permission_classes = (permissions.AllowAny,)
+    serializer_class = RevocableTokenRefreshSerializer
 
 
 class VerifyTokenView(APIView):
@@ -68,11 +176,11 @@ class LogoutView(APIView):
         refresh_token = request.data.get("refresh")
         if refresh_token:
             try:
-                token = RefreshToken(refresh_token)
-                token.blacklist()
-            except Exception:
+                RevocableRefreshToken(refresh_token).blacklist()
+            except TokenError:
+                # Expired, malformed or already revoked: nothing left to revoke
                 pass
+        # The access token used for this request stops working too
+        if isinstance(request.auth, Token):
+            revoke_token(request.auth)
         return Response({"detail": "Logged out"})
-from django.shortcuts import render
-
-# Create your views here.
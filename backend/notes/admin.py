@@ -11,7 +11,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "color", "created_at")
+    list_display = ("id", "name", "color", "usage_count", "created_at")
     search_fields = ("name",)
 
 
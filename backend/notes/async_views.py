@@ -0,0 +1,167 @@
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from rest_framework import exceptions
+
+from notes_backend.async_api import AsyncAPIView
+from notes_backend.metrics import timed
+from notes_backend.replicas import get_sticky_cache, mark_sticky
+
+from .cache import call_cache_bound
+from .fastlist import atags_by_note, datetime_renderer, fast_list_enabled, note_values, serialize_note_rows
+from .models import Note, Tag
+from .pagination import NotePagination, TagPagination
+from .search import get_search_backend, get_search_snippets, search_notes
+from .serializers import NoteSerializer
+from .views import NoteOrderingFilter, NoteViewSet, TagViewSet
+
+
+async def apaginate(request, queryset, pagination_class):
+    """
+    PageNumberPagination.paginate_queryset() with the async ORM: returns the
+    paginator (for ``get_paginated_response()``) and the page's rows.
+    """
+    pagination = pagination_class()
+    pagination.request = request
+    # A range stands in for the queryset, so the Paginator has nothing to query
+    paginator = pagination.django_paginator_class(range(await queryset.acount()), pagination.get_page_size(request))
+    number = pagination.get_page_number(request, paginator)
+    try:
+        pagination.page = paginator.page(number)
+    except InvalidPage as exc:
+        raise exceptions.NotFound(pagination.invalid_page_message.format(page_number=number, message=str(exc)))
+    window = pagination.page.object_list
+    return pagination, [row async for row in queryset[window.start:window.stop]]
+
+
+def save_serializer(serializer, **kwargs):
+    # Validation may look tags up and save() runs the signal handlers: one thread hop for both
+    serializer.is_valid(raise_exception=True)
+    serializer.save(**kwargs)
+    return serializer.data
+
+
+class AsyncNoteMixin:
+    permission_classes = NoteViewSet.permission_classes
+    throttle_scope = NoteViewSet.throttle_scope
+
+    def can_serve(self, request) -> bool:
+        return fast_list_enabled() and super().can_serve(request)
+
+    def get_serializer_context(self, request):
+        return {"request": request, "view": self}
+
+    async def get_note(self, pk):
+        try:
+            return await Note.objects.select_related("user").aget(pk=pk)
+        except Note.DoesNotExist:
+            raise exceptions.NotFound("No Note matches the given query.")
+
+    async def render_notes(self, rows, query=None, backend=None):
+        ids = [row["id"] for row in rows]
+        snippets = await sync_to_async(get_search_snippets)(ids, query, backend) if query else None
+        tags = await atags_by_note(ids)
+        with timed("serialize"):
+            return serialize_note_rows(rows, snippets=snippets, tags=tags)
+
+    async def saved(self, request, serializer, status, **kwargs):
+        data = await sync_to_async(save_serializer)(serializer, **kwargs)
+        await call_cache_bound(get_sticky_cache(), mark_sticky, request.user)
+        return data, status
+
+
+class AsyncNoteListView(AsyncNoteMixin, AsyncAPIView):
+    """
+    GET/POST /api/notes/ for ASGI deployments (NOTES_ASYNC_API). The list
+    supports ``page``, ``page_size``, ``ordering`` and ``q``; other parameters
+    (filters, ?search=, cursor pagination, sparse fieldsets) are served by
+    NoteViewSet. Lists aren't read from the response cache.
+    """
+
+    http_method_names = ["get", "post", "options"]
+    list_params = {"page", "page_size", "ordering", "q"}
+    ordering_fields = NoteViewSet.ordering_fields
+    ordering = NoteViewSet.ordering
+    query_budget = {"get": NoteViewSet.query_budget["list"]}
+    fallback = staticmethod(NoteViewSet.as_view({"get": "list", "post": "create"}, basename="notes", detail=False))
+
+    def can_serve(self, request) -> bool:
+        return set(request.GET) <= self.list_params and super().can_serve(request)
+
+    async def get(self, request):
+        # NoteOrderingFilter reads the query from the view's request
+        self.request = request
+        query = request.query_params.get("q")
+        queryset = Note.objects.all()
+        backend = None
+        if query:
+            # Detecting the backend may introspect the database (once per process)
+            backend = await sync_to_async(get_search_backend)()
+            queryset = search_notes(queryset, query, backend=backend)
+        queryset = note_values(NoteOrderingFilter().filter_queryset(request, queryset, self))
+        pagination, rows = await apaginate(request, queryset, NotePagination)
+        results = await self.render_notes(rows, query, backend)
+        return pagination.get_paginated_response(results).data, 200
+
+    async def post(self, request):
+        serializer = NoteSerializer(data=request.data, context=self.get_serializer_context(request))
+        return await self.saved(request, serializer, 201, user=request.user)
+
+
+class AsyncNoteDetailView(AsyncNoteMixin, AsyncAPIView):
+    """GET/PUT/PATCH/DELETE /api/notes/<id>/ for ASGI deployments (NOTES_ASYNC_API)."""
+
+    http_method_names = ["get", "put", "patch", "delete", "options"]
+    query_budget = {"get": NoteViewSet.query_budget["retrieve"]}
+    fallback = staticmethod(NoteViewSet.as_view(
+        {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"},
+        basename="notes", detail=True,
+    ))
+
+    def can_serve(self, request) -> bool:
+        return not request.GET and super().can_serve(request)
+
+    async def get(self, request, pk):
+        row = await note_values(Note.objects.filter(pk=pk)).afirst()
+        if row is None:
+            raise exceptions.NotFound("No Note matches the given query.")
+        return (await self.render_notes([row]))[0], 200
+
+    async def put(self, request, pk, partial=False):
+        note = await self.get_note(pk)
+        self.check_object_permissions(request, note)
+        serializer = NoteSerializer(note, data=request.data, partial=partial, context=self.get_serializer_context(request))
+        return await self.saved(request, serializer, 200)
+
+    async def patch(self, request, pk):
+        return await self.put(request, pk, partial=True)
+
+    async def delete(self, request, pk):
+        note = await self.get_note(pk)
+        self.check_object_permissions(request, note)
+        await note.adelete()
+        await call_cache_bound(get_sticky_cache(), mark_sticky, request.user)
+        return None, 204
+
+
+class AsyncTagListView(AsyncAPIView):
+    """GET /api/tags/ for ASGI deployments (NOTES_ASYNC_API); ?search=, ?ordering= and ?counts= go to TagViewSet."""
+
+    http_method_names = ["get", "post", "options"]
+    permission_classes = TagViewSet.permission_classes
+    fallback = staticmethod(TagViewSet.as_view({"get": "list", "post": "create"}, basename="tags", detail=False))
+
+    def can_serve(self, request) -> bool:
+        return set(request.GET) <= {"page", "page_size"} and super().can_serve(request)
+
+    async def get(self, request):
+        queryset = Tag.objects.order_by(*TagViewSet.ordering).values("id", "name", "color", "created_at")
+        paginated = TagPagination().is_requested(request)
+        if paginated:
+            pagination, rows = await apaginate(request, queryset, TagPagination)
+        else:
+            rows = [row async for row in queryset]
+        to_datetime = datetime_renderer()
+        results = [{**row, "created_at": to_datetime(row["created_at"])} for row in rows]
+        if paginated:
+            return pagination.get_paginated_response(results).data, 200
+        return results, 200
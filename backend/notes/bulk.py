@@ -0,0 +1,190 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from .cache import bump_note_versions
+from .models import Note, NoteTombstone, SyncCounter
+from .search import sync_fts_index, update_search_vectors
+from .serializers import NoteSerializer
+from .signals import batched_note_deletes
+from .tags import adjust_tag_usage, get_or_create_tags, resolve_tag_ids, tag_links
+
+
+OP_CREATE = "create"
+OP_UPDATE = "update"
+OP_DELETE = "delete"
+
+
+def refresh_derived_data(note_ids, user_ids) -> None:
+    """
+    Redo the post_save/m2m_changed maintenance for notes written with
+    bulk_create/bulk_update or raw through-table inserts, which send no signals.
+    """
+    note_ids = list(note_ids)
+    if not note_ids:
+        return
+    update_search_vectors(Note.objects.filter(pk__in=note_ids))
+    sync_fts_index(note_ids)
+    bump_note_versions(note_ids=note_ids, user_ids=user_ids)
+
+
+def _result(index, op, status_code, note_id=None, errors=None):
+    result = {"index": index, "op": op, "status": status_code}
+    if note_id is not None:
+        result["id"] = note_id
+    if errors is not None:
+        result["errors"] = errors
+    return result
+
+
+def _requested_tag_ids(operations):
+    ids = set()
+    for operation in operations:
+        tag_ids = (operation.get("data") or {}).get("tag_ids")
+        if isinstance(tag_ids, list):
+            # Malformed ids are left for the serializer to report
+            ids.update(pk for pk in tag_ids if isinstance(pk, int) and not isinstance(pk, bool))
+    return ids
+
+
+def validate_operations(view, operations):
+    """
+    Validate every operation up front. Returns ``(plan, results)`` where
+    ``results`` holds an error entry for each failing operation.
+
+    Call it in the transaction that applies the plan: the notes it reads stay
+    locked, so nothing changes them between validation and apply_operations().
+    """
+    request = view.request
+    ids = [op["id"] for op in operations if op["op"] != OP_CREATE]
+    existing = Note.objects.select_for_update().in_bulk(ids)
+    seen = set()
+    plan, errors = [], []
+    owner_check = view.get_permissions()
+    # Shared by every operation's serializer: all tag_ids are resolved with one query
+    context = view.get_serializer_context()
+    context["tag_cache"] = resolve_tag_ids(_requested_tag_ids(operations))
+
+    for index, operation in enumerate(operations):
+        op, note_id, data = operation["op"], operation.get("id"), operation.get("data") or {}
+
+        if op == OP_CREATE:
+            serializer = NoteSerializer(data=data, context=context)
+            if not serializer.is_valid():
+                errors.append(_result(index, op, status.HTTP_400_BAD_REQUEST, errors=serializer.errors))
+                continue
+            plan.append((index, op, None, serializer.validated_data))
+            continue
+
+        if note_id in seen:
+            errors.append(_result(index, op, status.HTTP_400_BAD_REQUEST, note_id,
+                                  {"id": ["Each note may appear in only one operation."]}))
+            continue
+        seen.add(note_id)
+
+        note = existing.get(note_id)
+        if note is None:
+            errors.append(_result(index, op, status.HTTP_404_NOT_FOUND, note_id, {"detail": "Not found."}))
+            continue
+        # Same object-level rules as the single-note endpoints (IsOwnerOrReadOnly)
+        if not all(permission.has_object_permission(request, view, note) for permission in owner_check):
+            errors.append(_result(index, op, status.HTTP_403_FORBIDDEN, note_id,
+                                  {"detail": "You do not have permission to perform this action."}))
+            continue
+
+        if op == OP_UPDATE:
+            serializer = NoteSerializer(note, data=data, partial=True, context=context)
+            if not serializer.is_valid():
+                errors.append(_result(index, op, status.HTTP_400_BAD_REQUEST, note_id, serializer.errors))
+                continue
+            plan.append((index, op, note, serializer.validated_data))
+        else:
+            plan.append((index, op, note, None))
+
+    return plan, errors
+
+
+@transaction.atomic
+def apply_operations(user, plan):
+    """
+    Apply a validated plan with a fixed number of statements per operation type
+    (for updates, per set of columns written).
+    """
+    Through = Note.tags.through
+    now = timezone.now()
+    # One sequence number for the whole batch: it commits atomically
+    change_seq = SyncCounter.next_value(SyncCounter.NOTES, user.pk)
+    created, updated, deleted = [], [], []
+    tag_rows, retag_note_ids = [], []
+    # tag_names of every operation are created with one INSERT
+    by_name, _ = get_or_create_tags(
+        name for _, op, _, data in plan if op != OP_DELETE for name in data.get("tag_names", ())
+    )
+
+    def operation_tags(data):
+        if "tag_names" not in data:
+            return data.get("tags")
+        return list(dict.fromkeys([*data.get("tags", []), *(by_name[name] for name in data["tag_names"])]))
+
+    # Update operations by the columns they write, so none stores a column it didn't change
+    update_fields = {}
+    for index, op, note, data in plan:
+        fields = {k: v for k, v in (data or {}).items() if k not in ("tags", "tag_names")}
+        if op == OP_CREATE:
+            note = Note(user=user, change_seq=change_seq, **fields)
+            created.append((index, note, operation_tags(data) or []))
+        elif op == OP_UPDATE:
+            for attr, value in fields.items():
+                setattr(note, attr, value)
+            # bulk_update bypasses auto_now and Note.save()
+            note.updated_at = now
+            note.change_seq = change_seq
+            updated.append((index, note, operation_tags(data)))
+            update_fields.setdefault((*sorted(fields), "updated_at", "change_seq"), []).append(note)
+        else:
+            deleted.append((index, note))
+
+    if created:
+        Note.objects.bulk_create([note for _, note, _ in created])
+        for _, note, tags in created:
+            tag_rows += [Through(note_id=note.pk, tag_id=tag.pk) for tag in tags]
+
+    if updated:
+        for columns, notes in update_fields.items():
+            Note.objects.bulk_update(notes, columns)
+        for _, note, tags in updated:
+            if tags is not None:
+                retag_note_ids.append(note.pk)
+                tag_rows += [Through(note_id=note.pk, tag_id=tag.pk) for tag in tags]
+
+    if retag_note_ids:
+        # m2m_changed isn't sent for through-table writes, so usage counts are kept here
+        adjust_tag_usage(tag_links(note_id__in=retag_note_ids), -1)
+        Through.objects.filter(note_id__in=retag_note_ids).delete()
+    if tag_rows:
+        tag_rows = list({(row.note_id, row.tag_id): row for row in tag_rows}.values())
+        Through.objects.bulk_create(tag_rows, ignore_conflicts=True)
+        adjust_tag_usage([(user.pk, row.tag_id) for row in tag_rows], +1)
+
+    if deleted:
+        doomed = [note for _, note in deleted]
+        doomed_ids = [note.pk for note in doomed]
+        # What the per-note pre/post_delete handlers do, once for the whole batch
+        adjust_tag_usage(tag_links(note_id__in=doomed_ids), -1)
+        Through.objects.filter(note_id__in=doomed_ids).delete()
+        NoteTombstone.objects.bulk_create([
+            NoteTombstone(note_id=note.pk, user_id=note.user_id, change_seq=change_seq) for note in doomed
+        ])
+        # The per-row delete signals still fire, but their handlers leave the work to this batch
+        with batched_note_deletes():
+            Note.objects.filter(pk__in=doomed_ids).delete()
+        sync_fts_index(doomed_ids)
+        bump_note_versions(note_ids=doomed_ids, user_ids={note.user_id for note in doomed})
+
+    written = [note for _, note, _ in created] + [note for _, note, _ in updated]
+    refresh_derived_data([note.pk for note in written], {note.user_id for note in written})
+
+    results = [_result(index, OP_CREATE, status.HTTP_201_CREATED, note.pk) for index, note, _ in created]
+    results += [_result(index, OP_UPDATE, status.HTTP_200_OK, note.pk) for index, note, _ in updated]
+    results += [_result(index, OP_DELETE, status.HTTP_204_NO_CONTENT, note.pk) for index, note in deleted]
+    return sorted(results, key=lambda result: result["index"])
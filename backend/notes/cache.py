@@ -0,0 +1,214 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+# Version scopes. Every cached notes response embeds the version of the data it
+# depends on, so bumping a counter makes all affected entries unreachable at once
+# (O(1) invalidation); the orphaned entries simply age out of the LRU/TTL cache.
+SCOPE_ALL_NOTES = "notes"
+SCOPE_TAGS = "tags"
+# Nested author data (username/email) rendered inside notes
+SCOPE_USERS = "users"
+# Tag usage counts, only rendered by /api/tags/?counts=...
+SCOPE_TAG_USAGE = "tag_usage"
+
+KEY_PREFIX = "api"
+
+
+def get_cache():
+    return caches[getattr(settings, "API_CACHE_ALIAS", "default")]
+
+
+async def call_cache_bound(cache, func, *args, **kwargs):
+    """
+    Call ``func``, whose only I/O is on ``cache``, from async code: inline for
+    the local-memory cache, which never blocks, and in a worker thread for
+    network caches (Django's own a-prefixed cache methods do the same).
+    """
+    if isinstance(cache, LocMemCache):
+        return func(*args, **kwargs)
+    return await sync_to_async(func)(*args, **kwargs)
+
+
+def cache_enabled() -> bool:
+    return getattr(settings, "API_RESPONSE_CACHE", True)
+
+
+def user_scope(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def note_scope(note_id) -> str:
+    return f"note:{note_id}"
+
+
+def _version_key(scope: str) -> str:
+    return f"{KEY_PREFIX}:version:{scope}"
+
+
+def _initial_version() -> int:
+    # Seed from the clock rather than 1: if a version key is ever evicted it must
+    # not restart at a value that older cached entries were stored under.
+    return time.time_ns() // 1000
+
+
+def get_versions(*scopes):
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def _bump(scopes) -> None:
+    cache = get_cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Missing key: any new value invalidates what was stored before
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def bump_versions(*scopes) -> None:
+    # Also the change markers of the conditional-request ETags (notes.conditional),
+    # so the counters advance even when the response cache is off
+    _bump(scopes)
+    if cache_enabled():
+        # Bump again once the write is visible: a concurrent reader may have cached
+        # pre-commit rows under the version bumped above.
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def bump_note_versions(note_ids=(), user_ids=()) -> None:
+    scopes = [SCOPE_ALL_NOTES]
+    scopes += [user_scope(user_id) for user_id in set(user_ids)]
+    scopes += [note_scope(note_id) for note_id in set(note_ids)]
+    bump_versions(*scopes)
+
+
+def bump_tag_versions() -> None:
+    bump_versions(SCOPE_TAGS)
+
+
+def bump_tag_usage_versions() -> None:
+    bump_versions(SCOPE_TAG_USAGE)
+
+
+def bump_user_versions() -> None:
+    bump_versions(SCOPE_USERS)
+
+
+def normalized_params(request) -> str:
+    # Order-insensitive, blank-free representation of the query string
+    items = sorted(
+        (key, sorted(value for value in values if value != ""))
+        for key, values in request.query_params.lists()
+    )
+    return "&".join(f"{key}={','.join(values)}" for key, values in items if values)
+
+
+def record(resource: str, outcome: str) -> None:
+    cache = get_cache()
+    key = f"{KEY_PREFIX}:stats:{resource}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def cache_stats(resources=("notes", "tags", "auth_users")):
+    cache = get_cache()
+    stats = {}
+    for resource in resources:
+        hits = cache.get(f"{KEY_PREFIX}:stats:{resource}:hit", 0)
+        misses = cache.get(f"{KEY_PREFIX}:stats:{resource}:miss", 0)
+        total = hits + misses
+        stats[resource] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Cache ``list``/``retrieve`` response data per user and normalized query
+    parameters, tagged with the version counters of the data they depend on.
+
+    Views set ``cache_resource`` and implement ``get_cache_scopes()``.
+    """
+
+    cache_resource = None
+
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def get_cache_timeout(self):
+        return getattr(settings, "API_RESPONSE_CACHE_TIMEOUT", 300)
+
+    def get_cache_key(self):
+        scopes = self.get_cache_scopes()
+        versions = get_versions(*scopes)
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, "")
+        raw = "|".join([
+            self.action,
+            str(lookup),
+            str(getattr(self.request.user, "pk", "")),
+            normalized_params(self.request),
+            *(f"{scope}={version}" for scope, version in zip(scopes, versions)),
+        ])
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}:entry:{self.cache_resource}:{digest}"
+
+    def get_cache_extra(self):
+        """Stored with the response data, under the same versions (e.g. its validators)."""
+        return None
+
+    def get_cache_entry(self):
+        """This request's cached ``(data, extra)``, or None; looked up once per request."""
+        if not hasattr(self, "_cache_entry"):
+            self._cache_entry = None
+            if cache_enabled():
+                self._cache_key = self.get_cache_key()
+                self._cache_entry = get_cache().get(self._cache_key)
+        return self._cache_entry
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        if not cache_enabled():
+            return handler(request, *args, **kwargs)
+        entry = self.get_cache_entry()
+        if entry is not None:
+            record(self.cache_resource, "hit")
+            response = Response(entry[0])
+            response["X-Cache"] = "HIT"
+            return response
+
+        record(self.cache_resource, "miss")
+        response = handler(request, *args, **kwargs)
+        timeout = self.get_cache_timeout()
+        # A timeout of 0 means the response mustn't be stored at all
+        if response.status_code == 200 and timeout != 0:
+            get_cache().set(self._cache_key, (response.data, self.get_cache_extra()), timeout=timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
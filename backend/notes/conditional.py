@@ -0,0 +1,173 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import SCOPE_USERS, get_versions, normalized_params
+from .models import Note, Tag
+from .pagination import NoteKeysetPagination
+
+
+def _etag(*parts) -> str:
+    raw = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(raw.encode("utf-8")).hexdigest())
+
+
+def _nested_versions(*scopes):
+    # Tag and author data are rendered inside notes but don't touch Note.updated_at;
+    # the version counters advance whether or not the response cache is on
+    return tuple(get_versions(*scopes))
+
+
+class ConditionalNoteMixin:
+    """
+    ETag/Last-Modified validators for the notes endpoints, computed from cheap
+    aggregates so a matching If-None-Match/If-Modified-Since is answered with
+    304 before anything is fetched or serialized, and If-Match/If-Unmodified-Since
+    on writes fail with 412 instead of overwriting someone else's edit.
+    """
+
+    def get_list_stats(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if isinstance(self.paginator, NoteKeysetPagination):
+            # Keyset pages avoid COUNT(*); validate just the rows in the page window
+            rows = list(self.paginator.get_window(queryset, self.request).values_list("id", "updated_at"))
+            stats = {
+                "last_modified": max((updated_at for _, updated_at in rows), default=None),
+                "count": len(rows),
+                "checksum": ",".join(str(pk) for pk, _ in rows),
+            }
+        else:
+            stats = queryset.order_by().aggregate(
+                last_modified=Max("updated_at"),
+                count=Count("id", distinct=True),
+                checksum=Sum("id", distinct=True),
+            )
+        return stats
+
+    def get_list_validators(self, stats=None):
+        if stats is None:
+            stats = self.get_list_stats()
+        etag = _etag(
+            "list",
+            stats["last_modified"],
+            stats["count"],
+            stats["checksum"],
+            normalized_params(self.request),
+            self.request.accepted_renderer.format,
+            # The response cache's scopes: the notes scope also advances when a
+            # note's tags change without the note being saved
+            *_nested_versions(*self.get_cache_scopes()),
+        )
+        return etag, stats["last_modified"]
+
+    def get_detail_validators(self):
+        try:
+            pk = Note._meta.pk.to_python(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        except (ValidationError, ValueError, TypeError):
+            # Not a note id: no validators, and get_object() answers 404
+            return None, None
+        updated_at = Note.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        if updated_at is None:
+            return None, None
+        tags = list(Tag.objects.filter(notes=pk).order_by("id").values_list("id", "name", "color"))
+        return self._detail_etag(pk, updated_at, tags), updated_at
+
+    def _detail_etag(self, pk, updated_at, tags):
+        accepted = getattr(self.request, "accepted_renderer", None)
+        return _etag(
+            "detail",
+            pk,
+            updated_at.isoformat(),
+            tags,
+            accepted.format if accepted else "",
+            *_nested_versions(SCOPE_USERS),
+        )
+
+    def _set_validators(self, response, etag, last_modified):
+        if response.status_code != 200 or etag is None:
+            return response
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        # Allow clients to store the response but make them revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def _precondition(self, etag, last_modified):
+        return get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+
+    def get_cache_extra(self):
+        if self.action == "list":
+            return getattr(self, "_list_stats", None)
+        return super().get_cache_extra()
+
+    def list(self, request, *args, **kwargs):
+        # The aggregate is stored with the cached page, under the same version
+        # counters, so only a cache miss runs it (and repeats a ?q= search for it)
+        entry = self.get_cache_entry()
+        stats = entry[1] if entry is not None else None
+        self._list_stats = stats or self.get_list_stats()
+        etag, last_modified = self.get_list_validators(self._list_stats)
+        # Deleting a note doesn't advance max(updated_at), so If-Modified-Since
+        # can't be trusted for lists; the ETag (which includes the count and id
+        # checksum) is authoritative there.
+        conditional = self._precondition(etag, None)
+        if conditional is not None:
+            return conditional
+        response = super().list(request, *args, **kwargs)
+        return self._set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_detail_validators()
+        if etag is not None:
+            conditional = self._precondition(etag, last_modified)
+            if conditional is not None:
+                return conditional
+        response = super().retrieve(request, *args, **kwargs)
+        return self._set_validators(response, etag, last_modified)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if getattr(self, "_lock_note", False):
+            # Held until the write commits, so no other writer can slip in between
+            # the validator check and the update; the author row stays unlocked
+            queryset = queryset.select_for_update(of=("self",))
+        return queryset
+
+    def get_object(self):
+        # A conditional write loads (and locks) the note once; the handler's own
+        # get_object() gets that instance back
+        note = getattr(self, "_write_note", None)
+        return note if note is not None else super().get_object()
+
+    def _checked_write(self, handler, request, *args, **kwargs):
+        with transaction.atomic():
+            self._lock_note = True
+            # 404/403 come before 412: a failed precondition mustn't tell a caller
+            # who can't write the note anything about it
+            note = self._write_note = self.get_object()
+            tags = sorted((tag.id, tag.name, tag.color) for tag in note.tags.all())
+            etag = self._detail_etag(note.pk, note.updated_at, tags)
+            conditional = self._precondition(etag, note.updated_at)
+            if conditional is not None:
+                return conditional
+            response = handler(request, *args, **kwargs)
+        if request.method != "DELETE" and response.status_code == 200:
+            # The saved instance and its rendered tags already hold the new validators
+            tags = sorted((tag["id"], tag["name"], tag["color"]) for tag in response.data.get("tags", ()))
+            self._set_validators(response, self._detail_etag(note.pk, note.updated_at, tags), note.updated_at)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        return self._checked_write(super().update, request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return self._checked_write(super().destroy, request, *args, **kwargs)
@@ -0,0 +1,106 @@
+import json
+import zipfile
+from itertools import islice
+
+from django.utils import timezone
+from django.utils.text import slugify
+
+from notes_backend.renderers import FastJSONRenderer
+
+from .fastlist import note_values, serialize_note_rows
+
+
+EXPORT_NDJSON = "ndjson"
+EXPORT_MARKDOWN = "markdown"
+EXPORT_FORMATS = {
+    EXPORT_NDJSON: ("application/x-ndjson", "ndjson"),
+    EXPORT_MARKDOWN: ("application/zip", "zip"),
+}
+
+# Notes read from the database (and tags looked up) per round trip
+EXPORT_CHUNK_SIZE = 500
+
+
+def iter_note_batches(notes, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield ``(rows, rendered)`` batches for ``notes``: the raw values() rows and
+    their NoteSerializer representation. Rows stream from a database iterator
+    and tags are fetched with one query per batch, so memory stays bounded by
+    ``chunk_size`` however many notes there are.
+    """
+    rows = note_values(notes.order_by("id")).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        yield batch, serialize_note_rows(batch)
+
+
+def iter_ndjson(notes, chunk_size=EXPORT_CHUNK_SIZE):
+    """One JSON document per line, shaped like the /api/notes/ items."""
+    renderer = FastJSONRenderer()
+    for _, rendered in iter_note_batches(notes, chunk_size):
+        yield b"".join(renderer.dumps(note) + b"\n" for note in rendered)
+
+
+def note_filename(note) -> str:
+    # The id keeps names unique; the slug keeps them readable
+    return f"{note['id']}-{slugify(note['title'])[:60] or 'note'}.md"
+
+
+def note_markdown(note) -> str:
+    # JSON strings are valid YAML scalars, so titles need no further escaping
+    front_matter = [
+        "---",
+        f"title: {json.dumps(note['title'], ensure_ascii=False)}",
+        f"tags: {json.dumps([tag['name'] for tag in note['tags']], ensure_ascii=False)}",
+        f"created_at: {note['created_at']}",
+        f"updated_at: {note['updated_at']}",
+        "---",
+        "",
+    ]
+    return "\n".join(front_matter) + "\n" + note["content"]
+
+
+class _ZipSink:
+    """Write-only file object that hands ZipFile's output back to the generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def iter_markdown_zip(notes, chunk_size=EXPORT_CHUNK_SIZE):
+    """A ZIP archive with one Markdown file (YAML front matter + content) per note."""
+    sink = _ZipSink()
+    # An unseekable sink makes ZipFile write sizes after each entry, so nothing is rewound
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for rows, rendered in iter_note_batches(notes, chunk_size):
+            for row, note in zip(rows, rendered):
+                updated_at = timezone.localtime(row["updated_at"]) if timezone.is_aware(row["updated_at"]) else row["updated_at"]
+                info = zipfile.ZipInfo(note_filename(note), date_time=updated_at.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, note_markdown(note))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_notes(notes, export_format=EXPORT_NDJSON, chunk_size=EXPORT_CHUNK_SIZE):
+    if export_format == EXPORT_MARKDOWN:
+        return iter_markdown_zip(notes, chunk_size)
+    return iter_ndjson(notes, chunk_size)
+
+
+def export_filename(user, export_format) -> str:
+    _, extension = EXPORT_FORMATS[export_format]
+    return f"notes-{slugify(user.get_username()) or user.pk}-{timezone.localdate():%Y%m%d}.{extension}"
@@ -0,0 +1,143 @@
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from notes_backend.metrics import timed
+
+from .models import Note
+from .search import get_search_snippets
+
+
+# NoteSerializer's readable fields, in output order
+OUTPUT_FIELDS = ("id", "title", "content", "tags", "user", "created_at", "updated_at", "snippet", "preview")
+DEFAULT_FIELDS = tuple(name for name in OUTPUT_FIELDS if name != "preview")
+
+# values() columns read for each field; tags come from one grouped query
+FIELD_COLUMNS = {
+    "id": ("id",),
+    "title": ("title",),
+    "content": ("content",),
+    "user": ("user_id", "user__email", "user__username"),
+    "created_at": ("created_at",),
+    "updated_at": ("updated_at",),
+    "preview": ("preview",),
+}
+
+
+
+def datetime_renderer():
+    """DateTimeField.to_representation with the active timezone resolved once, not per value."""
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    return serializers.DateTimeField(default_timezone=tz).to_representation
+
+
+def fast_list_enabled() -> bool:
+    return getattr(settings, "NOTES_FAST_LIST", True)
+
+
+def note_values(queryset, fields=None):
+    """``queryset`` as values() rows holding just the columns ``fields`` render."""
+    # id/updated_at are also the keyset cursor and list validator keys
+    columns = {"id", "updated_at"}
+    for name in DEFAULT_FIELDS if fields is None else fields:
+        columns.update(FIELD_COLUMNS.get(name, ()))
+    return queryset.prefetch_related(None).values(*columns)
+
+
+def _tag_rows(note_ids):
+    return (
+        Note.tags.through.objects.filter(note_id__in=note_ids)
+        .order_by("tag__name")
+        .values_list("note_id", "tag_id", "tag__name", "tag__color", "tag__created_at")
+    )
+
+
+def _group_tags(rows):
+    to_datetime = datetime_renderer()
+    tags, rendered = {}, {}
+    for note_id, tag_id, name, color, created_at in rows:
+        # A tag shared by many notes on the page is rendered once
+        if tag_id not in rendered:
+            rendered[tag_id] = {"id": tag_id, "name": name, "color": color, "created_at": to_datetime(created_at)}
+        tags.setdefault(note_id, []).append(rendered[tag_id])
+    return tags
+
+
+def tags_by_note(note_ids):
+    """Rendered tags of each note, in TagSerializer shape and Tag.Meta ordering."""
+    return _group_tags(_tag_rows(note_ids))
+
+
+async def atags_by_note(note_ids):
+    return _group_tags([row async for row in _tag_rows(note_ids)])
+
+
+def _preview(text):
+    limit = settings.NOTES_PREVIEW_LENGTH
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def serialize_note_rows(rows, fields=None, snippets=None, tags=None):
+    """
+    Render values() rows exactly as ``NoteSerializer(many=True).data`` would
+    render the matching notes, without building model instances or walking the
+    serializer fields per row. ``snippets`` maps note id -> FTS snippet;
+    ``tags`` (from ``atags_by_note``) saves the tag query.
+    """
+    wanted = set(DEFAULT_FIELDS if fields is None else fields)
+    if snippets is None:
+        # Like NoteSerializer, only FTS search results carry a snippet
+        wanted.discard("snippet")
+    if tags is None:
+        tags = tags_by_note([row["id"] for row in rows]) if "tags" in wanted else {}
+    to_datetime = datetime_renderer()
+    renderers = {
+        "id": itemgetter("id"),
+        "title": itemgetter("title"),
+        "content": itemgetter("content"),
+        "tags": lambda row: tags.get(row["id"], []),
+        "user": lambda row: {"id": row["user_id"], "email": row["user__email"], "username": row["user__username"]},
+        "created_at": lambda row: to_datetime(row["created_at"]),
+        "updated_at": lambda row: to_datetime(row["updated_at"]),
+        "snippet": lambda row: snippets.get(row["id"], ""),
+        "preview": lambda row: _preview(row["preview"]),
+    }
+    plan = [(name, renderers[name]) for name in OUTPUT_FIELDS if name in wanted]
+    return [{name: render(row) for name, render in plan} for row in rows]
+
+
+class FastNoteListMixin:
+    """
+    Serve ``list`` from values() rows rendered by ``serialize_note_rows``.
+
+    Sits below the caching/conditional mixins so they still wrap it; views
+    provide ``get_requested_fields()`` (None for the full representation).
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not fast_list_enabled():
+            return super().list(request, *args, **kwargs)
+        fields = self.get_requested_fields()
+        queryset = note_values(self.filter_queryset(self.get_queryset()), fields)
+        page = self.paginate_rows(queryset)
+        rows = list(queryset) if page is None else page
+
+        snippets = None
+        query = request.query_params.get("q")
+        if query and (fields is None or "snippet" in fields):
+            snippets = get_search_snippets([row["id"] for row in rows], query)
+        with timed("serialize"):
+            data = serialize_note_rows(rows, fields, snippets)
+
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def paginate_rows(self, queryset):
+        # The paginator directly: the view's paginate_queryset() expects instances
+        if self.paginator is None:
+            return None
+        return self.paginator.paginate_queryset(queryset, self.request, view=self)
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from itertools import islice
+
+from django.db import transaction
+
+from .bulk import refresh_derived_data
+from .cache import bump_note_versions
+from .models import Note, SyncCounter, Tag
+from .search import postgres_search_enabled, rebuild_fts_index, update_search_vectors
+from .tags import adjust_tag_usage, get_or_create_tags
+
+
+IMPORT_CHUNK_SIZE = 1000
+
+TITLE_MAX_LENGTH = Note._meta.get_field("title").max_length
+TAG_NAME_MAX_LENGTH = Tag._meta.get_field("name").max_length
+
+
+class ImportRecordError(ValueError):
+    pass
+
+
+def _tag_names(tags):
+    # Tags may be names, TagSerializer dicts (our NDJSON export) or a comma-separated string
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    names = []
+    for tag in tags or ():
+        name = (tag.get("name", "") if isinstance(tag, dict) else str(tag)).strip()
+        # Truncated before the duplicate check: long names sharing a prefix are one tag
+        name = name[:TAG_NAME_MAX_LENGTH].strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def normalize_record(record):
+    if not isinstance(record, dict):
+        raise ImportRecordError("expected an object")
+    title = str(record.get("title") or "").strip()
+    if not title:
+        raise ImportRecordError("missing title")
+    return {
+        "title": title[:TITLE_MAX_LENGTH],
+        "content": str(record.get("content") or ""),
+        "tags": _tag_names(record.get("tags")),
+    }
+
+
+def read_ndjson(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield ImportRecordError(f"line {number}: {exc}")
+
+
+def read_csv(stream):
+    # Columns: title, content, tags (comma-separated names)
+    yield from csv.DictReader(stream)
+
+
+def parse_markdown(text, fallback_title):
+    """A Markdown note, with the YAML-ish front matter written by export_notes if present."""
+    record = {"title": fallback_title, "content": text, "tags": []}
+    lines = text.split("\n")
+    if lines and lines[0].strip() == "---" and "---" in (line.strip() for line in lines[1:]):
+        end = next(i for i, line in enumerate(lines[1:], 1) if line.strip() == "---")
+        for line in lines[1:end]:
+            key, _, value = line.partition(":")
+            value = value.strip()
+            try:
+                # export_notes writes JSON scalars/lists, which are valid YAML
+                value = json.loads(value)
+            except ValueError:
+                pass
+            record[key.strip()] = value
+        record["content"] = "\n".join(lines[end + 1:]).lstrip("\n")
+    elif lines and lines[0].startswith("# "):
+        record["title"] = lines[0][2:]
+        record["content"] = "\n".join(lines[1:]).lstrip("\n")
+    return record
+
+
+def read_markdown(path):
+    """Every .md file of a directory tree or of a ZIP archive (e.g. an export_notes dump)."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(archive.namelist()):
+                if name.endswith(".md"):
+                    text = archive.read(name).decode("utf-8")
+                    yield parse_markdown(text, os.path.splitext(os.path.basename(name))[0])
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".md"):
+                with open(os.path.join(root, name), encoding="utf-8") as handle:
+                    yield parse_markdown(handle.read(), os.path.splitext(name)[0])
+
+
+@transaction.atomic
+def import_chunk(user, records, refresh=True):
+    """Insert one chunk of normalized records: a fixed number of statements per chunk."""
+    tags, created_tags = get_or_create_tags(name for record in records for name in record["tags"])
+
+    change_seq = SyncCounter.next_value(SyncCounter.NOTES, user.pk)
+    notes = Note.objects.bulk_create([
+        Note(user=user, title=record["title"], content=record["content"], change_seq=change_seq)
+        for record in records
+    ])
+    Through = Note.tags.through
+    links = [
+        Through(note_id=note.pk, tag_id=tags[name].pk)
+        for note, record in zip(notes, records)
+        for name in record["tags"]
+    ]
+    Through.objects.bulk_create(links, ignore_conflicts=True)
+    adjust_tag_usage([(user.pk, link.tag_id) for link in links], +1)
+    if refresh:
+        refresh_derived_data([note.pk for note in notes], {user.pk})
+    return len(notes), created_tags
+
+
+def finish_deferred_import(user) -> None:
+    """Catch up on the search and cache maintenance skipped by import_chunk(refresh=False)."""
+    if postgres_search_enabled():
+        update_search_vectors(Note.objects.filter(search_vector__isnull=True))
+    # One rebuild is much cheaper than re-mirroring the index chunk by chunk
+    rebuild_fts_index()
+    bump_note_versions(user_ids=[user.pk])
+
+
+def import_records(user, records, chunk_size=IMPORT_CHUNK_SIZE, defer_maintenance=False, on_chunk=None):
+    """
+    Import an iterable of raw records for ``user`` in chunks of ``chunk_size``,
+    one transaction per chunk. Returns ``(imported, tags_created, errors)``
+    where ``errors`` lists ``(record number, message)`` for skipped records.
+    """
+    imported = tags_created = 0
+    errors = []
+    records = iter(records)
+    number = 0
+    while True:
+        raw = list(islice(records, chunk_size))
+        if not raw:
+            break
+        batch = []
+        for record in raw:
+            number += 1
+            try:
+                if isinstance(record, ImportRecordError):
+                    raise record
+                batch.append(normalize_record(record))
+            except ImportRecordError as exc:
+                errors.append((number, str(exc)))
+        if batch:
+            count, created = import_chunk(user, batch, refresh=not defer_maintenance)
+            imported += count
+            tags_created += created
+            if on_chunk:
+                on_chunk(imported)
+    if defer_maintenance and imported:
+        finish_deferred_import(user)
+    return imported, tags_created, errors
+
+
+def open_text(path):
+    # utf-8-sig: tolerate the BOM spreadsheet tools put in CSV files
+    return io.open(path, encoding="utf-8-sig", newline="")
@@ -0,0 +1,20 @@
+import itertools
+
+
+# Building blocks of the benchmarks' pseudo-words
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "fi", "gu", "he", "ja")
+
+
+class Rollback(Exception):
+    """Raised at the end of a benchmark's transaction.atomic() block to discard its data."""
+
+
+def zipf_vocabulary(rng, size):
+    """
+    Up to ``size`` distinct pseudo-words in random rank order, and cumulative
+    weights for ``rng.choices()`` giving them a Zipf-like frequency, like
+    natural text.
+    """
+    vocabulary = sorted({"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)})
+    rng.shuffle(vocabulary)
+    return vocabulary, list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
@@ -0,0 +1,14 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db.models import Q
+
+
+def resolve_user(identifier):
+    """The single user whose username, email or id is ``identifier``."""
+    lookup = Q(username=identifier) | Q(email__iexact=identifier)
+    if identifier.isdigit():
+        lookup |= Q(pk=int(identifier))
+    users = list(get_user_model().objects.filter(lookup)[:2])
+    if len(users) != 1:
+        raise CommandError(f"No single user matches {identifier!r}.")
+    return users[0]
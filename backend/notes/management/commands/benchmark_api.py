@@ -0,0 +1,300 @@
+import itertools
+import json
+import math
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from notes.cache import bump_note_versions
+from notes.importer import import_records
+from notes.management.commands._bench import zipf_vocabulary
+from notes.models import Note, Tag
+from notes.search import sync_fts_index
+from notes.signals import batched_note_deletes
+from notes.tags import adjust_tag_usage, tag_links
+from notes_backend.throttling import SlidingWindowRateThrottle
+
+
+VOCABULARY_SIZE = 5_000
+TAG_COUNT = 200
+PASSWORD = "Bench-Password-123!"
+# Usernames of the generated users start with this (and the seed)
+USER_PREFIX = "bench-"
+SCENARIOS = ("notes_list", "notes_search", "notes_create", "login", "refresh")
+# Requests measured for peak memory (tracemalloc slows everything down, so not all of them)
+MEMORY_SAMPLES = 3
+
+
+class Dataset:
+    """
+    Deterministic synthetic data: the same seed and sizes always produce the
+    same users, notes and tags. Word and tag popularity follow a Zipf-like
+    curve, note lengths a log-normal one (mostly short notes, a few long ones),
+    and a minority of users own most of the notes.
+
+    Rows left behind by an interrupted run with the same seed are removed first.
+    """
+
+    def __init__(self, seed, users):
+        self.rng = random.Random(seed)
+        self.vocabulary, self.word_weights = zipf_vocabulary(self.rng, VOCABULARY_SIZE)
+        self.tags = [f"tag-{word}" for word in self.vocabulary[:TAG_COUNT]]
+        self.tag_weights = list(itertools.accumulate(1 / rank for rank in range(1, TAG_COUNT + 1)))
+
+        User = get_user_model()
+        prefix = f"{USER_PREFIX}{seed}-"
+        self.remove_users(User.objects.filter(username__startswith=prefix).values_list("pk", flat=True))
+        Tag.objects.filter(name__in=self.tags, notes__isnull=True).delete()
+        password = make_password(PASSWORD)
+        # One hash for everybody: hashing each password would dominate the setup
+        User.objects.bulk_create([
+            User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password=password)
+            for i in range(users)
+        ])
+        self.users = list(User.objects.filter(username__startswith=prefix).order_by("pk"))
+        self.user_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.users) + 1)))
+        self.notes = 0
+        # Tags that already existed are left in place by delete()
+        self.existing_tags = set(Tag.objects.filter(name__in=self.tags).values_list("pk", flat=True))
+
+    def words(self, count):
+        return " ".join(self.rng.choices(self.vocabulary, cum_weights=self.word_weights, k=count))
+
+    def record(self):
+        return {
+            "title": self.words(self.rng.randint(2, 8)).capitalize(),
+            # Median around 60 words, with a long tail of multi-page notes
+            "content": self.words(min(5000, max(1, int(self.rng.lognormvariate(4.1, 1.0))))),
+            "tags": self.rng.choices(self.tags, cum_weights=self.tag_weights, k=self.rng.choice((0, 1, 1, 2, 2, 3, 5))),
+        }
+
+    def user(self):
+        return self.rng.choices(self.users, cum_weights=self.user_weights)[0]
+
+    def grow(self, notes):
+        """Add notes until there are ``notes`` in total, through the bulk importer."""
+        per_user = {}
+        for _ in range(notes - self.notes):
+            per_user.setdefault(self.user(), []).append(self.record())
+        for user, records in per_user.items():
+            import_records(user, records)
+        self.notes = max(self.notes, notes)
+
+    def delete(self):
+        """Remove the users, notes and tags the dataset created, a batch at a time."""
+        self.remove_users([user.pk for user in self.users])
+        Tag.objects.filter(name__in=self.tags).exclude(pk__in=self.existing_tags).delete()
+
+    @staticmethod
+    def remove_users(user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        note_ids = list(Note.objects.filter(user__in=user_ids).values_list("pk", flat=True))
+        # What the per-note delete handlers do, once for all the notes (see notes.bulk)
+        adjust_tag_usage(tag_links(note_id__in=note_ids), -1)
+        Note.tags.through.objects.filter(note_id__in=note_ids).delete()
+        with batched_note_deletes():
+            get_user_model().objects.filter(pk__in=user_ids).delete()
+        sync_fts_index(note_ids)
+        bump_note_versions(note_ids=note_ids, user_ids=user_ids)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the notes API hot paths (list, search, create, login, refresh) through the "
+        "real URL routes on generated datasets of growing size. Reports p50/p95/p99 latency, "
+        "queries per request and peak memory, writes them as JSON and, with --baseline, fails "
+        "on regressions (benchmarks/api_baseline.json holds the results of the default options "
+        "on SQLite). Each request commits as in production; the generated data is deleted afterwards. "
+        "Meant for a scratch database: it refuses to run where other users exist."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000", help="Comma-separated note counts")
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=40, help="Measured requests per scenario and size")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="Results JSON to compare with; exits non-zero on a regression")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Allowed p95 latency increase over the baseline, as a fraction",
+        )
+        parser.add_argument(
+            "--with-response-cache", action="store_true",
+            help="Keep API_RESPONSE_CACHE on (by default every list request reaches the database)",
+        )
+        parser.add_argument(
+            "--allow-existing-data", action="store_true",
+            help="Run even though the database has users of its own (their sync clients see the benchmark's writes)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options["sizes"].split(","))
+        except ValueError:
+            raise CommandError("--sizes takes comma-separated integers.")
+        if not options["allow_existing_data"]:
+            # Its commits advance the sync sequence and the cache versions real clients use
+            if get_user_model().objects.exclude(username__startswith=USER_PREFIX).exists():
+                raise CommandError(
+                    "The database has users besides the benchmark's. Run this against a scratch "
+                    "database, or pass --allow-existing-data."
+                )
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as handle:
+                baseline = json.load(handle)
+
+        # Throttles would turn the runs into 429s, and the query audit's stack walks
+        # are a development aid, not part of the measured request
+        with patch.object(SlidingWindowRateThrottle, "allow_request", return_value=True), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            QUERY_AUDIT_MODE="off",
+            API_RESPONSE_CACHE=options["with_response_cache"] and getattr(settings, "API_RESPONSE_CACHE", True),
+        ):
+            # No wrapping transaction: commits are part of the measured cost, and the
+            # replica router only routes reads to replicas outside a transaction
+            results = self.run(sizes, options)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+                handle.write("\n")
+            self.stdout.write(f"Results written to {options['output']}")
+        if baseline is not None:
+            regressions = self.compare(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def run(self, sizes, options):
+        dataset = Dataset(options["seed"], options["users"])
+        try:
+            return self.run_sizes(dataset, sizes, options)
+        finally:
+            dataset.delete()
+
+    def run_sizes(self, dataset, sizes, options):
+        results = {
+            "database": connection.vendor,
+            "seed": options["seed"],
+            "users": options["users"],
+            "requests": options["requests"],
+            "python": platform.python_version(),
+            "created_at": timezone.now().isoformat(),
+            "sizes": {},
+        }
+        client = Client()
+        for size in sizes:
+            started = time.perf_counter()
+            dataset.grow(size)
+            self.stdout.write(f"\n{size} notes (generated in {time.perf_counter() - started:.1f}s)")
+            self.stdout.write(f"{'scenario':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'peak KiB':>9}")
+            results["sizes"][str(size)] = measured = {}
+            for scenario in SCENARIOS:
+                measured[scenario] = stats = self.measure(client, dataset, scenario, options["requests"])
+                self.stdout.write(
+                    f"{scenario:<14} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} "
+                    f"{stats['queries']:>8} {stats['peak_kib']:>9.0f}"
+                )
+        return results
+
+    def request(self, dataset, scenario):
+        """Build one request of ``scenario``: ``(method, path, data, headers, expected status)``."""
+        user = dataset.user()
+        if scenario in ("login", "refresh"):
+            if scenario == "login":
+                return "post", "/api/auth/login/", {"email": user.email, "password": PASSWORD}, {}, 200
+            return "post", "/api/auth/refresh/", {"refresh": str(RefreshToken.for_user(user))}, {}, 200
+        headers = {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"}
+        if scenario == "notes_list":
+            # The first page, as the note list screen requests it, in one of its orderings
+            ordering = dataset.rng.choice(("-updated_at", "-created_at", "title"))
+            return "get", "/api/notes/", {"ordering": ordering}, headers, 200
+        if scenario == "notes_search":
+            # Frequent to mid-frequency words, so the searches find something
+            return "get", "/api/notes/", {"q": dataset.vocabulary[dataset.rng.randint(0, 200)]}, headers, 200
+        record = dataset.record()
+        body = {"title": record["title"], "content": record["content"], "tag_names": record["tags"]}
+        return "post", "/api/notes/", body, headers, 201
+
+    def send(self, client, method, path, data, headers, expected):
+        if method == "get":
+            response = client.get(path, data, headers=headers)
+        else:
+            response = client.post(path, json.dumps(data), content_type="application/json", headers=headers)
+        if response.status_code != expected:
+            raise CommandError(f"{method.upper()} {path} returned {response.status_code}: {response.content[:200]!r}")
+        return response
+
+    def measure(self, client, dataset, scenario, count):
+        # One unmeasured request warms caches and connections
+        self.send(client, *self.request(dataset, scenario))
+        latencies, queries = [], []
+        for _ in range(count):
+            args = self.request(dataset, scenario)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                self.send(client, *args)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+
+        peak = 0
+        tracemalloc.start()
+        try:
+            for _ in range(MEMORY_SAMPLES):
+                args = self.request(dataset, scenario)
+                tracemalloc.reset_peak()
+                current, _ = tracemalloc.get_traced_memory()
+                self.send(client, *args)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        finally:
+            tracemalloc.stop()
+        return {
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            # The median: periodic work (e.g. the revocation sync) shouldn't read as a regression
+            "queries": int(statistics.median(queries)),
+            "peak_kib": round(peak / 1024, 1),
+        }
+
+    def compare(self, results, baseline, tolerance):
+        """Human-readable regressions of ``results`` against ``baseline`` (same database only)."""
+        if baseline.get("database") != results["database"]:
+            raise CommandError(
+                f"The baseline was recorded on {baseline.get('database')}, this run used {results['database']}."
+            )
+        regressions = []
+        for size, scenarios in results["sizes"].items():
+            for scenario, stats in scenarios.items():
+                before = baseline.get("sizes", {}).get(size, {}).get(scenario)
+                if before is None:
+                    continue
+                label = f"{scenario} @ {size} notes"
+                if stats["queries"] > before["queries"]:
+                    regressions.append(f"{label}: {stats['queries']} queries per request, baseline {before['queries']}")
+                # A floor of one millisecond keeps timer noise on very fast paths from failing the run
+                if stats["p95_ms"] > max(before["p95_ms"] * (1 + tolerance), before["p95_ms"] + 1):
+                    regressions.append(f"{label}: p95 {stats['p95_ms']:.1f} ms, baseline {before['p95_ms']:.1f} ms")
+        return regressions
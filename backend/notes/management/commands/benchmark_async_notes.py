@@ -0,0 +1,105 @@
+import asyncio
+import statistics
+import time
+import uuid
+from types import ModuleType
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import include, path
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.management.commands.benchmark_login_storm import PASSWORD, asgi_request
+from notes.models import Note, Tag
+from notes.urls import async_urlpatterns, router
+from notes_backend.throttling import SlidingWindowRateThrottle
+
+
+def urlconf(name, patterns):
+    # A module object: resolvers are cached per urlconf, so it must be hashable
+    module = ModuleType(name)
+    module.urlpatterns = [path("api/", include(patterns))]
+    return module
+
+
+# The same routes served by the sync viewsets and by the native async views
+URLCONFS = {
+    "sync": urlconf("sync_urls", router.urls),
+    "async": urlconf("async_urls", async_urlpatterns + router.urls),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync notes/tags viewsets with the native async views (NOTES_ASYNC_API) "
+        "under ASGI, with many concurrent clients reading lists, notes and tags. "
+        "Creates a temporary user with notes and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per mode")
+        parser.add_argument("--notes", type=int, default=200)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.create_user(
+            username=f"bench-{uuid.uuid4().hex[:12]}", email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password=PASSWORD
+        )
+        tag = Tag.objects.create(name=f"bench-{uuid.uuid4().hex[:12]}")
+        try:
+            notes = Note.objects.bulk_create([
+                Note(user=user, title=f"Bench note {i}", content="Lorem ipsum " * 50) for i in range(options["notes"])
+            ])
+            tag.notes.add(*notes[::3])
+            paths = [
+                "/api/notes/",
+                "/api/notes/?page=2&ordering=title",
+                *(f"/api/notes/{note.pk}/" for note in notes[:10]),
+                "/api/tags/",
+            ]
+            # Throttles would turn the run into 429s; the response cache would measure cache hits,
+            # which only the sync views serve, and the query audit is a development aid
+            with patch.object(SlidingWindowRateThrottle, "allow_request", return_value=True), \
+                    override_settings(API_RESPONSE_CACHE=False, QUERY_AUDIT_MODE="off"):
+                self.run(user, paths, options)
+        finally:
+            tag.delete()
+            user.delete()
+
+    def run(self, user, paths, options):
+        app = get_asgi_application()
+        headers = [(b"authorization", f"Bearer {AccessToken.for_user(user)}".encode())]
+        self.stdout.write(f"{'mode':<6} {'req/s':>8} {'p50 ms':>8} {'p95':>8} {'p99':>8}")
+        for mode, module in URLCONFS.items():
+            with override_settings(ROOT_URLCONF=module):
+                # One unmeasured pass warms connections, caches and imports
+                asyncio.run(self.load(app, paths, headers, len(paths), 1))
+                latencies, elapsed = asyncio.run(
+                    self.load(app, paths, headers, options["requests"], options["concurrency"])
+                )
+            quantiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f"{mode:<6} {len(latencies) / elapsed:>8.0f} {statistics.median(latencies):>8.1f} "
+                f"{quantiles[94]:>8.1f} {quantiles[98]:>8.1f}"
+            )
+
+    async def load(self, app, paths, headers, count, concurrency):
+        remaining = iter(range(count))
+        latencies = []
+
+        async def client():
+            for i in remaining:
+                path = paths[i % len(paths)]
+                started = time.perf_counter()
+                status = await asgi_request(app, "GET", path, headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    raise CommandError(f"GET {path} returned {status}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - started
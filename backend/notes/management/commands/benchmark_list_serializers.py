@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from notes.fastlist import note_values, serialize_note_rows
+from notes.management.commands._bench import Rollback
+from notes.models import Note, Tag
+from notes.serializers import NoteSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare NoteSerializer against the values()-based fast list path for "
+        "one page of notes. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=2000)
+        parser.add_argument("--tags", type=int, default=30)
+        parser.add_argument("--tags-per-note", type=int, default=3)
+        parser.add_argument("--words", type=int, default=200, help="Words per note body")
+        parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100])
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        User = get_user_model()
+        users = [
+            User.objects.create(username=f"bench-{i}-{rng.random()}", email=f"bench{i}@example.com")
+            for i in range(10)
+        ]
+        tags = Tag.objects.bulk_create([Tag(name=f"bench-{i}-{rng.random()}") for i in range(options["tags"])])
+        words = ("lorem", "ipsum", "dolor", "sit", "amet", "notes", "draft", "meeting", "todo", "idea")
+        notes = Note.objects.bulk_create([
+            Note(
+                user=rng.choice(users),
+                title=" ".join(rng.choices(words, k=4)),
+                content=" ".join(rng.choices(words, k=options["words"])),
+            )
+            for _ in range(options["notes"])
+        ])
+        Through = Note.tags.through
+        Through.objects.bulk_create([
+            Through(note_id=note.pk, tag_id=tag.pk)
+            for note in notes
+            for tag in rng.sample(tags, min(options["tags_per_note"], len(tags)))
+        ])
+
+        renderer = JSONRenderer()
+        # Same ordering and base queryset as the default /api/notes/ list
+        base = Note.objects.order_by("-updated_at")
+
+        def serializer_page(size):
+            page = list(base.select_related("user").prefetch_related("tags")[:size])
+            return renderer.render(NoteSerializer(page, many=True).data)
+
+        def fast_page(size):
+            rows = list(note_values(base)[:size])
+            return renderer.render(serialize_note_rows(rows))
+
+        self.stdout.write(f"{'page size':>9} {'serializer ms':>14} {'fast ms':>9} {'speedup':>9}")
+        for size in options["page_sizes"]:
+            if serializer_page(size) != fast_page(size):
+                raise CommandError(f"Fast path output differs from NoteSerializer at page size {size}.")
+            timings = {}
+            for name, render in (("serializer", serializer_page), ("fast", fast_page)):
+                samples = []
+                for _ in range(options["repeat"]):
+                    t0 = time.perf_counter()
+                    render(size)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                timings[name] = statistics.median(samples)
+            slow, fast = timings["serializer"], timings["fast"]
+            self.stdout.write(f"{size:>9} {slow:>14.2f} {fast:>9.2f} {slow / max(fast, 0.001):>8.1f}x")
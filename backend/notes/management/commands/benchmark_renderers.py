@@ -0,0 +1,100 @@
+import io
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from notes.management.commands._bench import Rollback
+from notes.models import Note, Tag
+from notes.serializers import NoteSerializer
+from notes_backend.parsers import FastJSONParser
+from notes_backend.renderers import FastJSONRenderer, StreamingJSONRenderer, orjson_available
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSON renderer/parser with the orjson-backed and streaming "
+        "ones on NoteSerializer output. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 1000])
+        parser.add_argument("--words", type=int, default=300, help="Words per note body")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not orjson_available():
+            self.stdout.write("orjson is not installed: the fast renderer/parser fall back to DRF's.")
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        user = get_user_model().objects.create(username=f"bench-{rng.random()}", email="bench@example.com")
+        tags = Tag.objects.bulk_create([Tag(name=f"bench-{i}-{rng.random()}") for i in range(10)])
+        # Markdown-ish bodies with some non-ASCII text, like real notes
+        words = ("meeting", "notes", "**todo**", "`code`", "café", "naïve", "日本語", "- item", "# heading", "plan")
+        Note.objects.bulk_create([
+            Note(user=user, title=" ".join(rng.choices(words, k=5)), content=" ".join(rng.choices(words, k=options["words"])))
+            for _ in range(max(options["sizes"]))
+        ])
+        Through = Note.tags.through
+        Through.objects.bulk_create([
+            Through(note_id=note_id, tag_id=tag.pk)
+            for note_id in Note.objects.filter(user=user).values_list("id", flat=True)
+            for tag in rng.sample(tags, 2)
+        ])
+        notes = list(Note.objects.filter(user=user).select_related("user").prefetch_related("tags"))
+
+        renderers = {
+            "drf": JSONRenderer(),
+            "fast": FastJSONRenderer(),
+            "stream": StreamingJSONRenderer(),
+        }
+        parsers = {"drf": JSONParser(), "fast": FastJSONParser()}
+
+        self.stdout.write(
+            f"{'items':>6} {'KiB':>8} {'drf render':>11} {'fast':>8} {'stream':>8} {'drf parse':>10} {'fast':>8}"
+        )
+        for size in options["sizes"]:
+            data = {"count": size, "next": None, "previous": None,
+                    "results": NoteSerializer(notes[:size], many=True).data}
+            expected = renderers["drf"].render(data)
+            if any(self.render(renderer, data) != expected for renderer in renderers.values()):
+                raise CommandError(f"Renderer output differs from DRF's at {size} items.")
+
+            render_ms = {
+                name: self.measure(lambda: self.render(renderer, data), options["repeat"])
+                for name, renderer in renderers.items()
+            }
+            parse_ms = {
+                name: self.measure(lambda: parser.parse(io.BytesIO(expected)), options["repeat"])
+                for name, parser in parsers.items()
+            }
+            self.stdout.write(
+                f"{size:>6} {len(expected) / 1024:>8.0f} {render_ms['drf']:>11.2f} {render_ms['fast']:>8.2f} "
+                f"{render_ms['stream']:>8.2f} {parse_ms['drf']:>10.2f} {parse_ms['fast']:>8.2f}"
+            )
+
+    def render(self, renderer, data) -> bytes:
+        ret = renderer.render(data)
+        # The streaming renderer yields chunks; include joining them in its time
+        return ret if isinstance(ret, bytes) else b"".join(ret)
+
+    def measure(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from notes.management.commands._bench import Rollback, zipf_vocabulary
+from notes.models import Note
+from notes.search import (
+    SEARCH_BACKEND_BASIC,
+    SEARCH_BACKEND_FTS,
+    attach_search_snippets,
+    fts_search_enabled,
+    rebuild_fts_index,
+    search_notes,
+)
+
+
+VOCABULARY_SIZE = 20_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare FTS5 search against the icontains fallback on a generated corpus. "
+        "Runs inside a transaction that is rolled back, so no data is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=100_000)
+        parser.add_argument("--words", type=int, default=80, help="Words per note body")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not fts_search_enabled():
+            raise CommandError("benchmark_search needs SQLite with the FTS5 index available.")
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        vocabulary, cumulative = zipf_vocabulary(rng, VOCABULARY_SIZE)
+        User = get_user_model()
+        user = User.objects.create(username=f"bench-{rng.random()}")
+
+        started = time.perf_counter()
+        batch = []
+        for i in range(options["notes"]):
+            batch.append(Note(
+                user=user,
+                title=" ".join(rng.choices(vocabulary, cum_weights=cumulative, k=4)),
+                content=" ".join(rng.choices(vocabulary, cum_weights=cumulative, k=options["words"])),
+            ))
+            if len(batch) == 5000:
+                Note.objects.bulk_create(batch)
+                batch = []
+        Note.objects.bulk_create(batch)
+        indexed = rebuild_fts_index()
+        self.stdout.write(f"Generated and indexed {indexed} notes in {time.perf_counter() - started:.1f}s")
+
+        # Same base queryset as the unfiltered /api/notes/ list
+        base = Note.objects.select_related("user").prefetch_related("tags")
+        page_size = options["page_size"]
+        self.stdout.write(f"{'query':<20} {'icontains ms':>14} {'fts5 ms':>10} {'speedup':>9}")
+        # Common, mid-frequency, rare, two-term and absent queries
+        queries = (
+            vocabulary[0],
+            vocabulary[100],
+            vocabulary[5000],
+            f"{vocabulary[20]} {vocabulary[300]}",
+            "qqqxyz",
+        )
+        for query in queries:
+            timings = {}
+            for backend in (SEARCH_BACKEND_BASIC, SEARCH_BACKEND_FTS):
+                samples = []
+                for _ in range(options["repeat"]):
+                    t0 = time.perf_counter()
+                    queryset = search_notes(base, query, backend=backend)
+                    # Mirror what the paginated list endpoint does: count + first page
+                    queryset.count()
+                    page = list(queryset[:page_size])
+                    if backend == SEARCH_BACKEND_FTS:
+                        attach_search_snippets(page, query)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                timings[backend] = statistics.median(samples)
+            basic, fts = timings[SEARCH_BACKEND_BASIC], timings[SEARCH_BACKEND_FTS]
+            self.stdout.write(f"{query:<20} {basic:>14.1f} {fts:>10.1f} {basic / max(fts, 0.001):>8.1f}x")
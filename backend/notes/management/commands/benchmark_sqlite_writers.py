@@ -0,0 +1,145 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+
+from notes.models import Note
+from notes.serializers import NoteSerializer
+
+
+# Distinct authors the simulated requests are spread over
+USERS = 10
+# Tag names the created notes pick from, so writers share tag and usage rows
+TAG_NAMES = ("work", "home", "ideas", "todo", "later")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare plain and tuned (SQLITE_TUNED) SQLite under concurrent writers and readers "
+        "on throwaway, migrated database files. Writers create tagged notes through "
+        "NoteSerializer, the API's write path (sync sequence, FTS index, tag usage counts, "
+        "cache versions); every operation is one simulated request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+        parser.add_argument("--content-size", type=int, default=2000, help="Bytes of content per note")
+
+    def handle(self, *args, **options):
+        plain = {"ENGINE": "django.db.backends.sqlite3"}
+        tuned = {**plain, **settings.SQLITE_TUNED_DATABASE}
+        self.stdout.write(
+            f"{'mode':<7} {'writes/s':>9} {'locked':>7} {'write p50 ms':>13} {'p99':>8} {'reads/s':>9} {'read p99 ms':>12}"
+        )
+        # Replicas would serve the readers from the configured databases
+        with tempfile.TemporaryDirectory() as tmp, override_settings(DATABASE_REPLICAS=[]):
+            for mode, database in (("plain", plain), ("tuned", tuned)):
+                with self.scratch_default({**database, "NAME": os.path.join(tmp, f"{mode}.sqlite3")}):
+                    stats = self.run(options)
+                self.stdout.write(
+                    f"{mode:<7} {stats['writes'] / options['seconds']:>9.0f} {stats['locked']:>7} "
+                    f"{stats['write_p50']:>13.1f} {stats['write_p99']:>8.1f} "
+                    f"{stats['reads'] / options['seconds']:>9.0f} {stats['read_p99']:>12.1f}"
+                )
+
+    @contextmanager
+    def scratch_default(self, database):
+        """
+        Make a migrated ``database`` the default connection for the block: the
+        signal handlers, SyncCounter and the FTS sync all write through it.
+        """
+        original = connections.settings["default"]
+        connections["default"].close()
+        del connections["default"]
+        # configure_settings() fills in the defaults a DATABASES entry gets at startup
+        connections.settings["default"] = connections.configure_settings({"default": database})["default"]
+        try:
+            call_command("migrate", verbosity=0, interactive=False)
+            yield
+        finally:
+            connections["default"].close()
+            del connections["default"]
+            connections.settings["default"] = original
+
+    def run(self, options):
+        User = get_user_model()
+        User.objects.bulk_create([User(username=f"writer-{i}", email=f"writer-{i}@example.com") for i in range(USERS)])
+        users = list(User.objects.order_by("pk"))
+        stop = threading.Event()
+        lock = threading.Lock()
+        results = {"writes": 0, "locked": 0, "reads": 0, "write_ms": [], "read_ms": []}
+        content = "x" * options["content_size"]
+
+        def write(user):
+            # What POST /api/notes/ does after authentication: validation resolves the
+            # tags (a read), then the note, its tags and their usage counts are written
+            serializer = NoteSerializer(data={
+                "title": "Benchmark note",
+                "content": content,
+                "tag_names": random.sample(TAG_NAMES, 2),
+            })
+            serializer.is_valid(raise_exception=True)
+            serializer.save(user=user)
+
+        def read(user):
+            notes = Note.objects.filter(user=user).select_related("user").prefetch_related("tags")
+            list(notes.order_by("-updated_at")[:20])
+
+        def worker(operation, kind, user):
+            connection = connections["default"]
+            timings, done, locked = [], 0, 0
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        operation(user)
+                    except OperationalError as exc:
+                        if "locked" not in str(exc):
+                            raise
+                        locked += 1
+                    else:
+                        done += 1
+                        timings.append((time.perf_counter() - started) * 1000)
+                    # End of the simulated request: closes the connection unless it's persistent
+                    connection.close_if_unusable_or_obsolete()
+            finally:
+                connection.close()
+                with lock:
+                    results[f"{kind}s"] += done
+                    results[f"{kind}_ms"] += timings
+                    results["locked"] += locked
+
+        threads = [
+            threading.Thread(target=worker, args=(write, "write", users[i % USERS])) for i in range(options["writers"])
+        ]
+        threads += [
+            threading.Thread(target=worker, args=(read, "read", users[i % USERS])) for i in range(options["readers"])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        def quantile(samples, index):
+            return statistics.quantiles(samples, n=100)[index] if len(samples) > 1 else float("nan")
+
+        return {
+            **results,
+            "write_p50": quantile(results["write_ms"], 49),
+            "write_p99": quantile(results["write_ms"], 98),
+            "read_p99": quantile(results["read_ms"], 98),
+        }
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORT_MARKDOWN, EXPORT_NDJSON, export_notes
+from notes.management.commands._helpers import resolve_user
+from notes.models import Note
+
+
+class Command(BaseCommand):
+    help = (
+        "Export a user's notes with their tags as NDJSON or a ZIP of Markdown files, "
+        "streaming them in batches like GET /api/notes/export/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="Username, email or id of the notes' owner")
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default=EXPORT_NDJSON)
+        parser.add_argument("--output", "-o", help="File to write (default: stdout, NDJSON only)")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user = resolve_user(options["user"])
+        if options["format"] == EXPORT_MARKDOWN and not options["output"]:
+            raise CommandError("--output is required for the Markdown ZIP export.")
+
+        chunks = export_notes(Note.objects.filter(user=user), options["format"], options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                written = self.write(chunks, output)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+        else:
+            self.write(chunks, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+
+    def write(self, chunks, output) -> int:
+        written = 0
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+        return written
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.importer import IMPORT_CHUNK_SIZE, import_records, open_text, read_csv, read_markdown, read_ndjson
+from notes.management.commands._helpers import resolve_user
+
+
+FORMATS = ("ndjson", "csv", "markdown")
+
+
+class Command(BaseCommand):
+    help = (
+        "Import notes for a user from NDJSON (e.g. an export_notes dump), CSV "
+        "(title,content,tags columns) or a directory/ZIP of Markdown files. Input is "
+        "streamed and written with bulk INSERTs, one transaction per chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="Username, email or id of the notes' owner")
+        parser.add_argument("path", help="Input file or directory ('-' reads NDJSON from stdin)")
+        parser.add_argument("--format", choices=FORMATS, help="Default: guessed from the path")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument(
+            "--defer-maintenance",
+            action="store_true",
+            help="Skip per-chunk search index/vector and cache upkeep and catch up once at the end",
+        )
+
+    def handle(self, *args, **options):
+        user = resolve_user(options["user"])
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        path = options["path"]
+        import_format = options["format"] or self.guess_format(path)
+
+        started = time.perf_counter()
+
+        def progress(imported):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {imported} notes ({imported / (time.perf_counter() - started):.0f} rows/s)")
+
+        stream = None
+        if import_format == "markdown":
+            if not os.path.exists(path):
+                raise CommandError(f"{path} does not exist.")
+            records = read_markdown(path)
+        elif path == "-":
+            records = read_ndjson(sys.stdin)
+        else:
+            try:
+                stream = open_text(path)
+            except OSError as exc:
+                raise CommandError(str(exc))
+            records = read_csv(stream) if import_format == "csv" else read_ndjson(stream)
+        try:
+            imported, tags_created, errors = import_records(
+                user,
+                records,
+                chunk_size=options["chunk_size"],
+                defer_maintenance=options["defer_maintenance"],
+                on_chunk=progress,
+            )
+        finally:
+            if stream is not None:
+                stream.close()
+        elapsed = time.perf_counter() - started
+
+        for number, message in errors[:20]:
+            self.stderr.write(f"Skipped record {number}: {message}")
+        if len(errors) > 20:
+            self.stderr.write(f"... and {len(errors) - 20} more skipped records")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} notes ({tags_created} new tags) in {elapsed:.2f}s: "
+            f"{imported / max(elapsed, 1e-9):.0f} rows/s"
+        ))
+
+    def guess_format(self, path):
+        if path == "-" or path.endswith((".ndjson", ".jsonl")):
+            return "ndjson"
+        if path.endswith(".csv"):
+            return "csv"
+        if os.path.isdir(path) or path.endswith(".zip"):
+            return "markdown"
+        raise CommandError("Can't tell the input format from the path; pass --format.")
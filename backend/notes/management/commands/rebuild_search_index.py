@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.search import fts_search_enabled, rebuild_fts_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite FTS5 note search index from the notes and tags tables."
+
+    def handle(self, *args, **options):
+        if not fts_search_enabled():
+            raise CommandError("The FTS5 search index requires SQLite with FTS5 and SQLITE_FTS_SEARCH enabled.")
+        indexed = rebuild_fts_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {indexed} notes"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from notes.tags import reconcile_tag_usage
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the materialized tag usage counters from the note-tag links. "
+        "Meant to run nightly to repair drift from writes that bypassed the signals."
+    )
+
+    def handle(self, *args, **options):
+        corrections = reconcile_tag_usage()
+        self.stdout.write(self.style.SUCCESS(f"Corrected {corrections} tag usage counters"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.models import Note
+from notes.search import postgres_search_enabled, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Backfill the stored full-text search vector on notes (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every note, not only those with an empty search vector.",
+        )
+
+    def handle(self, *args, **options):
+        if not postgres_search_enabled():
+            raise CommandError("Stored search vectors require USE_POSTGRES and a PostgreSQL database.")
+
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        queryset = Note.objects.all() if options["all"] else Note.objects.filter(search_vector__isnull=True)
+        total = queryset.count()
+
+        updated = 0
+        last = 0
+        # Update in primary-key batches to keep each statement (and its locks) short;
+        # only one batch of ids is held at a time, however large the table
+        while True:
+            batch = list(queryset.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not batch:
+                break
+            last = batch[-1]
+            updated += update_search_vectors(Note.objects.filter(pk__in=batch))
+            self.stdout.write(f"Updated {updated}/{total} notes")
+
+        self.stdout.write(self.style.SUCCESS(f"Search vectors updated for {updated} notes"))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:35
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+GIN_INDEX_NAME = 'notes_note_search_vector_gin'
+
+
+def create_search_index(apps, schema_editor):
+    # GIN indexes (and tsvector values) only exist on PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {GIN_INDEX_NAME} ON notes_note USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {GIN_INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_tag_note'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Existing rows are populated by `manage.py update_search_vectors`
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
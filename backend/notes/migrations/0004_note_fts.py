@@ -0,0 +1,42 @@
+from django.db import migrations, OperationalError
+
+
+FTS_TABLE = 'notes_note_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    # SQLite-only full-text mirror of notes; PostgreSQL uses Note.search_vector
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, content, tags, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        # SQLite built without FTS5: search falls back to icontains
+        return
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE}(rowid, title, content, tags) "
+        "SELECT n.id, n.title, n.content, "
+        "COALESCE((SELECT group_concat(t.name, ' ') FROM notes_tag t "
+        "JOIN notes_note_tags nt ON nt.tag_id = t.id WHERE nt.note_id = n.id), '') "
+        "FROM notes_note n"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_note_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
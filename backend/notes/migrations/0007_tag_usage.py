@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_tag_usage(apps, schema_editor):
+    Tag = apps.get_model('notes', 'Tag')
+    TagUsage = apps.get_model('notes', 'TagUsage')
+    Through = apps.get_model('notes', 'Note').tags.through
+    rows = (
+        Through.objects.values('note__user_id', 'tag_id')
+        .annotate(count=models.Count('id'))
+        .order_by()
+    )
+    usages, totals = [], {}
+    for row in rows.iterator():
+        usages.append(TagUsage(user_id=row['note__user_id'], tag_id=row['tag_id'], count=row['count']))
+        totals[row['tag_id']] = totals.get(row['tag_id'], 0) + row['count']
+    TagUsage.objects.bulk_create(usages, batch_size=1000)
+    for tag_id, count in totals.items():
+        Tag.objects.filter(pk=tag_id).update(usage_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_note_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-usage_count', 'name'], name='notes_tag_usage_c_215ad5_idx'),
+        ),
+        migrations.AddField(
+            model_name='tagusage',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='notes.tag'),
+        ),
+        migrations.AddField(
+            model_name='tagusage',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_usages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tagusage',
+            index=models.Index(fields=['user', '-count'], name='notes_tagus_user_id_78d367_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagusage',
+            constraint=models.UniqueConstraint(fields=('user', 'tag'), name='unique_tag_usage'),
+        ),
+        migrations.RunPython(count_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    # Profiles used to be (re)created on every user save; now only on creation
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('notes', 'UserProfile')
+    UserProfile.objects.bulk_create(
+        [
+            UserProfile(user=user, name=user.first_name or user.username)
+            for user in User.objects.filter(profile__isnull=True).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('notes', '0007_tag_usage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
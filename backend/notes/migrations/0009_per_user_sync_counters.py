@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:40
+
+from django.db import migrations
+
+
+def split_counters(apps, schema_editor):
+    # Every owner's sequence continues from the global one, so positions
+    # already handed out stay below anything written from now on
+    SyncCounter = apps.get_model('notes', 'SyncCounter')
+    Note = apps.get_model('notes', 'Note')
+    NoteTombstone = apps.get_model('notes', 'NoteTombstone')
+    values = dict(SyncCounter.objects.filter(name__in=('notes', 'tombstone_floor')).values_list('name', 'value'))
+    owners = set(Note.objects.values_list('user_id', flat=True).distinct())
+    owners |= set(NoteTombstone.objects.values_list('user_id', flat=True).distinct())
+    SyncCounter.objects.bulk_create([
+        SyncCounter(name=f'{name}:{user_id}', value=value)
+        for user_id in owners
+        for name, value in values.items()
+        if value
+    ], ignore_conflicts=True)
+    SyncCounter.objects.filter(name__in=('notes', 'tombstone_floor')).delete()
+
+
+def merge_counters(apps, schema_editor):
+    SyncCounter = apps.get_model('notes', 'SyncCounter')
+    for name in ('notes', 'tombstone_floor'):
+        per_user = SyncCounter.objects.filter(name__startswith=f'{name}:')
+        value = max(per_user.values_list('value', flat=True), default=0)
+        per_user.delete()
+        SyncCounter.objects.update_or_create(name=name, defaults={'value': value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_backfill_user_profiles'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='note',
+            name='notes_note_change__61bfa2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notetombstone',
+            name='notes_notet_change__dbceb7_idx',
+        ),
+        migrations.RunPython(split_counters, merge_counters),
+    ]
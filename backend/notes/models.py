@@ -1,9 +1,17 @@
-from django.db import models
+import contextvars
+from contextlib import contextmanager
+
+from django.db import connections, models, router, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 
 
 User = get_user_model()
 
+# Inside SyncCounter.shared(): the values handed out so far, by counter key
+_shared_values = contextvars.ContextVar("sync_counter_shared", default=None)
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -24,13 +32,107 @@ class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     color = models.CharField(max_length=7, default="#3B82F6")  # hex color like #3B82F6
     created_at = models.DateTimeField(auto_now_add=True)
+    # Number of notes with this tag, maintained incrementally (see notes.tags)
+    usage_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["-usage_count", "name"]),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        # usage_count only changes through F() updates; never write back a stale copy
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "usage_count"
+            ]
+        super().save(*args, **kwargs)
+
+
+class SyncCounter(models.Model):
+    """
+    Monotonically increasing counters kept per user (e.g. the change sequence
+    of their notes), so writes by different users never wait on each other.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    NOTES = "notes"
+    # Highest change_seq whose tombstones have been pruned
+    TOMBSTONE_FLOOR = "tombstone_floor"
+
+    def __str__(self) -> str:
+        return f"{self.name}={self.value}"
+
+    @staticmethod
+    def key(name: str, user_id) -> str:
+        return f"{name}:{user_id}"
+
+    @classmethod
+    def next_value(cls, name: str, user_id) -> int:
+        key = cls.key(name, user_id)
+        shared = _shared_values.get()
+        if shared is not None and key in shared:
+            return shared[key]
+        value = cls._advance(key)
+        if shared is not None:
+            shared[key] = value
+        return value
+
+    @classmethod
+    def _advance(cls, key: str) -> int:
+        # Its row lock is held until the surrounding transaction commits, so values
+        # become visible in the order they were handed out.
+        alias = router.db_for_write(cls)
+        connection = connections[alias]
+        if connection.features.can_return_columns_from_insert:
+            # One statement, no savepoint (UPDATE ... RETURNING: SQLite 3.35+, PostgreSQL)
+            qn = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {qn(cls._meta.db_table)} SET {qn('value')} = {qn('value')} + 1 "
+                    f"WHERE {qn('name')} = %s RETURNING {qn('value')}",
+                    [key],
+                )
+                row = cursor.fetchone()
+        else:
+            # Read the value back while the UPDATE still holds the row
+            with transaction.atomic(using=alias, savepoint=False):
+                counter = cls.objects.using(alias).filter(name=key)
+                row = counter.values_list("value").first() if counter.update(value=F("value") + 1) else None
+        if row is None:
+            # First use of this counter (e.g. the user's first write)
+            cls.objects.bulk_create([cls(name=key)], ignore_conflicts=True)
+            return cls._advance(key)
+        return row[0]
+
+    @classmethod
+    @contextmanager
+    def shared(cls):
+        """
+        One logical write: a transaction in which every next_value() call hands
+        out the same number (e.g. a note's save and the re-tagging that follows).
+        """
+        if _shared_values.get() is not None:
+            yield
+            return
+        token = _shared_values.set({})
+        try:
+            with transaction.atomic():
+                yield
+        finally:
+            _shared_values.reset(token)
+
+    @classmethod
+    def current(cls, name: str, user_id) -> int:
+        return cls.objects.filter(name=cls.key(name, user_id)).values_list("value", flat=True).first() or 0
+
 
 class Note(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notes")
@@ -39,15 +141,68 @@ class Note(models.Model):
     tags = models.ManyToManyField(Tag, blank=True, related_name="notes")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted title/content tsvector, only populated on PostgreSQL (see notes.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Position in the owner's change sequence, advanced on every write (see notes.sync)
+    change_seq = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-updated_at"]
         indexes = [
             models.Index(fields=["user", "updated_at"]),
             models.Index(fields=["user", "title"]),
+            # Seek index for keyset pagination of the unfiltered list
+            models.Index(fields=["updated_at", "id"]),
+            models.Index(fields=["user", "change_seq"]),
         ]
 
     def __str__(self) -> str:
         return f"{self.title}"
 
+    def save(self, *args, **kwargs):
+        # Allocate the sequence number and write the row in one transaction
+        with transaction.atomic(savepoint=False):
+            self.change_seq = SyncCounter.next_value(SyncCounter.NOTES, self.user_id)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "change_seq"}
+            super().save(*args, **kwargs)
+
+
+class NoteTombstone(models.Model):
+    """Record of a deleted note so sync clients can drop it from their cache."""
+
+    note_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="note_tombstones")
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "change_seq"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"Tombstone({self.note_id}@{self.change_seq})"
+
+
+class TagUsage(models.Model):
+    """Number of a user's notes carrying a tag (the per-user side of Tag.usage_count)."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tag_usages")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="usages")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tag"], name="unique_tag_usage"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-count"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"TagUsage({self.user_id}, {self.tag_id}={self.count})"
+
+
 # Create your models here.
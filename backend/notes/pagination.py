@@ -0,0 +1,115 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor, PageNumberPagination
+
+
+class NotePagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class TagPagination(PageNumberPagination):
+    """
+    Opt-in: GET /api/tags/ stays the plain list clients have always read, and
+    only ``?page=`` or ``?page_size=`` switch to the paginated envelope.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def is_requested(self, request) -> bool:
+        return not {self.page_query_param, self.page_size_query_param}.isdisjoint(request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class NoteKeysetPagination(CursorPagination):
+    """
+    Seek pagination over ``(-updated_at, -id)``.
+
+    Unlike DRF's CursorPagination (which positions on the first ordering field
+    and uses an OFFSET for ties), the cursor holds the full ``(updated_at, id)``
+    key of the boundary row, so every page is a single indexed range scan with
+    no COUNT(*) and no OFFSET however deep the client scrolls.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-updated_at", "-id")
+
+    def get_window(self, queryset, request):
+        """The seek-filtered, ordered slice that holds the requested page (plus one row)."""
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+        if reverse:
+            queryset = queryset.order_by("updated_at", "id")
+        else:
+            queryset = queryset.order_by("-updated_at", "-id")
+
+        if cursor is not None:
+            updated_at, pk = self._parse_position(cursor.position)
+            # (updated_at, id) < (x, y), written so the updated_at bound stays a range scan
+            if reverse:
+                queryset = queryset.filter(Q(updated_at__gte=updated_at) & (Q(updated_at__gt=updated_at) | Q(id__gt=pk)))
+            else:
+                queryset = queryset.filter(Q(updated_at__lte=updated_at) & (Q(updated_at__lt=updated_at) | Q(id__lt=pk)))
+        return queryset[:self.get_page_size(request) + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        # Fetch one extra row to learn whether another page exists
+        results = list(self.get_window(queryset, request))
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+    def get_html_context(self):
+        return {
+            "previous_url": self.get_previous_link(),
+            "next_url": self.get_next_link(),
+        }
+
+    def _position(self, note) -> str:
+        # Page rows are Note instances, or values() dicts on the fast list path
+        if isinstance(note, dict):
+            return f"{note['updated_at'].isoformat()}|{note['id']}"
+        return f"{note.updated_at.isoformat()}|{note.pk}"
+
+    def _parse_position(self, position):
+        try:
+            updated_at, pk = position.rsplit("|", 1)
+            updated_at = parse_datetime(updated_at)
+            pk = int(pk)
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if updated_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return updated_at, pk
@@ -0,0 +1,229 @@
+import contextvars
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from notes_backend.querybudget import unaudited
+
+try:
+    # Optional: available when using PostgreSQL
+    from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+    POSTGRES_SEARCH_AVAILABLE = True
+except Exception:
+    POSTGRES_SEARCH_AVAILABLE = False
+
+
+# Note fields that feed the stored search vector
+SEARCH_VECTOR_FIELDS = ("title", "content")
+
+# SQLite FTS5 mirror of note title/content/tag names, keyed by note id (rowid)
+FTS_TABLE = "notes_note_fts"
+# bm25 column weights for (title, content, tags)
+FTS_WEIGHTS = (10.0, 5.0, 2.0)
+FTS_SNIPPET_START = "<mark>"
+FTS_SNIPPET_END = "</mark>"
+FTS_SNIPPET_TOKENS = 16
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+FTS_SYNC_BATCH_SIZE = 500
+
+SEARCH_BACKEND_POSTGRES = "postgres"
+SEARCH_BACKEND_FTS = "sqlite_fts"
+SEARCH_BACKEND_BASIC = "basic"
+
+_fts_table_cache = {}
+
+# Note ids collected by deferred_fts_sync(), or None outside one
+_pending_fts = contextvars.ContextVar("pending_fts", default=None)
+
+
+def postgres_search_enabled() -> bool:
+    return (
+        getattr(settings, "USE_POSTGRES", False)
+        and POSTGRES_SEARCH_AVAILABLE
+        and connection.vendor == "postgresql"
+    )
+
+
+def fts_search_enabled() -> bool:
+    if connection.vendor != "sqlite" or not getattr(settings, "SQLITE_FTS_SEARCH", True):
+        return False
+    # The table is only missing when SQLite was built without FTS5
+    name = connection.settings_dict["NAME"]
+    if name not in _fts_table_cache:
+        with unaudited():
+            _fts_table_cache[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_table_cache[name]
+
+
+def get_search_backend() -> str:
+    if postgres_search_enabled():
+        return SEARCH_BACKEND_POSTGRES
+    if fts_search_enabled():
+        return SEARCH_BACKEND_FTS
+    return SEARCH_BACKEND_BASIC
+
+
+def note_search_vector():
+    # Title matches rank above content matches
+    return SearchVector("title", weight="A") + SearchVector("content", weight="B")
+
+
+def update_search_vectors(queryset) -> int:
+    """Recompute the stored search vector for every note in ``queryset``."""
+    if not postgres_search_enabled():
+        return 0
+    return queryset.update(search_vector=note_search_vector())
+
+
+def needs_search_vector_update(update_fields) -> bool:
+    # A save without update_fields may have touched anything
+    if update_fields is None:
+        return True
+    return bool(set(update_fields) & set(SEARCH_VECTOR_FIELDS))
+
+
+_FTS_SELECT_SQL = """
+    SELECT n.id, n.title, n.content,
+           COALESCE((SELECT group_concat(t.name, ' ')
+                     FROM notes_tag t
+                     JOIN notes_note_tags nt ON nt.tag_id = t.id
+                     WHERE nt.note_id = n.id), '')
+    FROM notes_note n
+"""
+
+
+@contextmanager
+def deferred_fts_sync():
+    """
+    One logical write (e.g. a note's save and the re-tagging that follows):
+    sync_fts_index() calls only collect note ids, and each note is mirrored
+    once when the block exits without an error.
+    """
+    if _pending_fts.get() is not None:
+        yield
+        return
+    pending = {}
+    token = _pending_fts.set(pending)
+    try:
+        yield
+    finally:
+        _pending_fts.reset(token)
+    sync_fts_index(pending)
+
+
+def sync_fts_index(note_ids) -> None:
+    """Re-mirror the given notes into the FTS table (deleted notes are dropped)."""
+    if not fts_search_enabled():
+        return
+    pending = _pending_fts.get()
+    if pending is not None:
+        pending.update(dict.fromkeys(note_ids))
+        return
+    note_ids = list(note_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(note_ids), FTS_SYNC_BATCH_SIZE):
+            batch = note_ids[start:start + FTS_SYNC_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, title, content, tags) "
+                f"{_FTS_SELECT_SQL} WHERE n.id IN ({placeholders})",
+                batch,
+            )
+
+
+def rebuild_fts_index() -> int:
+    """Repopulate the FTS table from scratch and return the number of notes indexed."""
+    if not fts_search_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}(rowid, title, content, tags) {_FTS_SELECT_SQL}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def fts_match_expression(query: str) -> str:
+    # Quote every term so user input can never be parsed as FTS5 query syntax
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def get_search_snippets(note_ids, query, backend=None):
+    """Map note id -> highlighted FTS snippet, or None when snippets aren't available."""
+    if (backend or get_search_backend()) != SEARCH_BACKEND_FTS:
+        return None
+    match = fts_match_expression(query)
+    if not match:
+        return None
+    ids = list(note_ids)
+    if not ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    # snippet() is expensive, so only compute it for the rows actually returned
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, %s, %s) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [FTS_SNIPPET_START, FTS_SNIPPET_END, "…", FTS_SNIPPET_TOKENS, match, *ids],
+        )
+        return dict(cursor.fetchall())
+
+
+def attach_search_snippets(notes, query) -> None:
+    """Set ``snippet`` on each note of an already paginated FTS result page."""
+    if not notes:
+        return
+    snippets = get_search_snippets([note.pk for note in notes], query)
+    if snippets is None:
+        return
+    for note in notes:
+        note.snippet = snippets.get(note.pk, "")
+
+
+def search_notes(queryset, query, backend=None):
+    backend = backend or get_search_backend()
+
+    if backend == SEARCH_BACKEND_POSTGRES:
+        # Query the persisted, GIN-indexed column instead of re-tokenizing every row
+        search_query = SearchQuery(query)
+        return (
+            queryset
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "-updated_at")
+        )
+
+    if backend == SEARCH_BACKEND_FTS:
+        match = fts_match_expression(query)
+        if not match:
+            return queryset.none()
+        weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+        # Join the FTS table once so bm25() is evaluated inside the MATCH cursor. The
+        # redundant id IN (...) steers SQLite into driving the join from the FTS index
+        # instead of probing it once per note when another filter (e.g. user) is present.
+        return (
+            queryset
+            .extra(
+                tables=[FTS_TABLE],
+                where=[
+                    f"{FTS_TABLE}.rowid = notes_note.id",
+                    f"{FTS_TABLE} MATCH %s",
+                    f"notes_note.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)",
+                ],
+                params=[match, match],
+                # bm25() is lower-is-better; negate it so "-rank" means best first on every backend
+                select={"rank": f"-bm25({FTS_TABLE}, {weights})"},
+            )
+            .order_by("-rank", "-updated_at")
+        )
+
+    # Fallback to icontains filter across key fields
+    return queryset.filter(
+        Q(title__icontains=query) |
+        Q(content__icontains=query)
+    ).order_by("-updated_at")
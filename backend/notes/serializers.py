@@ -1,26 +1,92 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
-from .models import Tag, Note
+from notes_backend.metrics import TimedSerializerMixin
 
+from .models import SyncCounter, Tag, Note
+from .search import deferred_fts_sync
+from .tags import get_or_create_tags, resolve_tag_ids
 
-class MinimalUserSerializer(serializers.ModelSerializer):
+
+class MinimalUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Note._meta.get_field('user').remote_field.model
         fields = ("id", "email", "username")
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ("id", "name", "color", "created_at")
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class TagCountSerializer(TagSerializer):
+    # Notes carrying the tag: all notes, or the requesting user's (?counts=mine)
+    note_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ("note_count",)
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """
+    ManyRelatedField that resolves all primary keys with one IN query instead
+    of one SELECT per item. Tags are shared through ``context["tag_cache"]`` so
+    the serializers of a bulk request don't query the same ids again.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        pks = []
+        for item in data:
+            if item is None:
+                child.fail('null')
+            # pk.to_python() would read True as 1 and 1.5 as 1; digit strings (form posts) are fine
+            if isinstance(item, bool) or not isinstance(item, (int, str)):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(Tag._meta.pk.to_python(item))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        tags = resolve_tag_ids(pks, self.context.setdefault("tag_cache", {}))
+        for pk in pks:
+            if pk not in tags:
+                child.fail('does_not_exist', pk_value=pk)
+        return [tags[pk] for pk in pks]
+
+
+class TagPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+
+class NoteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
-    tag_ids = serializers.PrimaryKeyRelatedField(
+    tag_ids = TagPrimaryKeyRelatedField(
         many=True, write_only=True, queryset=Tag.objects.all(), required=False, source="tags"
     )
+    # Tags by name, created if they don't exist yet (added to any tag_ids)
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=Tag._meta.get_field("name").max_length),
+        write_only=True,
+        required=False,
+    )
     user = MinimalUserSerializer(read_only=True)
+    # Highlighted match excerpt, only present on SQLite FTS search results
+    snippet = serializers.CharField(read_only=True)
+    # Truncated content, only present in ?view=summary / ?fields=preview lists
+    preview = serializers.SerializerMethodField()
 
     class Meta:
         model = Note
@@ -30,25 +96,89 @@ class NoteSerializer(serializers.ModelSerializer):
             "content",
             "tags",
             "tag_ids",
+            "tag_names",
             "user",
             "created_at",
             "updated_at",
+            "snippet",
+            "preview",
         )
         read_only_fields = ("created_at", "updated_at")
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldset: drop everything the caller didn't ask for
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        else:
+            self.fields.pop("preview")
+
+    def get_preview(self, obj):
+        preview = obj.preview
+        limit = settings.NOTES_PREVIEW_LENGTH
+        # The queryset fetches one character past the limit to detect truncation
+        return preview if len(preview) <= limit else preview[:limit] + "…"
+
+    def pop_tags(self, validated_data):
+        """The Tag objects given by tag_ids and tag_names, or None if neither was sent."""
+        tags = validated_data.pop("tags", None)
+        names = validated_data.pop("tag_names", None)
+        if names is not None:
+            by_name, _ = get_or_create_tags(names)
+            tags = list(dict.fromkeys([*(tags or []), *by_name.values()]))
+        return tags
+
+    # The note and its tag links are one write: one transaction, one change_seq,
+    # one FTS sync
+    @SyncCounter.shared()
+    @deferred_fts_sync()
     def create(self, validated_data):
-        tags = validated_data.pop("tags", [])
+        tags = self.pop_tags(validated_data)
         note = Note.objects.create(**validated_data)
         if tags:
             note.tags.set(tags)
         return note
 
+    @SyncCounter.shared()
+    @deferred_fts_sync()
     def update(self, instance, validated_data):
-        tags = validated_data.pop("tags", None)
+        tags = self.pop_tags(validated_data)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        # Save only the changed columns so tag-only edits skip search vector maintenance
+        instance.save(update_fields=[*validated_data, "updated_at"])
         if tags is not None:
             instance.tags.set(tags)
         return instance
 
+
+class BulkNoteOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=("create", "update", "delete"))
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs["op"] != "create" and attrs.get("id") is None:
+            raise serializers.ValidationError({"id": "This field is required for update and delete."})
+        if attrs["op"] != "delete" and not isinstance(attrs.get("data"), dict):
+            raise serializers.ValidationError({"data": "This field is required for create and update."})
+        return attrs
+
+
+class BulkNoteSerializer(serializers.Serializer):
+    operations = BulkNoteOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        limit = getattr(settings, "NOTES_BULK_MAX_OPERATIONS", 500)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} operations per request.")
+        return value
+
+
+class NoteSyncSerializer(serializers.Serializer):
+    notes = NoteSerializer(many=True)
+    deleted = serializers.ListField(child=serializers.IntegerField())
+    token = serializers.CharField()
+    has_more = serializers.BooleanField()
+    reset = serializers.BooleanField()
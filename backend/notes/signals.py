@@ -1,21 +1,175 @@
+import contextvars
+from contextlib import contextmanager
+
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
 from django.dispatch import receiver
 
-from .models import UserProfile
+from .models import UserProfile, Note, Tag
+from .search import fts_search_enabled, needs_search_vector_update, update_search_vectors, sync_fts_index
+from .cache import bump_note_versions, bump_tag_versions, bump_user_versions
+from .sync import mark_notes_changed, record_tombstone
+from .tags import adjust_tag_usage, tag_links
 
 
 User = get_user_model()
 
+# Set while bulk.apply_operations() deletes notes: it does the per-note delete
+# maintenance below once for the whole batch
+_batch_delete = contextvars.ContextVar("batch_delete", default=False)
+
+
+@contextmanager
+def batched_note_deletes():
+    token = _batch_delete.set(True)
+    try:
+        yield
+    finally:
+        _batch_delete.reset(token)
+
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance: User, created: bool, **kwargs):
+    # Only on creation: running this on every save (e.g. last_login) cost a query per login
     if created:
         UserProfile.objects.create(user=instance, name=getattr(instance, 'first_name', '') or instance.username)
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance: User, **kwargs):
-    # Ensure the profile exists; creates if missing
-    UserProfile.objects.get_or_create(user=instance)
+def invalidate_cached_authors(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    # Login only touches last_login, which no cached response renders
+    if created or (update_fields is not None and set(update_fields) <= {"last_login"}):
+        return
+    bump_user_versions()
+
+
+@receiver(post_save, sender=Note)
+def refresh_note_search_vector(sender, instance: Note, update_fields=None, **kwargs):
+    # Only re-tokenize when the indexed text may have changed
+    if needs_search_vector_update(update_fields):
+        update_search_vectors(Note.objects.filter(pk=instance.pk))
+        sync_fts_index([instance.pk])
+
+
+@receiver(post_delete, sender=Note)
+def remove_deleted_note(sender, instance: Note, origin=None, **kwargs):
+    if _batch_delete.get():
+        return
+    sync_fts_index([instance.pk])
+    # Leave a tombstone so sync clients learn about the deletion, unless the
+    # owner is being deleted too (the tombstone would reference a deleted user)
+    owner_deleted = isinstance(origin, User) or getattr(origin, "model", None) is User
+    if not owner_deleted:
+        record_tombstone(instance.pk, instance.user_id)
+
+
+def _note_tags_changed(note_ids, user_id=None) -> None:
+    # Tag names are part of the SQLite FTS document and of the synced note payload
+    note_ids = list(note_ids)
+    sync_fts_index(note_ids)
+    mark_notes_changed(note_ids, user_id)
+
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def refresh_retagged_notes(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _note_tags_changed([instance.pk], instance.user_id)
+        return
+    if action == "pre_clear":
+        instance._tagged_note_ids = list(instance.notes.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        _note_tags_changed(pk_set)
+    elif action == "post_clear":
+        _note_tags_changed(getattr(instance, "_tagged_note_ids", []))
+
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_add":
+        # pk_set only holds the links actually created
+        if reverse:
+            pairs = [(user_id, instance.pk) for user_id in Note.objects.filter(pk__in=pk_set).values_list("user_id", flat=True)]
+        else:
+            pairs = [(instance.user_id, tag_id) for tag_id in pk_set]
+        adjust_tag_usage(pairs, +1)
+    elif action in ("pre_remove", "pre_clear"):
+        # pk_set may name links that don't exist; count the rows about to go
+        links = {"tag_id": instance.pk} if reverse else {"note_id": instance.pk}
+        if action == "pre_remove":
+            links["note_id__in" if reverse else "tag_id__in"] = pk_set
+        instance._removed_tag_links = tag_links(**links)
+    elif action in ("post_remove", "post_clear"):
+        adjust_tag_usage(getattr(instance, "_removed_tag_links", []), -1)
+
+
+@receiver(pre_delete, sender=Note)
+def uncount_deleted_note_tags(sender, instance: Note, **kwargs):
+    if _batch_delete.get():
+        return
+    # The cascade removes the note's tag links without m2m_changed
+    adjust_tag_usage(tag_links(note_id=instance.pk), -1)
+
+
+# Tag fields rendered inside synced notes; only the name is in the FTS document
+TAG_RENDERED_FIELDS = ("name", "color")
+
+
+@receiver(pre_save, sender=Tag)
+def collect_changed_tag_fields(sender, instance: Tag, update_fields=None, **kwargs):
+    instance._changed_fields = set()
+    fields = [name for name in TAG_RENDERED_FIELDS if update_fields is None or name in update_fields]
+    if instance._state.adding or not fields:
+        return
+    before = Tag.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    instance._changed_fields = {name for name in fields if before.get(name, getattr(instance, name)) != getattr(instance, name)}
+
+
+@receiver(post_save, sender=Tag)
+def refresh_notes_of_changed_tag(sender, instance: Tag, created: bool, **kwargs):
+    changed = getattr(instance, "_changed_fields", set())
+    if created or not changed:
+        return
+    if "name" in changed:
+        sync_fts_index(instance.notes.values_list("pk", flat=True))
+    # However many notes carry the tag: one UPDATE with a subquery
+    mark_notes_changed(Note.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def collect_notes_of_deleted_tag(sender, instance: Tag, **kwargs):
+    # While the links still exist; their cascade deletion sends no m2m_changed
+    mark_notes_changed(Note.objects.filter(tags=instance))
+    if fts_search_enabled():
+        instance._tagged_note_ids = list(instance.notes.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def refresh_notes_of_deleted_tag(sender, instance: Tag, **kwargs):
+    # sync_fts_index() writes in batches, so a popular tag stays under SQLite's parameter limit
+    sync_fts_index(getattr(instance, "_tagged_note_ids", []))
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_cached_note(sender, instance: Note, **kwargs):
+    if _batch_delete.get():
+        return
+    bump_note_versions(note_ids=[instance.pk], user_ids=[instance.user_id])
+
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def invalidate_cached_note_tags(sender, instance, action, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        # Changed from the tag side: every notes response embeds tags
+        bump_tag_versions()
+    else:
+        bump_note_versions(note_ids=[instance.pk], user_ids=[instance.user_id])
+
 
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_cached_tags(sender, instance: Tag, **kwargs):
+    bump_tag_versions()
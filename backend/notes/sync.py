@@ -0,0 +1,135 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Max, Q, QuerySet
+from django.utils import timezone
+
+from .models import Note, NoteTombstone, SyncCounter
+
+
+TOKEN_SALT = "notes.sync"
+
+# A sync starting without a token (or after a reset) replays every note
+INITIAL_POSITION = (-1, None)
+
+
+class InvalidSyncToken(Exception):
+    pass
+
+
+def encode_token(user_id, seq: int, last_id=None) -> str:
+    payload = {"u": user_id, "s": seq}
+    if last_id is not None:
+        payload["i"] = last_id
+    return signing.dumps(payload, salt=TOKEN_SALT, compress=True)
+
+
+def decode_token(token: str):
+    """Return ``(user_id, seq, last_id)``; ``user_id`` is None for tokens of the former global stream."""
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT)
+        return payload.get("u"), int(payload["s"]), payload.get("i")
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidSyncToken
+
+
+def mark_notes_changed(notes, user_id=None) -> None:
+    """
+    Advance the change sequence of notes whose rendered data changed without a
+    save. ``notes`` is a few note ids, or a Note queryset for any number of
+    notes (one UPDATE per owner with a subquery instead of an IN list).
+    ``user_id`` names their owner when the caller already knows it.
+    """
+    if not isinstance(notes, QuerySet):
+        note_ids = list(notes)
+        if not note_ids:
+            return
+        notes = Note.objects.filter(pk__in=note_ids)
+    with transaction.atomic():
+        if user_id is not None:
+            owners = [user_id]
+        else:
+            # Sorted, so transactions touching several owners lock their counters in the same order
+            owners = sorted(set(notes.order_by().values_list("user_id", flat=True)))
+        for owner in owners:
+            notes.filter(user_id=owner).update(change_seq=SyncCounter.next_value(SyncCounter.NOTES, owner))
+
+
+def record_tombstone(note_id, user_id) -> None:
+    NoteTombstone.objects.create(
+        note_id=note_id, user_id=user_id, change_seq=SyncCounter.next_value(SyncCounter.NOTES, user_id)
+    )
+
+
+def prune_tombstones(older_than=None) -> int:
+    """Delete old tombstones; tokens from before an owner's newest pruned one must resync."""
+    if older_than is None:
+        older_than = timezone.now() - timedelta(days=getattr(settings, "SYNC_TOMBSTONE_RETENTION_DAYS", 30))
+    deleted = 0
+    with transaction.atomic():
+        floors = (
+            NoteTombstone.objects.filter(deleted_at__lt=older_than)
+            .order_by()
+            .values_list("user_id")
+            .annotate(floor=Max("change_seq"))
+        )
+        for user_id, floor in floors:
+            SyncCounter.objects.update_or_create(
+                name=SyncCounter.key(SyncCounter.TOMBSTONE_FLOOR, user_id), defaults={"value": floor}
+            )
+            deleted += NoteTombstone.objects.filter(user_id=user_id, change_seq__lte=floor).delete()[0]
+    return deleted
+
+
+def get_changes(notes, tombstones, user_id, token=None, limit=500):
+    """
+    Return the notes of ``user_id`` and their deleted ids changed after ``token``.
+
+    ``notes``/``tombstones`` are the base querysets; each stream follows one
+    owner, whose change sequence orders it. Results are bounded by the committed
+    counter value read up front: sequence numbers are handed out under a lock
+    held until commit, so everything at or below it is already visible and
+    nothing can later appear behind the returned token.
+    """
+    token_user, since, last_id = decode_token(token) if token else (user_id, *INITIAL_POSITION)
+    if token_user is not None and token_user != user_id:
+        raise InvalidSyncToken
+    reset = False
+    if token_user is None or (since >= 0 and since < SyncCounter.current(SyncCounter.TOMBSTONE_FLOOR, user_id)):
+        # Deletions this client hasn't seen were pruned (or the token predates
+        # per-owner streams): start over
+        since, last_id, reset = *INITIAL_POSITION, True
+
+    notes = notes.filter(user_id=user_id)
+    tombstones = tombstones.filter(user_id=user_id)
+    upper = SyncCounter.current(SyncCounter.NOTES, user_id)
+    after = Q(change_seq__gt=since)
+    if last_id is not None:
+        after |= Q(change_seq=since, id__gt=last_id)
+    changed = list(
+        notes.filter(after, change_seq__lte=upper).order_by("change_seq", "id")[:limit + 1]
+    )
+    has_more = len(changed) > limit
+    changed = changed[:limit]
+
+    if has_more:
+        # Stop mid-stream: resume after the last returned note
+        boundary = changed[-1].change_seq
+        next_token = encode_token(user_id, boundary, changed[-1].pk)
+    else:
+        boundary = upper
+        next_token = encode_token(user_id, upper)
+    deleted = list(
+        tombstones.filter(change_seq__gt=since, change_seq__lte=boundary)
+        .order_by("change_seq")
+        .values_list("note_id", flat=True)
+    )
+    return {
+        "notes": changed,
+        "deleted": deleted,
+        "token": next_token,
+        "has_more": has_more,
+        "reset": reset,
+    }
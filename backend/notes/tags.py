@@ -0,0 +1,109 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import bump_tag_usage_versions, bump_tag_versions
+from .models import Note, Tag, TagUsage
+
+
+def resolve_tag_ids(pks, cache=None):
+    """
+    Map tag id -> Tag for ``pks`` with one IN query. ``cache`` (a dict shared
+    through the serializer context) lets several serializers in one request
+    reuse the tags already loaded.
+    """
+    cache = {} if cache is None else cache
+    missing = {pk for pk in pks if pk not in cache}
+    if missing:
+        cache.update(Tag.objects.in_bulk(missing))
+    return cache
+
+
+def get_or_create_tags(names):
+    """Map tag name -> Tag, creating the missing ones with a single INSERT."""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}, 0
+    found = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in found]
+    if missing:
+        # ignore_conflicts: a concurrent request may create the same name first
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        found.update((tag.name, tag) for tag in Tag.objects.filter(name__in=missing))
+        # bulk_create sends no post_save, so invalidate cached tag lists here
+        bump_tag_versions()
+    return found, len(missing)
+
+
+def adjust_tag_usage(pairs, delta) -> None:
+    """
+    Add ``delta`` (+1/-1) to the usage counters once per ``(user_id, tag_id)``
+    pair, i.e. per note-tag link added or removed. Statements are grouped by
+    amount, so a whole retagging costs a few UPDATEs however many tags it touches.
+    """
+    pairs = Counter(pairs)
+    if not pairs:
+        return
+    per_tag = Counter()
+    per_user = defaultdict(list)
+    for (user_id, tag_id), amount in pairs.items():
+        per_tag[tag_id] += amount
+        per_user[user_id, amount].append(tag_id)
+
+    with transaction.atomic():
+        by_amount = defaultdict(list)
+        for tag_id, amount in per_tag.items():
+            by_amount[amount].append(tag_id)
+        for amount, tag_ids in by_amount.items():
+            Tag.objects.filter(pk__in=tag_ids).update(usage_count=F("usage_count") + amount * delta)
+
+        if delta > 0:
+            TagUsage.objects.bulk_create(
+                [TagUsage(user_id=user_id, tag_id=tag_id) for user_id, tag_id in pairs],
+                ignore_conflicts=True,
+            )
+        for (user_id, amount), tag_ids in per_user.items():
+            TagUsage.objects.filter(user_id=user_id, tag_id__in=tag_ids).update(count=F("count") + amount * delta)
+    bump_tag_usage_versions()
+
+
+def tag_links(**filters):
+    """``(user_id, tag_id)`` of the note-tag links matching ``filters`` on the through table."""
+    return list(Note.tags.through.objects.filter(**filters).values_list("note__user_id", "tag_id"))
+
+
+@transaction.atomic
+def reconcile_tag_usage() -> int:
+    """Recount every usage counter from the note-tag links; returns the number of corrections."""
+    Through = Note.tags.through
+    actual = Counter()
+    for user_id, tag_id, count in (
+        Through.objects.values_list("note__user_id", "tag_id").annotate(count=Count("id")).order_by().iterator()
+    ):
+        actual[user_id, tag_id] = count
+
+    stored = {(usage.user_id, usage.tag_id): usage for usage in TagUsage.objects.all()}
+    stale = [usage for key, usage in stored.items() if key not in actual]
+    changed = []
+    for key, count in actual.items():
+        usage = stored.get(key)
+        if usage is None:
+            stored[key] = TagUsage(user_id=key[0], tag_id=key[1], count=count)
+        elif usage.count != count:
+            usage.count = count
+            changed.append(usage)
+    new = [usage for key, usage in stored.items() if usage.pk is None]
+    # Rows left at zero by removals are dropped too, but aren't corrections
+    TagUsage.objects.filter(pk__in=[usage.pk for usage in stale]).delete()
+    TagUsage.objects.bulk_create(new, batch_size=1000)
+    TagUsage.objects.bulk_update(changed, ["count"], batch_size=1000)
+    corrections = sum(1 for usage in stale if usage.count) + len(new) + len(changed)
+
+    per_tag = Through.objects.filter(tag_id=OuterRef("pk")).values("tag_id").annotate(count=Count("id")).values("count")
+    wrong = Tag.objects.exclude(usage_count=Coalesce(Subquery(per_tag), Value(0)))
+    corrections += wrong.update(usage_count=Coalesce(Subquery(per_tag), Value(0)))
+    if corrections:
+        bump_tag_usage_versions()
+    return corrections
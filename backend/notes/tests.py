@@ -1,12 +1,53 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import partial
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APIClient
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
-from .models import Note
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core import signing
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from accounts.revocation import revocations
+from notes_backend.parsers import FastJSONParser
+from notes_backend.metrics import registry, timed
+from notes_backend.querybudget import QueryAuditMiddleware, QueryBudgetExceeded, normalize_sql
+from notes_backend.renderers import FastJSONRenderer
+from notes_backend.replicas import ReplicaRouter, _read_alias, choose_read_alias, health, is_sticky
+from notes_backend.throttling import ScopedRateThrottle, SlidingWindowRateThrottle
+from .async_views import AsyncNoteDetailView, AsyncNoteListView, AsyncTagListView
+from .export import export_notes
+from . import bulk, search
+from .importer import import_records
+from .models import Note, NoteTombstone, SyncCounter, Tag, TagUsage
+from .search import search_notes
+from .sync import TOKEN_SALT, prune_tombstones
+from .views import NoteViewSet
 
 
 class NotesApiTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         User = get_user_model()
         self.user = User.objects.create_user(username='alice', email='alice@example.com', password='Password123!')
@@ -41,4 +82,1243 @@ class NotesApiTests(TestCase):
         rforbid = client2.put(f'/api/notes/{note_id}/', {"title": "hacked", "content": "no"}, format='json')
         self.assertIn(rforbid.status_code, (403,))
 
+    def test_search_after_update(self):
+        r = self.client.post('/api/notes/', {"title": "groceries", "content": "milk"}, format='json')
+        self.assertEqual(r.status_code, 201)
+        note_id = r.data['id']
+        rpatch = self.client.patch(f'/api/notes/{note_id}/', {"content": "oat milk and bread"}, format='json')
+        self.assertEqual(rpatch.status_code, 200)
+        rsearch = self.client.get('/api/notes/', {"q": "bread"})
+        self.assertEqual([n['id'] for n in rsearch.data['results']], [note_id])
+        self.assertEqual(rsearch.data['results'][0]['title'], "groceries")
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='erin', email='erin@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.note = Note.objects.create(user=self.user, title="first", content="body")
+
+    def test_list_hit_then_invalidated_by_write(self):
+        r1 = self.client.get('/api/notes/', {"page_size": 5})
+        self.assertEqual(r1['X-Cache'], 'MISS')
+        # The validators are cached with the page: a hit runs no query
+        with self.assertNumQueries(0):
+            r2 = self.client.get('/api/notes/', {"page_size": 5})
+        self.assertEqual(r2['X-Cache'], 'HIT')
+        self.assertEqual(r2.data, r1.data)
+
+        self.client.patch(f'/api/notes/{self.note.id}/', {"title": "renamed"}, format='json')
+        r3 = self.client.get('/api/notes/', {"page_size": 5})
+        self.assertEqual(r3['X-Cache'], 'MISS')
+        self.assertEqual(r3.data['results'][0]['title'], "renamed")
+
+    def test_tag_rename_invalidates_notes(self):
+        tag = Tag.objects.create(name="old")
+        self.note.tags.add(tag)
+        self.client.get(f'/api/notes/{self.note.id}/')
+        tag.name = "new"
+        tag.save()
+        r = self.client.get(f'/api/notes/{self.note.id}/')
+        self.assertEqual(r['X-Cache'], 'MISS')
+        self.assertEqual(r.data['tags'][0]['name'], "new")
+
+    def test_stats_require_staff(self):
+        self.assertEqual(self.client.get('/api/cache/stats/').status_code, 403)
+        self.client.get('/api/tags/')
+        self.client.get('/api/tags/')
+        self.user.is_staff = True
+        self.user.save()
+        r = self.client.get('/api/cache/stats/')
+        self.assertEqual(r.data['tags']['hits'], 1)
+        self.assertEqual(r.data['tags']['misses'], 1)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='frank', email='frank@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.note = Note.objects.create(user=self.user, title="draft", content="body")
+
+    def test_list_not_modified_until_change(self):
+        r = self.client.get('/api/notes/')
+        etag = r['ETag']
+        self.assertIn('Last-Modified', r)
+        r304 = self.client.get('/api/notes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r304.status_code, 304)
+        self.assertEqual(r304.content, b'')
+
+        # A deletion doesn't advance max(updated_at) but still changes the ETag
+        Note.objects.create(user=self.user, title="extra", content="")
+        self.note.delete()
+        r = self.client.get('/api/notes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+
+    def test_cached_list_answers_304_without_queries(self):
+        r = self.client.get('/api/notes/', {"q": "body"})
+        self.assertEqual(r['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            r304 = self.client.get('/api/notes/', {"q": "body"}, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(r304.status_code, 304)
+        with self.assertNumQueries(0):
+            hit = self.client.get('/api/notes/', {"q": "body"})
+        self.assertEqual((hit['X-Cache'], hit['ETag'], hit['Last-Modified']), ('HIT', r['ETag'], r['Last-Modified']))
+        self.note.title = "moved"
+        self.note.save()
+        r = self.client.get('/api/notes/', {"q": "body"}, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(r.status_code, 200)
+
+    def test_list_etag_follows_retagging(self):
+        etag = self.client.get('/api/notes/')['ETag']
+        self.note.tags.add(Tag.objects.create(name="late"))
+        self.assertEqual(self.client.get('/api/notes/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_retrieve_if_modified_since(self):
+        r = self.client.get(f'/api/notes/{self.note.id}/')
+        r304 = self.client.get(f'/api/notes/{self.note.id}/', HTTP_IF_MODIFIED_SINCE=r['Last-Modified'])
+        self.assertEqual(r304.status_code, 304)
+
+    def test_if_match_prevents_lost_update(self):
+        etag = self.client.get(f'/api/notes/{self.note.id}/')['ETag']
+        r1 = self.client.patch(f'/api/notes/{self.note.id}/', {"title": "mine"}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(r1.status_code, 200)
+        self.assertNotEqual(r1['ETag'], etag)
+        # A second writer still holding the old ETag is rejected
+        r2 = self.client.patch(f'/api/notes/{self.note.id}/', {"title": "theirs"}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(r2.status_code, 412)
+        r3 = self.client.delete(f'/api/notes/{self.note.id}/', HTTP_IF_MATCH=etag)
+        self.assertEqual(r3.status_code, 412)
+        r4 = self.client.delete(f'/api/notes/{self.note.id}/', HTTP_IF_MATCH=r1['ETag'])
+        self.assertEqual(r4.status_code, 204)
+
+    def test_conditional_write_loads_the_note_once(self):
+        self.note.tags.add(Tag.objects.create(name="kept"))
+        etag = self.client.get(f'/api/notes/{self.note.id}/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.patch(f'/api/notes/{self.note.id}/', {"title": "once"}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        note_reads = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'FROM "notes_note" ' in q['sql']]
+        self.assertEqual(len(note_reads), 1)
+        # Validators built from the saved instance match what a fresh GET computes
+        fresh = self.client.get(f'/api/notes/{self.note.id}/')
+        self.assertEqual(r['ETag'], fresh['ETag'])
+        self.assertEqual(r['Last-Modified'], fresh['Last-Modified'])
+
+    def test_if_match_checks_permissions_first(self):
+        etag = self.client.get(f'/api/notes/{self.note.id}/')['ETag']
+        self.note.title = "edited"
+        self.note.save()
+        other = get_user_model().objects.create_user(username='grace', email='grace@example.com', password='Password123!')
+        self.client.force_authenticate(other)
+        r = self.client.patch(f'/api/notes/{self.note.id}/', {"title": "theirs"}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(r.status_code, 403)
+        self.assertEqual(self.client.delete(f'/api/notes/{self.note.id}/', HTTP_IF_MATCH=etag).status_code, 403)
+
+    def test_non_numeric_id_is_not_found(self):
+        for method in ('get', 'put', 'patch', 'delete'):
+            with self.subTest(method=method):
+                self.assertEqual(getattr(self.client, method)('/api/notes/abc/').status_code, 404)
+
+    @override_settings(API_RESPONSE_CACHE=False)
+    def test_etags_follow_nested_changes_without_response_cache(self):
+        tag = Tag.objects.create(name="old")
+        self.note.tags.add(tag)
+        list_etag = self.client.get('/api/notes/')['ETag']
+        tag.name = "new"
+        tag.save()
+        self.assertEqual(self.client.get('/api/notes/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+        detail_etag = self.client.get(f'/api/notes/{self.note.id}/')['ETag']
+        self.user.username = "francis"
+        self.user.save()
+        r = self.client.get(f'/api/notes/{self.note.id}/', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data['user']['username'], "francis")
+
+
+class TagResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='olga', email='olga@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.tags = [Tag.objects.create(name=f"tag{i}") for i in range(10)]
+
+    def tag_lookups(self, ctx, column):
+        return [q for q in ctx.captured_queries if f'FROM "notes_tag" WHERE "notes_tag"."{column}" IN' in q['sql']]
+
+    def test_tag_ids_resolved_with_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post('/api/notes/', {"title": "t", "tag_ids": [t.id for t in self.tags]}, format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(len(r.data['tags']), 10)
+        self.assertEqual(len(self.tag_lookups(ctx, "id")), 1)
+
+    def test_unknown_tag_id_error(self):
+        r = self.client.post('/api/notes/', {"title": "t", "tag_ids": [self.tags[0].id, 999]}, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.data['tag_ids'], ['Invalid pk "999" - object does not exist.'])
+
+    def test_malformed_tag_ids_rejected(self):
+        cases = [
+            (True, 'Incorrect type. Expected pk value, received bool.'),
+            (1.5, 'Incorrect type. Expected pk value, received float.'),
+            (None, 'This field may not be null.'),
+        ]
+        for item, message in cases:
+            with self.subTest(item=item):
+                r = self.client.post('/api/notes/', {"title": "t", "tag_ids": [self.tags[0].id, item]}, format='json')
+                self.assertEqual(r.status_code, 400)
+                self.assertEqual(r.data['tag_ids'], [message])
+        r = self.client.post('/api/notes/', {"title": "t", "tag_ids": [str(self.tags[0].id)]}, format='json')
+        self.assertEqual(r.status_code, 201)
+
+    def test_tag_names_get_or_create(self):
+        r = self.client.post('/api/notes/', {
+            "title": "t", "tag_ids": [self.tags[0].id], "tag_names": ["tag1", "brand new", "brand new"],
+        }, format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual([t['name'] for t in r.data['tags']], ["brand new", "tag0", "tag1"])
+        self.assertEqual(Tag.objects.filter(name="brand new").count(), 1)
+        # The new tag shows up in the (cached) tag list right away
+        self.assertIn("brand new", [t['name'] for t in self.client.get('/api/tags/').data])
+
+        note_id = r.data['id']
+        r = self.client.patch(f'/api/notes/{note_id}/', {"tag_names": ["tag2"]}, format='json')
+        self.assertEqual([t['name'] for t in r.data['tags']], ["tag2"])
+
+    def test_bulk_resolves_all_tags_at_once(self):
+        operations = [
+            {"op": "create", "data": {"title": f"n{i}", "tag_ids": [t.id for t in self.tags[i:i + 3]], "tag_names": [f"new{i % 2}"]}}
+            for i in range(5)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post('/api/notes/bulk/', {"operations": operations}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(self.tag_lookups(ctx, "id")), 1)
+        # Existing names, then the new ones read back after a single INSERT
+        self.assertEqual(len(self.tag_lookups(ctx, "name")), 2)
+        self.assertEqual(sum('INTO "notes_tag" (' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual(Note.objects.get(title="n4").tags.count(), 4)
+
+class TagUsageCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='pia', email='pia@example.com', password='Password123!')
+        self.other = User.objects.create_user(username='quin', email='quin@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.work = Tag.objects.create(name="work")
+        self.home = Tag.objects.create(name="home")
+        self.idea = Tag.objects.create(name="idea")
+
+    def counts(self, user=None):
+        if user is not None:
+            return dict(TagUsage.objects.filter(user=user, count__gt=0).values_list("tag__name", "count"))
+        return dict(Tag.objects.filter(usage_count__gt=0).values_list("name", "usage_count"))
+
+    def test_m2m_changes_from_both_sides(self):
+        note = Note.objects.create(user=self.user, title="a", content="")
+        note.tags.add(self.work, self.home)
+        self.idea.notes.add(note, Note.objects.create(user=self.other, title="b", content=""))
+        self.assertEqual(self.counts(), {"work": 1, "home": 1, "idea": 2})
+        self.assertEqual(self.counts(self.other), {"idea": 1})
+
+        note.tags.remove(self.work)
+        self.idea.notes.clear()
+        self.assertEqual(self.counts(), {"home": 1})
+        note.tags.set([self.work])
+        self.assertEqual(self.counts(self.user), {"work": 1})
+        note.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_bulk_and_import_keep_counts(self):
+        note = Note.objects.create(user=self.user, title="a", content="")
+        note.tags.add(self.work)
+        operations = [
+            {"op": "create", "data": {"title": "b", "tag_ids": [self.work.id, self.work.id], "tag_names": ["idea"]}},
+            {"op": "update", "id": note.id, "data": {"title": "a", "tag_ids": [self.home.id]}},
+        ]
+        r = self.client.post('/api/notes/bulk/', {"operations": operations}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.counts(), {"work": 1, "home": 1, "idea": 1})
+
+        import_records(self.other, [{"title": "c", "tags": "work, fresh"}, {"title": "d", "tags": ["fresh"]}])
+        self.assertEqual(self.counts(), {"work": 2, "home": 1, "idea": 1, "fresh": 2})
+        self.assertEqual(self.counts(self.other), {"work": 1, "fresh": 2})
+
+    def test_tag_cloud_counts_and_ordering(self):
+        for i in range(3):
+            Note.objects.create(user=self.other, title=f"o{i}", content="").tags.add(self.home)
+        Note.objects.create(user=self.user, title="m", content="").tags.add(self.work, self.idea)
+        Note.objects.create(user=self.user, title="n", content="").tags.add(self.idea)
+
+        r = self.client.get('/api/tags/', {"counts": "all"})
+        self.assertEqual([(t['name'], t['note_count']) for t in r.data], [("home", 3), ("idea", 2), ("work", 1)])
+        r = self.client.get('/api/tags/', {"counts": "mine"})
+        self.assertEqual([(t['name'], t['note_count']) for t in r.data], [("idea", 2), ("work", 1)])
+        r = self.client.get('/api/tags/', {"counts": "all", "ordering": "name"})
+        self.assertEqual([t['name'] for t in r.data], ["home", "idea", "work"])
+        self.assertNotIn("note_count", self.client.get('/api/tags/').data[0])
+        self.assertEqual(self.client.get('/api/tags/', {"counts": "some"}).status_code, 400)
+
+    def test_search_and_pagination(self):
+        Tag.objects.bulk_create([Tag(name=f"project-{i:02}") for i in range(60)])
+        # Unpaginated unless the client asks for pages
+        self.assertEqual(len(self.client.get('/api/tags/', {"search": "project"}).data), 60)
+        r = self.client.get('/api/tags/', {"search": "project", "page": 1})
+        self.assertEqual(r.data['count'], 60)
+        self.assertEqual(len(r.data['results']), 50)
+        r = self.client.get('/api/tags/', {"search": "project", "page_size": 25, "page": 3})
+        self.assertEqual([t['name'] for t in r.data['results']], [f"project-{i}" for i in range(50, 60)])
+
+    def test_cached_tag_cloud_refreshes(self):
+        note = Note.objects.create(user=self.user, title="a", content="")
+        self.assertEqual(self.client.get('/api/tags/', {"counts": "mine"}).data, [])
+        note.tags.add(self.work)
+        r = self.client.get('/api/tags/', {"counts": "mine"})
+        self.assertEqual([(t['name'], t['note_count']) for t in r.data], [("work", 1)])
+
+    def test_reconcile_fixes_drift(self):
+        note = Note.objects.create(user=self.user, title="a", content="")
+        note.tags.add(self.work, self.home)
+        Tag.objects.filter(pk=self.work.pk).update(usage_count=7)
+        TagUsage.objects.filter(tag=self.home).delete()
+        # A write that bypassed the signals
+        Note.tags.through.objects.create(note=note, tag=self.idea)
+        out = io.StringIO()
+        call_command("reconcile_tag_counts", stdout=out)
+        self.assertIn("Corrected 4 ", out.getvalue())
+        self.assertEqual(self.counts(), {"work": 1, "home": 1, "idea": 1})
+        self.assertEqual(self.counts(self.user), {"work": 1, "home": 1, "idea": 1})
+
+    def test_rename_keeps_usage_count(self):
+        Note.objects.create(user=self.user, title="a", content="").tags.add(self.work)
+        stale = Tag.objects.get(pk=self.work.pk)
+        Note.objects.create(user=self.user, title="b", content="").tags.add(self.work)
+        stale.name = "job"
+        stale.save()
+        self.assertEqual(self.counts(), {"job": 2})
+
+
+class BulkNotesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='gina', email='gina@example.com', password='Password123!')
+        self.other = User.objects.create_user(username='hank', email='hank@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(name="work")
+        self.mine = Note.objects.create(user=self.user, title="old", content="")
+        self.doomed = Note.objects.create(user=self.user, title="bye", content="")
+        self.theirs = Note.objects.create(user=self.other, title="theirs", content="")
+
+    def test_mixed_batch(self):
+        operations = [{"op": "create", "data": {"title": f"new {i}", "content": "x", "tag_ids": [self.tag.id]}} for i in range(3)]
+        operations += [
+            {"op": "update", "id": self.mine.id, "data": {"title": "updated", "tag_ids": [self.tag.id]}},
+            {"op": "delete", "id": self.doomed.id},
+        ]
+        r = self.client.post('/api/notes/bulk/', {"operations": operations}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([res['status'] for res in r.data['results']], [201, 201, 201, 200, 204])
+        self.assertEqual(r.data['results'][3]['note']['title'], "updated")
+        self.assertEqual(self.tag.notes.count(), 4)
+        self.assertFalse(Note.objects.filter(pk=self.doomed.pk).exists())
+        self.assertEqual(Note.objects.filter(user=self.user).count(), 4)
+
+    def test_forbidden_item_rejects_whole_batch(self):
+        operations = [
+            {"op": "create", "data": {"title": "never"}},
+            {"op": "update", "id": self.theirs.id, "data": {"title": "hacked"}},
+            {"op": "delete", "id": 999999},
+        ]
+        r = self.client.post('/api/notes/bulk/', {"operations": operations}, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual([(res['index'], res['status']) for res in r.data['results']], [(1, 403), (2, 404)])
+        self.assertFalse(Note.objects.filter(title="never").exists())
+        self.theirs.refresh_from_db()
+        self.assertEqual(self.theirs.title, "theirs")
+
+    def test_bulk_update_writes_only_changed_columns(self):
+        note = Note.objects.create(user=self.user, title="old", content="old body")
+        get_or_create_tags = bulk.get_or_create_tags
+
+        def write_content_meanwhile(names):
+            Note.objects.filter(pk=note.pk).update(content="new body")
+            return get_or_create_tags(names)
+
+        operations = [{"op": "update", "id": note.id, "data": {"title": "new"}}]
+        with patch.object(bulk, "get_or_create_tags", write_content_meanwhile):
+            r = self.client.post('/api/notes/bulk/', {"operations": operations}, format='json')
+        self.assertEqual(r.status_code, 200)
+        note.refresh_from_db()
+        self.assertEqual((note.title, note.content), ("new", "new body"))
+
+    def test_delete_batch_costs_fixed_queries(self):
+        queries = []
+        for size in (6, 12):
+            notes = [Note.objects.create(user=self.user, title=f"gone {i}", content="") for i in range(size)]
+            for note in notes:
+                note.tags.add(self.tag)
+            operations = [{"op": "delete", "id": note.id} for note in notes]
+            with CaptureQueriesContext(connection) as captured:
+                r = self.client.post('/api/notes/bulk/', {"operations": operations}, format='json')
+            self.assertEqual(r.status_code, 200)
+            queries.append(len(captured))
+            self.assertFalse(Note.objects.filter(pk__in=[note.pk for note in notes]).exists())
+            tombstones = set(NoteTombstone.objects.filter(user=self.user).values_list("note_id", flat=True))
+            self.assertLessEqual({note.pk for note in notes}, tombstones)
+        self.assertEqual(queries[0], queries[1])
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.usage_count, 0)
+        self.assertEqual(TagUsage.objects.get(user=self.user, tag=self.tag).count, 0)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='gus', email='gus@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.note = Note.objects.create(user=self.user, title="long", content="x" * 500)
+        self.note.tags.add(Tag.objects.create(name="t"))
+
+    def test_summary_view_truncates_and_never_reads_content(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/api/notes/', {"view": "summary"})
+        self.assertEqual(r.status_code, 200)
+        item = r.data['results'][0]
+        self.assertEqual(set(item), {"id", "title", "preview", "user", "created_at", "updated_at"})
+        self.assertEqual(len(item['preview']), settings.NOTES_PREVIEW_LENGTH + 1)
+        self.assertTrue(item['preview'].endswith("…"))
+        # Only the SUBSTR() of content is selected, and tags are not prefetched
+        selects = [q['sql'].split(" FROM ")[0] for q in ctx.captured_queries]
+        self.assertFalse(any(sql.replace('SUBSTR("notes_note"."content"', '').count('"notes_note"."content"') for sql in selects))
+        self.assertFalse(any('notes_tag' in q['sql'] for q in ctx.captured_queries))
+
+    def test_fields_selects_subset(self):
+        r = self.client.get('/api/notes/', {"fields": "id,title,tags"})
+        self.assertEqual(r.status_code, 200)
+        item = r.data['results'][0]
+        self.assertEqual(set(item), {"id", "title", "tags"})
+        self.assertEqual(item['tags'][0]['name'], "t")
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/api/notes/', {"fields": "title,password"}).status_code, 400)
+
+
+class FastListParityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='hal', email='hal@example.com', password='Password123!')
+        other = get_user_model().objects.create_user(username='ida', email='ida@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        tags = [Tag.objects.create(name=name, color=color) for name, color in (("zeta", "#111111"), ("alpha", "#222222"))]
+        for i in range(7):
+            note = Note.objects.create(user=self.user if i % 2 else other, title=f"draft {i}", content=f"draft body {i} " * 30)
+            note.tags.set(tags[:i % 3])
+
+    def test_output_matches_note_serializer(self):
+        params = (
+            {},
+            {"page_size": 3, "page": 2},
+            {"q": "draft"},
+            {"ordering": "title", "user__id": self.user.id},
+            {"pagination": "cursor", "page_size": 2},
+            {"view": "summary"},
+            {"fields": "id,tags,snippet", "q": "body"},
+        )
+        for query in params:
+            with self.subTest(query=query):
+                with self.settings(NOTES_FAST_LIST=True, API_RESPONSE_CACHE=False):
+                    fast = self.client.get('/api/notes/', query)
+                with self.settings(NOTES_FAST_LIST=False, API_RESPONSE_CACHE=False):
+                    slow = self.client.get('/api/notes/', query)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+
+
+class SlidingWindowThrottleTests(TestCase):
+    class ThreePerMinute(SlidingWindowRateThrottle):
+        rate = "3/min"
+
+        def get_cache_key(self, request, view):
+            return "throttle_test"
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='rita', email='rita@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+
+    def attempt(self, at):
+        throttle = self.ThreePerMinute()
+        throttle.timer = lambda: 6000 + at
+        return throttle.allow_request(APIRequestFactory().get("/"), None), throttle
+
+    def test_sliding_window(self):
+        for _ in range(3):
+            self.assertTrue(self.attempt(0)[0])
+        allowed, throttle = self.attempt(0)
+        self.assertFalse(allowed)
+        # Next window, once a third of this one's 3 requests have slid out
+        self.assertAlmostEqual(throttle.wait(), 80)
+        self.assertFalse(self.attempt(79)[0])
+        self.assertTrue(self.attempt(80)[0])
+        self.assertFalse(self.attempt(80)[0])
+        # Two integers per client, whatever the rate
+        self.assertEqual(cache.get("throttle_test:100"), 3)
+        self.assertEqual(cache.get("throttle_test:101"), 1)
+
+    def test_rate_limit_headers(self):
+        with patch.dict(ScopedRateThrottle.THROTTLE_RATES, {"notes": "2/min"}):
+            r = self.client.get('/api/notes/')
+            self.assertEqual((r['X-RateLimit-Limit'], r['X-RateLimit-Remaining']), ("2", "1"))
+            self.assertLessEqual(int(r['X-RateLimit-Reset']), 60)
+            self.assertEqual(self.client.get('/api/notes/')['X-RateLimit-Remaining'], "0")
+            r = self.client.get('/api/notes/')
+        self.assertEqual(r.status_code, 429)
+        self.assertEqual(r['X-RateLimit-Remaining'], "0")
+        self.assertGreater(int(r['Retry-After']), 0)
+
+
+@override_settings(METRICS_AUTH_TOKEN="s3cret", METRICS_SERVER_TIMING=True)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='sam', email='sam@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            Note.objects.create(user=self.user, title=f"n{i}", content="x")
+
+    def metrics(self):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+
+    def test_server_timing_and_metrics(self):
+        with self.settings(NOTES_FAST_LIST=False):
+            r = self.client.get('/api/notes/')
+        timing = r['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[0-9.]+;desc="\d+ queries"')
+        self.assertIn("serialize;dur=", timing)
+        self.assertIn("render;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+        self.client.get('/api/tags/')
+        text = self.metrics()
+        self.assertIn('http_requests_total{view="notes-list",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="notes-list",method="GET",le="+Inf"} 1', text)
+        self.assertIn('http_response_size_bytes_sum{view="tags-list",method="GET"} ', text)
+        self.assertIn('http_phase_seconds_total{view="notes-list",method="GET",phase="serialize"}', text)
+        queries = re.search(r'http_db_queries_total\{view="notes-list",method="GET"\} (\d+)', text)
+        self.assertGreater(int(queries.group(1)), 0)
+
+    def test_serialization_timed_once_per_response(self):
+        with self.settings(NOTES_FAST_LIST=False), patch("notes_backend.metrics.timed", wraps=timed) as spy:
+            self.assertEqual(len(self.client.get('/api/notes/').data['results']), 3)
+        self.assertEqual([c.args for c in spy.call_args_list].count(("serialize",)), 1)
+
+    def test_streamed_response_size(self):
+        r = self.client.get('/api/notes/export/')
+        body = b"".join(r.streaming_content)
+        text = self.metrics()
+        self.assertIn(f'http_response_size_bytes_sum{{view="notes-export",method="GET"}} {len(body)}.', text)
+        self.assertNotIn('http_db_queries_total{view="notes-export",method="GET"} 0', text)
+
+    def test_sampling(self):
+        with self.settings(METRICS_SAMPLE_RATE=0.0):
+            r = self.client.get('/api/notes/')
+            self.assertNotIn("Server-Timing", r)
+            self.assertNotIn('view="notes-list"', self.metrics())
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        r = self.client.get('/metrics', HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r['Content-Type'].startswith("text/plain; version=0.0.4"))
+        # Without a token the endpoint only exists in development
+        with self.settings(METRICS_AUTH_TOKEN=""):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            with self.settings(DEBUG=True):
+                self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+@override_settings(QUERY_AUDIT_MODE="raise", QUERY_AUDIT_SAMPLE_RATE=1.0)
+class QueryAuditTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='quinn', email='quinn@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        for i in range(6):
+            Note.objects.create(user=self.user, title=f"n{i}", content="x")
+
+    def per_row_queries(self, request):
+        for note in Note.objects.all():
+            Note.objects.filter(pk=note.pk, title__in=["a", "b"]).exists()
+        return JsonResponse({})
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT  *\n FROM t WHERE id = 12 AND name = 'it''s' AND tag IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND tag IN (...)",
+        )
+
+    def test_list_within_budget(self):
+        for params in ({}, {"view": "summary"}, {"pagination": "cursor"}):
+            with self.subTest(params=params), self.settings(NOTES_FAST_LIST=False):
+                cache.clear()
+                self.assertEqual(self.client.get('/api/notes/', params).status_code, 200)
+        # A real token costs the user lookup on top
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(client.get('/api/notes/', {"q": "n1"}).status_code, 200)
+
+    def test_cold_process_within_budget(self):
+        # The revocation filter and the search backend are set up by the first request
+        # a process serves; that one-off work doesn't count against the view's budget
+        revocations.reset()
+        search._fts_table_cache.clear()
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(client.get('/api/notes/', {"q": "n1"}).status_code, 200)
+
+    def test_over_budget_raises(self):
+        with patch.object(NoteViewSet, "query_budget", {"list": 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "(NoteViewSet): 4 queries, budget is 1"):
+                self.client.get('/api/notes/')
+            # Budgets are per action
+            self.assertEqual(self.client.get(f'/api/notes/{Note.objects.first().pk}/').status_code, 200)
+
+    def test_repeated_query_shape_is_n_plus_one(self):
+        middleware = QueryAuditMiddleware(self.per_row_queries)
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            middleware(APIRequestFactory().get('/api/notes/'))
+        self.assertIn("possible N+1: 6 x", str(raised.exception))
+        self.assertIn("notes/tests.py:", str(raised.exception))
+
+    def test_writes_over_budget_raise(self):
+        def delete_all(request):
+            # Per-note pre/post_delete handlers: the same statements once per row
+            Note.objects.filter(user=self.user).delete()
+            return JsonResponse({})
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, "possible N+1: 6 x"):
+            QueryAuditMiddleware(delete_all)(APIRequestFactory().delete('/api/notes/'))
+        with patch.object(NoteViewSet, "query_budget", {"create": 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "(NoteViewSet):"):
+                self.client.post('/api/notes/', {"title": "over", "content": ""}, format='json')
+
+    def test_login_within_budget(self):
+        credentials = {"email": "quinn@example.com", "password": "Password123!"}
+        for name in ('auth-login', 'auth-login-async'):
+            with self.subTest(view=name):
+                cache.clear()
+                r = APIClient().post(reverse(name), credentials, format='json')
+                self.assertEqual(r.status_code, 200)
+
+    def test_streamed_responses_are_logged_not_failed(self):
+        def per_row_stream(request):
+            return StreamingHttpResponse(
+                str(Note.objects.filter(pk=note.pk, title__in=["a", "b"]).exists()) for note in Note.objects.all()
+            )
+
+        response = QueryAuditMiddleware(per_row_stream)(APIRequestFactory().get('/api/notes/export/'))
+        with self.assertLogs("notes_backend.querybudget", "WARNING") as logs:
+            self.assertEqual(b"".join(response.streaming_content), b"False" * 6)
+        self.assertIn("possible N+1: 6 x", logs.output[0])
+
+    def test_log_mode_is_sampled(self):
+        middleware = QueryAuditMiddleware(self.per_row_queries)
+        request = APIRequestFactory().get('/api/notes/')
+        with self.settings(QUERY_AUDIT_MODE="log", QUERY_AUDIT_SAMPLE_RATE=1.0):
+            with self.assertLogs("notes_backend.querybudget", "WARNING") as logs:
+                self.assertEqual(middleware(request).status_code, 200)
+        self.assertIn("possible N+1", logs.output[0])
+        with self.settings(QUERY_AUDIT_MODE="log", QUERY_AUDIT_SAMPLE_RATE=0.0), self.assertNoLogs("notes_backend.querybudget"):
+            middleware(request)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"], REPLICA_MAX_LAG_SECONDS=5, REPLICA_HEALTH_CHECK_INTERVAL=5)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        health.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='rene', email='rene@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.note = Note.objects.create(user=self.user, title="n", content="x")
+        self.lags = {"replica1": 0.0, "replica2": 0.0}
+        patcher = patch("notes_backend.replicas.replica_lag", side_effect=self.replica_lag)
+        self.lag_check = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def replica_lag(self, alias):
+        lag = self.lags[alias]
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+    def read_alias(self, method="get"):
+        request = APIRequestFactory().generic(method.upper(), "/api/notes/")
+        request.user = self.user
+        return choose_read_alias(request)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        token = _read_alias.set("replica2")
+        try:
+            with patch.object(connection, "in_atomic_block", False):
+                self.assertEqual(router.db_for_read(Note), "replica2")
+            # Inside a transaction on the primary (as in this test), reads stay on it
+            self.assertEqual(router.db_for_read(Note), "default")
+        finally:
+            _read_alias.reset(token)
+        self.assertEqual(router.db_for_write(Note, instance=Note(pk=1)), "default")
+        self.assertFalse(router.allow_migrate("replica1", "notes"))
+        self.assertIsNone(router.allow_migrate("default", "notes"))
+
+    def test_safe_reads_use_healthy_replicas(self):
+        self.assertIn(self.read_alias(), {"replica1", "replica2"})
+        self.assertIsNone(self.read_alias("post"))
+        self.lags["replica1"] = DatabaseError("down")
+        self.lags["replica2"] = 30.0
+        health.reset()
+        with self.assertLogs("notes_backend.replicas", "WARNING"):
+            self.assertIsNone(self.read_alias())
+        # Health is cached between checks
+        self.lags["replica1"] = 0.0
+        self.assertIsNone(self.read_alias())
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertIsNone(self.read_alias())
+
+    def test_writes_make_reads_sticky(self):
+        self.assertEqual(self.client.get('/api/notes/').status_code, 200)
+        self.assertFalse(is_sticky(self.user))
+        r = self.client.post('/api/notes/', {"title": "new", "content": "y"}, format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertTrue(is_sticky(self.user))
+        self.assertIsNone(self.read_alias())
+        # Failed writes don't
+        cache.clear()
+        self.client.post('/api/tags/', {}, format='json')
+        self.assertFalse(is_sticky(self.user))
+
+    def test_replica_responses_are_not_cached(self):
+        # Even a replica that reports no lag may not have the latest write yet
+        for path in ('/api/tags/', '/api/notes/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+                self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+        # Responses read from the primary are
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.client.get('/api/tags/')
+            self.assertEqual(self.client.get('/api/tags/')["X-Cache"], "HIT")
+
+
+class FastJsonTests(TestCase):
+    def test_renderer_matches_drf(self):
+        data = {
+            "when": datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            "price": Decimal("1.50"),
+            "text": "caf\u00e9 \u2028 line",
+            "big": 2 ** 70,
+            "nested": [{"a": None, 1: True}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser_falls_back_for_drf_errors(self):
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"title": "t\xc3\xa9"}')), {"title": "t\u00e9"})
+        with self.assertRaises(ParseError) as fast_error:
+            parser.parse(io.BytesIO(b'{"title": NaN}'))
+        with self.assertRaises(ParseError) as drf_error:
+            JSONParser().parse(io.BytesIO(b'{"title": NaN}'))
+        self.assertEqual(str(fast_error.exception), str(drf_error.exception))
+
+    def test_streaming_list_matches_regular_list(self):
+        cache.clear()
+        client = APIClient()
+        user = get_user_model().objects.create_user(username='jo', email='jo@example.com', password='Password123!')
+        client.force_authenticate(user)
+        for i in range(3):
+            Note.objects.create(user=user, title=f"n{i}", content="x" * 100)
+        regular = client.get('/api/notes/')
+        streamed = client.get('/api/notes/', {"format": "json-stream"})
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(json.loads(b"".join(streamed.streaming_content)), json.loads(regular.content))
+        self.assertIn("ETag", streamed)
+
+
+class NoteExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='kim', email='kim@example.com', password='Password123!')
+        other = User.objects.create_user(username='lee', email='lee@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(name="work")
+        for i in range(5):
+            Note.objects.create(user=self.user, title=f"Note {i}", content=f"body {i}").tags.add(tag)
+        Note.objects.create(user=other, title="private", content="not mine")
+
+    def test_ndjson_export_streams_own_notes_in_batches(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with patch("notes.views.export_notes", partial(export_notes, chunk_size=2)):
+                r = self.client.get('/api/notes/export/')
+                lines = b"".join(r.streaming_content).splitlines()
+        self.assertEqual(r['Content-Type'], "application/x-ndjson")
+        self.assertIn("attachment;", r['Content-Disposition'])
+        notes = [json.loads(line) for line in lines]
+        self.assertEqual([n['title'] for n in notes], [f"Note {i}" for i in range(5)])
+        self.assertEqual(notes[0]['tags'][0]['name'], "work")
+        # One tag query per batch of two notes, never one per note
+        self.assertEqual(sum('notes_note_tags' in q['sql'] for q in ctx.captured_queries), 3)
+
+    def test_markdown_zip_export(self):
+        r = self.client.get('/api/notes/export/', {"as": "markdown"})
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(r.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(len(names), 5)
+        first = archive.read(names[0]).decode()
+        self.assertTrue(first.startswith('---\ntitle: "Note 0"\ntags: ["work"]'))
+        self.assertTrue(first.endswith("body 0"))
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "notes.ndjson")
+            call_command("export_notes", "kim@example.com", output=path, stderr=io.StringIO())
+            with open(path, "rb") as exported:
+                self.assertEqual(len(exported.read().splitlines()), 5)
+
+
+class ImportNotesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='max', email='max@example.com', password='Password123!')
+        Tag.objects.create(name="existing")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        return path
+
+    def test_csv_import_upserts_tags_with_fixed_queries_per_chunk(self):
+        rows = "".join(f'Note {i},body {i},"existing, new{i % 2}"\n' for i in range(10))
+        path = self.write("notes.csv", "title,content,tags\n" + rows + ",no title,\n")
+        out, err = io.StringIO(), io.StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("import_notes", "max", path, chunk_size=5, stdout=out, stderr=err)
+        self.assertIn("Imported 10 notes (2 new tags)", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertIn("Skipped record 11: missing title", err.getvalue())
+        self.assertEqual(Tag.objects.count(), 3)
+        self.assertEqual(Note.objects.get(title="Note 3").tags.count(), 2)
+        # Note INSERTs happen once per chunk, never once per note
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "notes_note"')]
+        self.assertEqual(len(inserts), 2)
+        # Imported notes are searchable straight away
+        self.assertEqual(search_notes(Note.objects.all(), "body").count(), 10)
+
+    def test_long_tag_names_sharing_a_prefix_are_one_tag(self):
+        prefix = "x" * 50
+        import_records(self.user, [{"title": "long", "tags": [prefix + "-one", prefix + "-two"]}])
+        tag = Tag.objects.get(name=prefix)
+        self.assertEqual(tag.usage_count, 1)
+        self.assertEqual(TagUsage.objects.get(user=self.user, tag=tag).count, 1)
+        self.assertEqual(Note.objects.get(title="long").tags.count(), 1)
+
+    def test_export_round_trip(self):
+        note = Note.objects.create(user=self.user, title='Quoted "title"', content="line\n---\nmore")
+        note.tags.add(Tag.objects.get(name="existing"))
+        other = get_user_model().objects.create_user(username='nia', email='nia@example.com', password='Password123!')
+        for export_format, name in (("ndjson", "dump.ndjson"), ("markdown", "dump.zip")):
+            path = os.path.join(self.tmp.name, name)
+            call_command("export_notes", "max", format=export_format, output=path, stderr=io.StringIO())
+            call_command("import_notes", "nia", path, defer_maintenance=True, stdout=io.StringIO())
+        copies = Note.objects.filter(user=other)
+        self.assertEqual(copies.count(), 2)
+        for copy in copies:
+            self.assertEqual((copy.title, copy.content), (note.title, note.content))
+            self.assertEqual([tag.name for tag in copy.tags.all()], ["existing"])
+
+
+class NoteSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='ivy', email='ivy@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+
+    def test_deleting_owner_leaves_no_tombstones(self):
+        Note.objects.create(user=self.user, title="a", content="")
+        self.user.delete()
+        # SQLite defers foreign key checks to COMMIT, which TestCase never reaches
+        connection.check_constraints()
+        self.assertFalse(NoteTombstone.objects.exists())
+
+    def test_initial_snapshot_then_deltas(self):
+        keep = Note.objects.create(user=self.user, title="keep", content="")
+        edit = Note.objects.create(user=self.user, title="edit", content="")
+        gone = Note.objects.create(user=self.user, title="gone", content="")
+        r = self.client.get('/api/notes/sync/')
+        self.assertEqual({n['id'] for n in r.data['notes']}, {keep.id, edit.id, gone.id})
+        token = r.data['token']
+
+        r = self.client.get('/api/notes/sync/', {"token": token})
+        self.assertEqual((r.data['notes'], r.data['deleted']), ([], []))
+
+        edit.title = "edited"
+        edit.save()
+        gone_id = gone.id
+        gone.delete()
+        fresh = Note.objects.create(user=self.user, title="fresh", content="")
+        r = self.client.get('/api/notes/sync/', {"token": token})
+        self.assertEqual([n['id'] for n in r.data['notes']], [edit.id, fresh.id])
+        self.assertEqual(r.data['deleted'], [gone_id])
+        self.assertFalse(r.data['reset'])
+
+    def test_batches_resume_after_limit(self):
+        notes = [Note.objects.create(user=self.user, title=f"n{i}", content="") for i in range(5)]
+        tag = Tag.objects.create(name="shared")
+        # Retagging from the tag side gives several notes the same sequence number
+        tag.notes.add(*notes[1:4])
+        seen, token, more = [], None, True
+        while more:
+            params = {"limit": 2, **({"token": token} if token else {})}
+            r = self.client.get('/api/notes/sync/', params)
+            seen += [n['id'] for n in r.data['notes']]
+            token, more = r.data['token'], r.data['has_more']
+        self.assertEqual(sorted(seen), sorted(n.id for n in notes))
+
+    def test_pruned_tombstones_force_reset(self):
+        note = Note.objects.create(user=self.user, title="x", content="")
+        token = self.client.get('/api/notes/sync/').data['token']
+        note.delete()
+        prune_tombstones(timezone.now() + timedelta(days=1))
+        r = self.client.get('/api/notes/sync/', {"token": token})
+        self.assertTrue(r.data['reset'])
+
+    def test_one_sequence_number_per_write(self):
+        tag = Tag.objects.create(name="seq")
+        SyncCounter.next_value(SyncCounter.NOTES, self.user.pk)
+        with self.assertNumQueries(1):
+            before = SyncCounter.next_value(SyncCounter.NOTES, self.user.pk)
+        r = self.client.post('/api/notes/', {"title": "t", "content": "", "tag_ids": [tag.id]}, format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(SyncCounter.current(SyncCounter.NOTES, self.user.pk), before + 1)
+        self.assertEqual(Note.objects.get(pk=r.data['id']).change_seq, before + 1)
+
+    def test_counter_without_update_returning(self):
+        # SQLite before 3.35 (and backends without RETURNING) read the value back
+        first = SyncCounter.next_value(SyncCounter.NOTES, self.user.pk)
+        with patch.object(connection.features, "can_return_columns_from_insert", False), \
+                CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(SyncCounter.next_value(SyncCounter.NOTES, self.user.pk), first + 1)
+        self.assertFalse(any('RETURNING' in q['sql'] for q in ctx.captured_queries))
+
+    def test_streams_follow_one_author(self):
+        other = get_user_model().objects.create_user(username='jay', email='jay@example.com', password='Password123!')
+        mine = Note.objects.create(user=self.user, title="mine", content="")
+        theirs = Note.objects.create(user=other, title="theirs", content="")
+        seq = SyncCounter.current(SyncCounter.NOTES, self.user.pk)
+        Note.objects.create(user=other, title="more", content="")
+        # Another author's writes leave the caller's counter alone
+        self.assertEqual(SyncCounter.current(SyncCounter.NOTES, self.user.pk), seq)
+
+        r = self.client.get('/api/notes/sync/')
+        self.assertEqual([n['id'] for n in r.data['notes']], [mine.id])
+        self.assertEqual(self.client.get('/api/notes/sync/', {"scope": "mine"}).data['notes'], r.data['notes'])
+        r2 = self.client.get('/api/notes/sync/', {"user": other.pk})
+        self.assertEqual([n['id'] for n in r2.data['notes']][:1], [theirs.id])
+        # A token only resumes the stream it came from
+        r3 = self.client.get('/api/notes/sync/', {"user": other.pk, "token": r.data['token']})
+        self.assertEqual(r3.status_code, 400)
+        self.assertEqual(self.client.get('/api/notes/sync/', {"user": "me"}).status_code, 400)
+
+    def test_global_stream_tokens_resync(self):
+        note = Note.objects.create(user=self.user, title="x", content="")
+        token = signing.dumps({"s": 10 ** 9}, salt=TOKEN_SALT, compress=True)
+        r = self.client.get('/api/notes/sync/', {"token": token})
+        self.assertTrue(r.data['reset'])
+        self.assertEqual([n['id'] for n in r.data['notes']], [note.id])
+
+    def test_tag_saves_touch_notes_only_when_rendered_fields_change(self):
+        note = Note.objects.create(user=self.user, title="x", content="")
+        tag = Tag.objects.create(name="old", color="#111111")
+        note.tags.add(tag)
+        seq = Note.objects.get(pk=note.pk).change_seq
+        tag.save()
+        self.assertEqual(Note.objects.get(pk=note.pk).change_seq, seq)
+        for field, value in (("color", "#222222"), ("name", "new")):
+            with self.subTest(field=field), CaptureQueriesContext(connection) as ctx:
+                setattr(tag, field, value)
+                tag.save()
+            # A subquery rather than a list of the tagged note ids
+            self.assertFalse(any('"notes_note"."id" IN (%s' % note.pk in q['sql'] for q in ctx.captured_queries))
+            self.assertGreater(Note.objects.get(pk=note.pk).change_seq, seq)
+            seq = Note.objects.get(pk=note.pk).change_seq
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get('/api/notes/sync/', {"token": "nope"}).status_code, 400)
+
+
+class NoteKeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='dave', email='dave@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+        self.notes = [Note.objects.create(user=self.user, title=f"n{i}", content="same words") for i in range(5)]
+        # Identical timestamps force the id tiebreaker
+        Note.objects.filter(pk__in=[n.pk for n in self.notes[:3]]).update(updated_at=self.notes[0].updated_at)
+
+    def test_walk_forward_and_back_without_count(self):
+        expected = list(Note.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+        seen = []
+        url = '/api/notes/?pagination=cursor&page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            self.assertNotIn('count', r.data)
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+            seen.extend(n['id'] for n in r.data['results'])
+            last, url = r, r.data['next']
+        self.assertEqual(seen, expected)
+
+        r = self.client.get(last.data['previous'])
+        self.assertEqual([n['id'] for n in r.data['results']], expected[2:4])
+
+    def test_search_falls_back_to_page_numbers(self):
+        r = self.client.get('/api/notes/', {"pagination": "cursor", "q": "words"})
+        self.assertEqual(r.data['count'], 5)
+
+    def test_invalid_cursor(self):
+        r = self.client.get('/api/notes/', {"cursor": "bogus"})
+        self.assertEqual(r.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', "FTS5 search is SQLite-only")
+class SqliteFtsSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='carol', email='carol@example.com', password='Password123!')
+        self.client.force_authenticate(self.user)
+
+    def test_ranked_search_with_snippet(self):
+        body = Note.objects.create(user=self.user, title="misc", content="remember the deadline for taxes")
+        title = Note.objects.create(user=self.user, title="deadline", content="project deadline is friday")
+        Note.objects.create(user=self.user, title="other", content="nothing relevant")
+        r = self.client.get('/api/notes/', {"q": "deadline"})
+        self.assertEqual([n['id'] for n in r.data['results']], [title.id, body.id])
+        self.assertIn("<mark>deadline</mark>", r.data['results'][0]['snippet'])
+
+    def test_tagged_write_syncs_the_index_once(self):
+        tag = Tag.objects.create(name="errand")
+        # Not the user's first write, which also creates their change counter
+        SyncCounter.next_value(SyncCounter.NOTES, self.user.pk)
+        with self.assertNumQueries(19):
+            r = self.client.post('/api/notes/', {"title": "t", "content": "", "tag_ids": [tag.id]}, format='json')
+        self.assertEqual(r.status_code, 201)
+        for body in ({"tag_names": ["chore"]}, {"title": "renamed", "tag_names": ["chore", "home"]}):
+            with self.subTest(body=body), CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.patch(f"/api/notes/{r.data['id']}/", body, format='json').status_code, 200)
+            self.assertEqual(sum('notes_note_fts' in q['sql'] for q in ctx.captured_queries), 2)
+        r = self.client.get('/api/notes/', {"q": "chore"})
+        self.assertEqual([n['title'] for n in r.data['results']], ["renamed"])
+
+    def test_index_follows_tag_changes_and_deletes(self):
+        note = Note.objects.create(user=self.user, title="plain", content="text")
+        tag = Tag.objects.create(name="urgent")
+        note.tags.add(tag)
+        r = self.client.get('/api/notes/', {"q": "urgent"})
+        self.assertEqual([n['id'] for n in r.data['results']], [note.id])
+        tag.delete()
+        r = self.client.get('/api/notes/', {"q": "urgent"})
+        self.assertEqual(r.data['results'], [])
+        r = self.client.get('/api/notes/', {"q": "plain"})
+        self.assertEqual(len(r.data['results']), 1)
+        note.delete()
+        r = self.client.get('/api/notes/', {"q": "plain"})
+        self.assertEqual(r.data['results'], [])
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite only")
+class SqliteTuningTests(TestCase):
+    def setUp(self):
+        # SQLITE_TUNED is off by default: open a tuned connection to a scratch file
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_dict = {**connection.settings_dict, **settings.SQLITE_TUNED_DATABASE, "NAME": os.path.join(tmp.name, "tuned.sqlite3")}
+        self.tuned = connections["default"].__class__(settings_dict, alias="tuned")
+        self.addCleanup(self.tuned.close)
+
+    def pragma(self, name):
+        with self.tuned.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_and_immediate_transactions(self):
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), settings.SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(self.pragma("cache_size"), settings.SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(self.pragma("temp_store"), 2)
+        self.assertEqual(self.tuned.transaction_mode, "IMMEDIATE")
+        self.assertTrue(self.tuned.settings_dict["CONN_HEALTH_CHECKS"])
+
+
+class BenchmarkApiTests(TestCase):
+    def test_results_and_baseline_comparison(self):
+        options = {"sizes": "30,60", "users": 3, "requests": 2, "stdout": io.StringIO()}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.json")
+            call_command("benchmark_api", output=path, **options)
+            with open(path, encoding="utf-8") as handle:
+                results = json.load(handle)
+            self.assertEqual(results["database"], connection.vendor)
+            self.assertEqual(set(results["sizes"]), {"30", "60"})
+            stats = results["sizes"]["30"]["notes_list"]
+            self.assertLessEqual(stats["p50_ms"], stats["p95_ms"])
+            self.assertGreater(stats["queries"], 0)
+            # The generated data is deleted
+            self.assertFalse(Note.objects.exists())
+            self.assertFalse(Tag.objects.exists())
+            self.assertFalse(get_user_model().objects.filter(username__startswith="bench-").exists())
+
+            results["sizes"]["30"]["notes_list"]["queries"] -= 1
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump(results, handle)
+            with self.assertRaisesMessage(CommandError, "notes_list @ 30 notes"):
+                call_command("benchmark_api", baseline=path, tolerance=100, **options)
+
+    def test_refuses_existing_data_and_clears_leftovers(self):
+        options = {"sizes": "10", "users": 2, "requests": 1, "stdout": io.StringIO()}
+        User = get_user_model()
+        someone = User.objects.create_user(username='ruth', email='ruth@example.com', password='Password123!')
+        with self.assertRaisesMessage(CommandError, "--allow-existing-data"):
+            call_command("benchmark_api", **options)
+        someone.delete()
+
+        # Left behind by an interrupted run with the same seed
+        leftover = User.objects.create_user(username='bench-42-0', email='bench-42-0@example.com')
+        Note.objects.create(user=leftover, title="stale")
+        call_command("benchmark_api", **options)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Note.objects.exists())
+
+
+class AsyncNotesApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.factory = AsyncRequestFactory()
+        self.user = get_user_model().objects.create_user(username='kim', email='kim@example.com', password='Password123!')
+        self.other = get_user_model().objects.create_user(username='lou', email='lou@example.com', password='Password123!')
+        self.access = str(AccessToken.for_user(self.user))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        tags = [Tag.objects.create(name=name) for name in ("work", "home")]
+        for i in range(5):
+            note = Note.objects.create(user=self.user if i % 2 else self.other, title=f"memo {i}", content=f"memo body {i}")
+            note.tags.set(tags[:i % 3])
+        self.own = Note.objects.filter(user=self.user).first()
+
+    def call(self, view, method, path, data=None, token=True, **kwargs):
+        headers = {"Authorization": f"Bearer {self.access}"} if token else {}
+        if method in ("get", "delete"):
+            request = getattr(self.factory, method)(path, data, headers=headers)
+        else:
+            request = getattr(self.factory, method)(path, json.dumps(data), content_type='application/json', headers=headers)
+        return async_to_sync(view.as_view())(request, **kwargs)
+
+    @override_settings(API_RESPONSE_CACHE=False)
+    def test_reads_match_sync_views(self):
+        for query in ({}, {"page_size": 2, "page": 2}, {"q": "memo"}, {"ordering": "title"}):
+            with self.subTest(query=query):
+                response = self.call(AsyncNoteListView, 'get', '/api/notes/', query)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), self.client.get('/api/notes/', query).json())
+        response = self.call(AsyncNoteDetailView, 'get', f'/api/notes/{self.own.pk}/', pk=self.own.pk)
+        self.assertEqual(json.loads(response.content), self.client.get(f'/api/notes/{self.own.pk}/').json())
+        for query in ({}, {"page_size": 1, "page": 2}):
+            with self.subTest(query=query):
+                response = self.call(AsyncTagListView, 'get', '/api/tags/', query)
+                self.assertEqual(json.loads(response.content), self.client.get('/api/tags/', query).json())
+
+        self.assertEqual(self.call(AsyncNoteDetailView, 'get', '/api/notes/999/', pk=999).status_code, 404)
+        self.assertEqual(self.call(AsyncNoteListView, 'get', '/api/notes/', {"page": 9}).status_code, 404)
+
+    def test_search_on_a_cold_worker(self):
+        # A fresh worker hasn't looked for the FTS table yet: that must not happen on the event loop
+        search._fts_table_cache.clear()
+        response = self.call(AsyncNoteListView, 'get', '/api/notes/', {"q": "memo"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['count'], 5)
+
+    def test_writes(self):
+        response = self.call(AsyncNoteListView, 'post', '/api/notes/', {"title": "new", "content": "body", "tag_names": ["work"]})
+        self.assertEqual(response.status_code, 201)
+        created = json.loads(response.content)
+        self.assertEqual(created["user"]["id"], self.user.id)
+        self.assertEqual([tag["name"] for tag in created["tags"]], ["work"])
+        self.assertEqual(self.call(AsyncNoteListView, 'post', '/api/notes/', {"content": "no title"}).status_code, 400)
+
+        path = f'/api/notes/{created["id"]}/'
+        response = self.call(AsyncNoteDetailView, 'patch', path, {"title": "renamed"}, pk=created["id"])
+        self.assertEqual(json.loads(response.content)["title"], "renamed")
+        response = self.call(AsyncNoteDetailView, 'put', path, {"title": "t", "content": "c"}, pk=created["id"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.call(AsyncNoteDetailView, 'delete', path, pk=created["id"]).status_code, 204)
+        self.assertFalse(Note.objects.filter(pk=created["id"]).exists())
+
+    def test_authentication_and_permissions(self):
+        response = self.call(AsyncNoteListView, 'get', '/api/notes/', token=False)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response.headers)
+        theirs = Note.objects.filter(user=self.other).first()
+        path = f'/api/notes/{theirs.pk}/'
+        self.assertEqual(self.call(AsyncNoteDetailView, 'get', path, pk=theirs.pk).status_code, 200)
+        self.assertEqual(self.call(AsyncNoteDetailView, 'delete', path, pk=theirs.pk).status_code, 403)
+        self.assertTrue(Note.objects.filter(pk=theirs.pk).exists())
+
+    def test_throttled(self):
+        with patch.object(SlidingWindowRateThrottle, "allow_request", return_value=False), \
+                patch.object(SlidingWindowRateThrottle, "wait", return_value=2.5):
+            response = self.call(AsyncNoteListView, 'get', '/api/notes/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "3")
+
+    @override_settings(DATABASE_REPLICAS=["replica1"])
+    def test_reads_go_through_replica_choice(self):
+        with patch("notes_backend.async_api.choose_read_alias", return_value=None) as choose:
+            self.assertEqual(self.call(AsyncNoteListView, 'get', '/api/notes/').status_code, 200)
+            self.assertEqual(choose.call_count, 1)
+            self.call(AsyncNoteListView, 'post', '/api/notes/', {"title": "new", "content": "body"})
+            self.assertEqual(choose.call_count, 1)
+
+    def test_unsupported_requests_use_sync_view(self):
+        with patch.object(NoteViewSet, "list", autospec=True, side_effect=lambda self, request: JsonResponse({"sync": True})):
+            for query in ({"user__id": self.user.id}, {"pagination": "cursor"}, {"format": "json"}):
+                with self.subTest(query=query):
+                    response = self.call(AsyncNoteListView, 'get', '/api/notes/', query)
+                    self.assertEqual(json.loads(response.content), {"sync": True})
+
+
 # Create your tests here.
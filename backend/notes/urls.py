@@ -1,15 +1,26 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 
-from .views import NoteViewSet, TagViewSet
+from .async_views import AsyncNoteDetailView, AsyncNoteListView, AsyncTagListView
+from .views import NoteViewSet, TagViewSet, CacheStatsView
 
 
 router = DefaultRouter()
 router.register(r'notes', NoteViewSet, basename='notes')
 router.register(r'tags', TagViewSet, basename='tags')
 
+# Same paths and names as the router's routes, which they shadow when enabled
+async_urlpatterns = [
+    path('notes/', AsyncNoteListView.as_view(), name='notes-list'),
+    re_path(r'^notes/(?P<pk>\d+)/$', AsyncNoteDetailView.as_view(), name='notes-detail'),
+    path('tags/', AsyncTagListView.as_view(), name='tags-list'),
+]
+
 
 urlpatterns = [
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    *(async_urlpatterns if settings.NOTES_ASYNC_API else []),
     path('', include(router.urls)),
 ]
 
@@ -1,18 +1,37 @@
-from rest_framework import viewsets, permissions, filters
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.conf import settings
-from django.db.models import Q
-try:
-    # Optional: available when using PostgreSQL
-    from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
-    POSTGRES_SEARCH_AVAILABLE = True
-except Exception:
-    POSTGRES_SEARCH_AVAILABLE = False
 
-from .models import Note, Tag
-from .serializers import NoteSerializer, TagSerializer
+from notes_backend.renderers import StreamingResponseMixin
+from notes_backend.replicas import ReplicaReadMixin
+
+from .cache import (
+    CachedResponseMixin,
+    SCOPE_ALL_NOTES,
+    SCOPE_TAGS,
+    SCOPE_TAG_USAGE,
+    SCOPE_USERS,
+    cache_stats,
+    note_scope,
+    user_scope,
+)
+from .conditional import ConditionalNoteMixin
+from .fastlist import FastNoteListMixin
+from .models import Note, NoteTombstone, Tag
+from .pagination import NotePagination, NoteKeysetPagination, TagPagination
+from .search import search_notes, attach_search_snippets
+from .bulk import validate_operations, apply_operations
+from .export import EXPORT_FORMATS, EXPORT_NDJSON, export_filename, export_notes
+from .serializers import NoteSerializer, TagSerializer, TagCountSerializer, BulkNoteSerializer, NoteSyncSerializer
+from .sync import InvalidSyncToken, get_changes
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -24,10 +43,18 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return getattr(obj, 'user_id', None) == getattr(request.user, 'id', None)
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteOrderingFilter(filters.OrderingFilter):
+    def get_default_ordering(self, view):
+        # Keep the relevance ordering applied by search unless ?ordering= is given
+        if view.request.query_params.get("q"):
+            return None
+        return super().get_default_ordering(view)
+
+
+class NoteViewSet(StreamingResponseMixin, ReplicaReadMixin, ConditionalNoteMixin, CachedResponseMixin, FastNoteListMixin, viewsets.ModelViewSet):
     serializer_class = NoteSerializer
     permission_classes = (permissions.IsAuthenticated, IsOwnerOrReadOnly)
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, NoteOrderingFilter]
     # Filters: allow filtering by author id/username and (legacy) tag name
     filterset_fields = ["user__id", "user__username", "tags__name"]
     # Basic search fallback (when not using Postgres full-text)
@@ -35,52 +62,232 @@ class NoteViewSet(viewsets.ModelViewSet):
     ordering_fields = ["title", "updated_at", "created_at"]
     ordering = ["-updated_at"]
     throttle_scope = 'notes'
+    cache_resource = 'notes'
+    # Checked by QueryAuditMiddleware: a page costs the same few queries whatever its
+    # size (token user and the periodic revocation sync, conditional validator, count,
+    # page, tags, search snippets), so a per-row query breaks the budget
+    query_budget = {"list": 8, "retrieve": 7}
     
-    class NotePagination(PageNumberPagination):
-        page_size = 20
-        page_size_query_param = "page_size"
-        max_page_size = 100
-    
+    # Kept as an attribute for code that referenced the former nested class
+    NotePagination = NotePagination
     pagination_class = NotePagination
+    keyset_pagination_class = NoteKeysetPagination
+    # Most notes returned by one /sync/ call (?limit= may ask for fewer)
+    sync_batch_size = 500
+    # ?view=summary: what a note card needs, without the full content
+    summary_fields = ("id", "title", "preview", "snippet", "user", "created_at", "updated_at")
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or a cursor from a previous page) selects keyset pagination.
+        # Ranked search and custom orderings can't be seeked on (updated_at, id), so
+        # they keep using page numbers.
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            use_keyset = (
+                (params.get("pagination") == "cursor" or "cursor" in params)
+                and not params.get("q")
+                and params.get("ordering", "-updated_at") == "-updated_at"
+            )
+            self._paginator = self.keyset_pagination_class() if use_keyset else self.pagination_class()
+        return self._paginator
+
+    def get_requested_fields(self):
+        """Field names selected by ?fields= / ?view=summary on the list, or None for all."""
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = self._parse_requested_fields()
+        return self._requested_fields
+
+    def _parse_requested_fields(self):
+        params = self.request.query_params
+        if getattr(self, "action", None) != "list":
+            return None
+        if params.get("fields"):
+            fields = {name.strip() for name in params["fields"].split(",") if name.strip()}
+            readable = {name for name, field in NoteSerializer().fields.items() if not field.write_only}
+            unknown = fields - readable - {"preview"}
+            if unknown:
+                raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}."})
+            return fields
+        if params.get("view") == "summary":
+            return set(self.summary_fields)
+        return None
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
-        # Base queryset
-        queryset = Note.objects.select_related("user").prefetch_related("tags")
+        fields = self.get_requested_fields()
+        if fields is None:
+            # Base queryset
+            queryset = Note.objects.select_related("user").prefetch_related("tags")
+        else:
+            queryset = self.get_sparse_queryset(fields)
         
-        # Advanced search: Prefer PostgreSQL full-text search if available and configured
+        # Advanced search: PostgreSQL full-text over the stored search vector when
+        # available, icontains otherwise
         query = self.request.query_params.get("q")
         if query:
-            use_pg = getattr(settings, "USE_POSTGRES", False) and POSTGRES_SEARCH_AVAILABLE
-            if use_pg:
-                vector = (
-                    SearchVector("title", weight="A") +
-                    SearchVector("content", weight="B")
-                )
-                search_query = SearchQuery(query)
-                queryset = (
-                    queryset
-                    .annotate(search=vector)
-                    .annotate(rank=SearchRank(vector, search_query))
-                    .filter(search=search_query)
-                    .order_by("-rank", "-updated_at")
-                )
-            else:
-                # Fallback to icontains filter across key fields
-                queryset = queryset.filter(
-                    Q(title__icontains=query) |
-                    Q(content__icontains=query)
-                ).order_by("-updated_at")
+            queryset = search_notes(queryset, query)
         
         return queryset
 
+    def get_sparse_queryset(self, fields):
+        # Load only the requested columns (plus the pagination/validator keys), and
+        # skip the author join and tag prefetch unless they are rendered
+        columns = {"id", "updated_at"} | (fields & {"title", "content", "created_at"})
+        queryset = Note.objects.all()
+        if "user" in fields:
+            queryset = queryset.select_related("user")
+            columns |= {"user__id", "user__email", "user__username"}
+        if "tags" in fields:
+            queryset = queryset.prefetch_related("tags")
+        if "preview" in fields:
+            # Only the first characters of content leave the database
+            queryset = queryset.annotate(preview=Substr("content", 1, settings.NOTES_PREVIEW_LENGTH + 1))
+        return queryset.only(*columns)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        query = self.request.query_params.get("q")
+        fields = self.get_requested_fields()
+        if page is not None and query and (fields is None or "snippet" in fields):
+            attach_search_snippets(page, query)
+        return page
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=["post"], url_path="bulk", serializer_class=BulkNoteSerializer)
+    def bulk(self, request):
+        """Apply a batch of create/update/delete operations in one transaction."""
+        serializer = BulkNoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The notes validated are the notes written: they stay locked until commit
+        with transaction.atomic():
+            plan, errors = validate_operations(self, serializer.validated_data["operations"])
+            if errors:
+                # All or nothing: report every failing item and apply none
+                return Response({"applied": False, "results": errors}, status=status.HTTP_400_BAD_REQUEST)
+            results = apply_operations(request.user, plan)
+        written = [result["id"] for result in results if result["op"] != "delete"]
+        notes = Note.objects.select_related("user").prefetch_related("tags").in_bulk(written)
+        context = self.get_serializer_context()
+        for result in results:
+            if result["id"] in notes and result["op"] != "delete":
+                result["note"] = NoteSerializer(notes[result["id"]], context=context).data
+        return Response({"applied": True, "results": results})
+
+    @action(detail=False, methods=["get"], url_path="sync", serializer_class=NoteSyncSerializer)
+    def sync(self, request):
+        """
+        Delta sync: notes created/updated and ids deleted since ``?token=``.
 
-class TagViewSet(viewsets.ModelViewSet):
+        Omit the token for a full snapshot; keep calling with the returned token
+        while ``has_more`` is true. ``reset`` means the old token predates pruned
+        tombstones and the client must replace its cache with this snapshot.
+        Each stream follows one author's notes: the caller's by default (also
+        ``?scope=mine``), another author's with ``?user=<id>``.
+        """
+        notes = Note.objects.select_related("user").prefetch_related("tags")
+        try:
+            owner = int(request.query_params.get("user", request.user.pk))
+        except ValueError:
+            raise ValidationError({"user": "Must be a user id."})
+        try:
+            limit = min(int(request.query_params.get("limit", self.sync_batch_size)), self.sync_batch_size)
+        except ValueError:
+            limit = self.sync_batch_size
+        try:
+            changes = get_changes(
+                notes, NoteTombstone.objects.all(), owner, request.query_params.get("token"), limit=max(limit, 1)
+            )
+        except InvalidSyncToken:
+            raise ValidationError({"token": "Invalid sync token."})
+        return Response(NoteSyncSerializer(changes, context=self.get_serializer_context()).data)
+
+    @action(detail=False, methods=["get"], url_path="export", throttle_scope="export")
+    def export(self, request):
+        """
+        Stream all of the caller's notes with their tags: ``?as=ndjson`` (default,
+        one /api/notes/ item per line) or ``?as=markdown`` (ZIP of .md files).
+        """
+        export_format = request.query_params.get("as", EXPORT_NDJSON)
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({"as": f"Choose one of: {', '.join(EXPORT_FORMATS)}."})
+        content_type, _ = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            export_notes(Note.objects.filter(user=request.user), export_format),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="{export_filename(request.user, export_format)}"'
+        return response
+
+    def get_cache_scopes(self):
+        if self.action == "retrieve":
+            scope = note_scope(self.kwargs.get("pk"))
+        else:
+            # Author-filtered lists ("Mine") only depend on that author's notes
+            author = self.request.query_params.get("user__id", "")
+            scope = user_scope(author) if author.isdigit() else SCOPE_ALL_NOTES
+        return [scope, SCOPE_TAGS, SCOPE_USERS]
+
+
+class TagViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (permissions.IsAuthenticated,)
     queryset = Tag.objects.all().order_by("name")
+    pagination_class = TagPagination
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ["name"]
+    ordering_fields = ["name", "created_at", "note_count"]
+    ordering = ["name"]
+    cache_resource = 'tags'
+    count_modes = ("all", "mine")
+
+    def get_count_mode(self):
+        """``?counts=all|mine`` on list: add note_count from the materialized usage counters."""
+        if self.action != "list":
+            return None
+        mode = self.request.query_params.get("counts")
+        if mode is None:
+            return None
+        if mode not in self.count_modes:
+            raise ValidationError({"counts": f"Expected one of: {', '.join(self.count_modes)}."})
+        return mode
+
+    def get_queryset(self):
+        mode = self.get_count_mode()
+        if mode == "mine":
+            return Tag.objects.filter(
+                usages__user=self.request.user, usages__count__gt=0
+            ).annotate(note_count=F("usages__count"))
+        # note_count is always annotated so ?ordering=-note_count works without ?counts
+        return Tag.objects.annotate(note_count=F("usage_count"))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_count_mode() and "ordering" not in self.request.query_params:
+            # A tag cloud wants the most used tags first
+            queryset = queryset.order_by("-note_count", "name")
+        return queryset
+
+    def get_serializer_class(self):
+        return TagCountSerializer if self.get_count_mode() else TagSerializer
+
+    def get_cache_scopes(self):
+        if self.get_count_mode():
+            return [SCOPE_TAGS, SCOPE_TAG_USAGE]
+        return [SCOPE_TAGS]
+
+
+class CacheStatsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(cache_stats())
 
 # Create your views here.
@@ -0,0 +1,137 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, permissions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from accounts.authentication import CachedJWTAuthentication
+from notes.cache import call_cache_bound
+
+from .renderers import FastJSONRenderer
+from .replicas import _read_alias, choose_read_alias, replica_aliases
+from .throttling import get_throttle_cache
+
+
+# Conditional request headers; only the sync views evaluate them
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since", "If-Match", "If-Unmodified-Since")
+
+
+def json_response(data, status, headers=None, **renderer_context):
+    """A rendered DRF Response, so ``response.data`` is there as with the sync views."""
+    response = Response(data, status=status, headers=headers)
+    response.accepted_renderer = FastJSONRenderer()
+    response.accepted_media_type = FastJSONRenderer.media_type
+    response.renderer_context = {**renderer_context, 'response': response}
+    return response.render()
+
+
+def error_response(exc):
+    """A DRF-shaped JSON response for an APIException raised outside DRF's own views."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = json_response(data, exc.status_code)
+    if isinstance(exc, (exceptions.AuthenticationFailed, exceptions.NotAuthenticated)):
+        response['WWW-Authenticate'] = f'{jwt_settings.AUTH_HEADER_TYPES[0]} realm="api"'
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = str(math.ceil(exc.wait))
+    return response
+
+
+class AsyncAPIView(View):
+    """
+    Base for API views served natively under ASGI. Bearer-token
+    authentication, permissions and the DRF throttles run on the event loop:
+    the user and throttle counters come from the cache (inline for the
+    local-memory cache, see call_cache_bound) and only ORM calls leave the
+    loop. Handlers return ``(data, status)``.
+
+    ``can_serve()`` decides which requests the handlers implement; the rest
+    (other parameters, conditional requests, the browsable API, ...) are
+    passed to the sync ``fallback`` view in a worker thread, so the URL keeps
+    the sync view's full behaviour.
+    """
+
+    authentication_class = CachedJWTAuthentication
+    permission_classes = (permissions.IsAuthenticated,)
+    throttle_scope = None
+    fallback = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Bearer tokens only, no session: nothing for CSRF to protect
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def can_serve(self, request) -> bool:
+        if 'format' in request.GET or 'text/html' in request.headers.get('Accept', ''):
+            return False
+        return not any(header in request.headers for header in CONDITIONAL_HEADERS)
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, None) if method in self.http_method_names and method != 'options' else None
+        if handler is None or not self.can_serve(request):
+            if self.fallback is None:
+                return self.http_method_not_allowed(request, *args, **kwargs)
+            return await sync_to_async(self.fallback)(request, *args, **kwargs)
+
+        drf_request = Request(request, parsers=[parser() for parser in drf_settings.DEFAULT_PARSER_CLASSES])
+        token = None
+        try:
+            await self.initial(drf_request)
+            if drf_request.method in permissions.SAFE_METHODS and replica_aliases():
+                # As ReplicaReadMixin; the ORM's worker threads inherit the context
+                token = _read_alias.set(await sync_to_async(choose_read_alias)(drf_request))
+            data, status = await handler(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return error_response(exc)
+        finally:
+            if token is not None:
+                _read_alias.reset(token)
+        return self.render(drf_request, data, status)
+
+    async def initial(self, request):
+        forced = getattr(request._request, '_force_auth_user', None)
+        if forced is not None:
+            # APIClient.force_authenticate() in tests
+            result = (forced, getattr(request._request, '_force_auth_token', None))
+        else:
+            result = await self.authentication_class().aauthenticate(request)
+        request.user, request.auth = result if result is not None else (AnonymousUser(), None)
+        for permission in self.get_permissions():
+            if not permission.has_permission(request, self):
+                self.permission_denied(request, permission)
+        await self.check_throttles(request)
+
+    def get_permissions(self):
+        return [permission() for permission in self.permission_classes]
+
+    def permission_denied(self, request, permission):
+        if not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        raise exceptions.PermissionDenied(getattr(permission, 'message', None), getattr(permission, 'code', None))
+
+    def check_object_permissions(self, request, obj):
+        for permission in self.get_permissions():
+            if not permission.has_object_permission(request, self, obj):
+                self.permission_denied(request, permission)
+
+    async def check_throttles(self, request):
+        cache = get_throttle_cache()
+        waits = []
+        for throttle in (throttle_class() for throttle_class in drf_settings.DEFAULT_THROTTLE_CLASSES):
+            if not await call_cache_bound(cache, throttle.allow_request, request, self):
+                waits.append(throttle.wait())
+        if waits:
+            raise exceptions.Throttled(max(waits))
+
+    def render(self, request, data, status):
+        response = json_response(data, status, {'Allow': ', '.join(self._allowed_methods())}, view=self, request=request)
+        patch_vary_headers(response, ['Accept'])
+        return response
@@ -0,0 +1,311 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.serializers import ListSerializer
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# The sampled request being measured, if any. Context variables follow the
+# request into sync_to_async threads, so async views are measured too.
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestRecord:
+    __slots__ = ("started", "db_queries", "db_time", "phases", "depth")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.phases = defaultdict(float)
+        self.depth = defaultdict(int)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the sampled request; nested blocks count once."""
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    record.depth[phase] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.depth[phase] -= 1
+        if not record.depth[phase]:
+            record.phases[phase] += time.perf_counter() - start
+
+
+class TimedListSerializer(ListSerializer):
+    @property
+    def data(self):
+        with timed("serialize"):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """
+    Count building the response's ``.data`` as serializer time in the request
+    metrics: one timer per response on the outermost serializer (or its
+    many=True list), none per row or per nested serializer.
+    """
+
+    @property
+    def data(self):
+        with timed("serialize"):
+            return super().data
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        # Unless Meta.list_serializer_class picked another list serializer
+        if type(serializer) is ListSerializer:
+            serializer.__class__ = TimedListSerializer
+        return serializer
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.db_queries += 1
+        record.db_time += time.perf_counter() - start
+
+
+def _install_query_wrapper(connection) -> None:
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_query_wrapper(connection)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+class MetricsRegistry:
+    """In-process metrics, one set per worker; Prometheus scrapes each worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+            self.sizes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+            self.db_queries = defaultdict(int)
+            self.db_seconds = defaultdict(float)
+            self.phase_seconds = defaultdict(float)
+
+    def observe(self, view, method, status, duration, record, size) -> None:
+        key = (view, method)
+        with self.lock:
+            self.requests[view, method, status] += 1
+            self.durations[key].observe(duration)
+            self.db_queries[key] += record.db_queries
+            self.db_seconds[key] += record.db_time
+            for phase, seconds in record.phases.items():
+                self.phase_seconds[view, method, phase] += seconds
+            if size is not None:
+                self.sizes[key].observe(size)
+
+    def render(self, sample_rate) -> str:
+        def labels(view, method):
+            return f'view="{view}",method="{method}"'
+
+        lines = [
+            "# HELP http_metrics_sample_rate Fraction of requests measured; divide counts by it to estimate totals.",
+            "# TYPE http_metrics_sample_rate gauge",
+            f"http_metrics_sample_rate {sample_rate}",
+        ]
+        with self.lock:
+            lines += ["# HELP http_requests_total Sampled requests.", "# TYPE http_requests_total counter"]
+            lines += [
+                f'http_requests_total{{{labels(view, method)},status="{status}"}} {count}'
+                for (view, method, status), count in sorted(self.requests.items())
+            ]
+            lines += ["# HELP http_request_duration_seconds Request latency.", "# TYPE http_request_duration_seconds histogram"]
+            for key, histogram in sorted(self.durations.items()):
+                lines += histogram.lines("http_request_duration_seconds", labels(*key))
+            lines += ["# HELP http_response_size_bytes Response body size.", "# TYPE http_response_size_bytes histogram"]
+            for key, histogram in sorted(self.sizes.items()):
+                lines += histogram.lines("http_response_size_bytes", labels(*key))
+            lines += ["# HELP http_db_queries_total Database queries.", "# TYPE http_db_queries_total counter"]
+            lines += [f"http_db_queries_total{{{labels(*key)}}} {count}" for key, count in sorted(self.db_queries.items())]
+            lines += ["# HELP http_db_seconds_total Time in database queries.", "# TYPE http_db_seconds_total counter"]
+            lines += [f"http_db_seconds_total{{{labels(*key)}}} {seconds:.6f}" for key, seconds in sorted(self.db_seconds.items())]
+            lines += ["# HELP http_phase_seconds_total Time in serialization and rendering.", "# TYPE http_phase_seconds_total counter"]
+            lines += [
+                f'http_phase_seconds_total{{{labels(view, method)},phase="{phase}"}} {seconds:.6f}'
+                for (view, method, phase), seconds in sorted(self.phase_seconds.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def sample_rate() -> float:
+    return getattr(settings, "METRICS_SAMPLE_RATE", 1.0)
+
+
+def view_label(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    # URL names keep the label set bounded, unlike raw paths
+    return match.view_name if match is not None and match.view_name else "unmatched"
+
+
+def server_timing(record, duration) -> str:
+    entries = [f'db;dur={record.db_time * 1000:.1f};desc="{record.db_queries} queries"']
+    entries += [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in record.phases.items()]
+    entries.append(f"total;dur={duration * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class InstrumentationMiddleware:
+    """
+    Measure a METRICS_SAMPLE_RATE fraction of requests: latency, database
+    queries and their time, serializer/render time (see ``timed``) and
+    response size. Results go to the /metrics registry and, when
+    METRICS_SERVER_TIMING is on, the Server-Timing header. Unsampled requests
+    only pay for one random() call and a context variable lookup per query.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(_on_connection_created, dispatch_uid="notes_backend.metrics")
+        for connection in connections.all(initialized_only=True):
+            _install_query_wrapper(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= sample_rate():
+            return self.get_response(request)
+        record = RequestRecord()
+        token = _current.set(record)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, record)
+
+    async def __acall__(self, request):
+        if random.random() >= sample_rate():
+            return await self.get_response(request)
+        record = RequestRecord()
+        token = _current.set(record)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, record)
+
+    def finish(self, request, response, record):
+        duration = time.perf_counter() - record.started
+        view = view_label(request)
+        if getattr(settings, "METRICS_SERVER_TIMING", settings.DEBUG):
+            response["Server-Timing"] = server_timing(record, duration)
+
+        def observe(size):
+            registry.observe(view, request.method, response.status_code, duration, record, size)
+
+        if response.streaming and getattr(response, "is_async", False):
+            observe(None)
+        elif response.streaming:
+            # Counted as the body is sent; the latency above is time to first byte
+            response.streaming_content = self.counted(response.streaming_content, record, observe)
+        else:
+            observe(len(response.content))
+
+        slow_ms = getattr(settings, "METRICS_SLOW_REQUEST_MS", None)
+        if slow_ms and duration * 1000 >= slow_ms:
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms",
+                request.method, request.path, view, duration * 1000, record.db_queries, record.db_time * 1000,
+            )
+        return response
+
+    @staticmethod
+    def counted(chunks, record, observe):
+        # Queries made while the body is generated count towards the request
+        size = 0
+        chunks = iter(chunks)
+        try:
+            while True:
+                token = _current.set(record)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            observe(size)
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of this worker's registry. Needs the
+    METRICS_AUTH_TOKEN bearer token; without a token it is only served in DEBUG.
+    """
+    token = getattr(settings, "METRICS_AUTH_TOKEN", "")
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(sample_rate()), content_type="text/plain; version=0.0.4; charset=utf-8")
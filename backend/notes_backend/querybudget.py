@@ -0,0 +1,220 @@
+import contextvars
+import logging
+import os
+import random
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+AUDIT_OFF = "off"
+AUDIT_LOG = "log"
+AUDIT_RAISE = "raise"
+
+# The audited request, if any (see metrics._current for why a context variable)
+_current = contextvars.ContextVar("query_audit", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalize_sql(sql) -> str:
+    """The shape of a statement: literals and IN lists replaced, so per-row repeats compare equal."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql.replace("%s", "?"))
+    return _SPACE.sub(" ", sql).strip()
+
+
+def call_site() -> str:
+    """``file:line`` of the innermost project frame that led to the query."""
+    base = os.path.normcase(str(settings.BASE_DIR))
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.normcase(os.path.abspath(frame.f_code.co_filename))
+        if filename.startswith(base) and filename != _THIS_FILE and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, base)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+
+class QueryAudit:
+    __slots__ = ("view", "budget", "queries")
+
+    def __init__(self):
+        self.view = None
+        self.budget = None
+        self.queries = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.queries.values())
+
+    def repeated(self, threshold):
+        """``((sql, site), count)`` for the statements run ``threshold`` times or more from one place."""
+        return [(key, count) for key, count in self.queries.most_common() if count >= threshold]
+
+    def problems(self, threshold):
+        problems = []
+        if self.budget is not None and self.total > self.budget:
+            problems.append(f"{self.total} queries, budget is {self.budget}")
+        for (sql, site), count in self.repeated(threshold):
+            problems.append(f"possible N+1: {count} x {sql!r} from {site}")
+        return problems
+
+
+@contextmanager
+def unaudited():
+    """
+    Leave the block's queries out of the request's count: per-process warm-up
+    (filling an in-memory cache) that the first request happens to trigger.
+    """
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    audit = _current.get()
+    if audit is not None:
+        audit.queries[normalize_sql(sql), call_site()] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_wrapper(connection) -> None:
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_query_wrapper(connection)
+
+
+def view_budget(view_func, method):
+    """
+    The query budget a view declares with ``query_budget``: an int for every
+    handler, or a dict keyed by viewset action ("list", "retrieve", ...) or
+    lowercase HTTP method.
+    """
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    budget = getattr(view_class, "query_budget", None)
+    if not isinstance(budget, dict):
+        return view_class, budget
+    method = method.lower()
+    action = (getattr(view_func, "actions", None) or {}).get(method)
+    return view_class, budget.get(action, budget.get(method))
+
+
+def audit_mode() -> str:
+    return getattr(settings, "QUERY_AUDIT_MODE", AUDIT_OFF)
+
+
+class QueryAuditMiddleware:
+    """
+    Count the queries of a request by statement shape and call site. A request
+    goes over budget when it runs more queries than its view's ``query_budget``;
+    a shape repeated QUERY_AUDIT_REPEAT_THRESHOLD times from one call site is
+    reported as a likely N+1. QUERY_AUDIT_MODE "raise" (development and tests)
+    turns either into a QueryBudgetExceeded error, writes included, "log" logs
+    a warning for a QUERY_AUDIT_SAMPLE_RATE fraction of requests. Streamed
+    responses are only ever logged: they are checked after their body has been
+    sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(_on_connection_created, dispatch_uid="notes_backend.querybudget")
+        for connection in connections.all(initialized_only=True):
+            _install_query_wrapper(connection)
+
+    def sampled(self) -> bool:
+        mode = audit_mode()
+        if mode == AUDIT_RAISE:
+            return True
+        return mode == AUDIT_LOG and random.random() < getattr(settings, "QUERY_AUDIT_SAMPLE_RATE", 1.0)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        audit = QueryAudit()
+        token = _current.set(audit)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, audit)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        audit = QueryAudit()
+        token = _current.set(audit)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, audit)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        audit = _current.get()
+        if audit is not None:
+            view_class, audit.budget = view_budget(view_func, request.method)
+            audit.view = getattr(view_class, "__name__", getattr(view_func, "__name__", "?"))
+        return None
+
+    def finish(self, request, response, audit):
+        if response.streaming and not getattr(response, "is_async", False):
+            # Checked once the body, and the queries producing it, are done
+            response.streaming_content = self.audited(response.streaming_content, request, audit)
+        else:
+            self.check(request, audit)
+        return response
+
+    def audited(self, chunks, request, audit):
+        chunks = iter(chunks)
+        while True:
+            token = _current.set(audit)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            finally:
+                _current.reset(token)
+            yield chunk
+        # Part of the body is already sent: raising now would only cut it short
+        self.check(request, audit, can_raise=False)
+
+    def check(self, request, audit, can_raise=True) -> None:
+        problems = audit.problems(getattr(settings, "QUERY_AUDIT_REPEAT_THRESHOLD", 5))
+        if not problems:
+            return
+        message = f"{request.method} {request.path} ({audit.view}): " + "; ".join(problems)
+        if can_raise and audit_mode() == AUDIT_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning("Query audit: %s", message)
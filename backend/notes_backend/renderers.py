@@ -0,0 +1,127 @@
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .metrics import timed
+
+try:
+    import orjson
+except ImportError:  # optional dependency: fall back to the stdlib encoder
+    orjson = None
+
+
+# Same output as DRF's JSONRenderer with the default COMPACT_JSON/UNICODE_JSON:
+# datetimes/dataclasses go through DRF's encoder instead of orjson's formats.
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson else 0
+)
+
+
+def orjson_available() -> bool:
+    return orjson is not None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it is installed.
+
+    Indented output (browsable API, ``Accept: application/json; indent=4``) and
+    anything orjson can't encode are handed to the stdlib renderer, so output
+    matches DRF's byte for byte.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timed("render"):
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+            return self.dumps(data)
+
+    def dumps(self, data) -> bytes:
+        # orjson only produces the default compact, non-ASCII-escaped style
+        if orjson is not None and self.compact and not self.ensure_ascii:
+            try:
+                ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+            except (orjson.JSONEncodeError, TypeError):
+                pass  # e.g. integers over 64 bits
+            else:
+                # Like JSONRenderer: U+2028/U+2029 are valid JSON but break JavaScript
+                return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return JSONRenderer.render(self, data)
+
+
+class StreamingJSONRenderer(FastJSONRenderer):
+    """
+    Render list responses as a stream of chunks instead of one bytes object.
+
+    ``render()`` returns a generator: a list (or the ``results`` of a paginated
+    envelope, which may itself be a lazy iterable) is encoded item by item and
+    flushed every ``chunk_size`` bytes. Views that include
+    ``StreamingResponseMixin`` send it as a StreamingHttpResponse; elsewhere
+    Django joins the chunks into a regular response.
+
+    Selected with ``?format=json-stream``.
+    """
+
+    format = 'json-stream'
+    chunk_size = 64 * 1024
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict) and 'results' in data:
+            return self._stream_envelope(data)
+        if isinstance(data, (list, tuple)) or hasattr(data, '__next__'):
+            return self._stream_items(data, b'[', b']')
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def encode(self, item) -> bytes:
+        # render() maps None to an empty body; as a list item it is null
+        return b'null' if item is None else self.dumps(item)
+
+    def _stream_envelope(self, data):
+        head = {key: value for key, value in data.items() if key != 'results'}
+        # '{"count":1,...' + ',"results":[' ... ']}'
+        opening = self.encode(head)[:-1] + (b',' if head else b'') + b'"results":['
+        return self._stream_items(data['results'], opening, b']}')
+
+    def _stream_items(self, items, opening, closing):
+        buffer = [opening]
+        size = len(opening)
+        first = True
+        for item in items:
+            chunk = self.encode(item) if first else b',' + self.encode(item)
+            first = False
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= self.chunk_size:
+                yield b''.join(buffer)
+                buffer, size = [], 0
+        buffer.append(closing)
+        yield b''.join(buffer)
+
+
+class StreamingResponseMixin:
+    """Send responses rendered by StreamingJSONRenderer as StreamingHttpResponse."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if not isinstance(response, Response) or not isinstance(renderer, StreamingJSONRenderer):
+            return response
+        if response.status_code != 200 or response.data is None:
+            return response
+        content_type = response.accepted_media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        streaming = StreamingHttpResponse(
+            renderer.render(response.data, response.accepted_media_type, response.renderer_context),
+            status=response.status_code,
+            content_type=content_type,
+        )
+        for header, value in response.items():
+            if header.lower() != 'content-type':
+                streaming[header] = value
+        return streaming
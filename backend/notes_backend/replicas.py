@@ -0,0 +1,182 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework import permissions
+
+
+logger = logging.getLogger(__name__)
+
+# Replica chosen for the reads of the current request; None reads from the primary
+_read_alias = contextvars.ContextVar("read_alias", default=None)
+
+_POSTGRES_LAG_SQL = (
+    # Zero when everything received has been replayed: an idle primary sends nothing,
+    # which would otherwise read as ever-growing lag. NULL (not a standby) also means zero.
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def replica_lag(alias) -> float:
+    """Seconds ``alias`` is behind the primary; raises DatabaseError when it's unreachable."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(_POSTGRES_LAG_SQL)
+            lag = cursor.fetchone()[0]
+            return float(lag or 0)
+        # Other backends have no replication to measure; a working connection is enough
+        cursor.execute("SELECT 1")
+    return 0.0
+
+
+class ReplicaHealth:
+    """
+    Per-process view of which replicas may serve reads. Each replica is
+    checked at most every REPLICA_HEALTH_CHECK_INTERVAL seconds; one that
+    can't be reached or lags more than REPLICA_MAX_LAG_SECONDS is skipped
+    until a later check finds it healthy again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            # alias -> (checked at, lag in seconds or None when unhealthy)
+            self.checked = {}
+
+    def lag(self, alias):
+        """Last measured lag of ``alias``, re-checked when stale; None if it shouldn't be used."""
+        now = time.monotonic()
+        interval = getattr(settings, "REPLICA_HEALTH_CHECK_INTERVAL", 5)
+        with self.lock:
+            checked_at, lag = self.checked.get(alias, (None, None))
+            if checked_at is not None and now - checked_at < interval:
+                return lag
+            # Claim the check so concurrent requests keep using the previous result
+            self.checked[alias] = (now, lag if checked_at is not None else None)
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError as exc:
+            logger.warning("Replica %s is unavailable: %s", alias, exc)
+            lag = None
+        else:
+            if lag > getattr(settings, "REPLICA_MAX_LAG_SECONDS", 5):
+                logger.warning("Replica %s is %.1f s behind the primary", alias, lag)
+                lag = None
+        with self.lock:
+            self.checked[alias] = (now, lag)
+        return lag
+
+    def healthy(self):
+        return [alias for alias in replica_aliases() if self.lag(alias) is not None]
+
+
+health = ReplicaHealth()
+
+
+def get_sticky_cache():
+    return caches[getattr(settings, "REPLICA_STICKY_CACHE_ALIAS", "default")]
+
+
+def _sticky_key(user_id) -> str:
+    return f"replica:sticky:{user_id}"
+
+
+def mark_sticky(user) -> None:
+    """Send ``user``'s reads to the primary for REPLICA_STICKY_SECONDS, so they see their own writes."""
+    if getattr(user, "is_authenticated", False) and replica_aliases():
+        get_sticky_cache().set(_sticky_key(user.pk), True, timeout=getattr(settings, "REPLICA_STICKY_SECONDS", 15))
+
+
+def is_sticky(user) -> bool:
+    return getattr(user, "is_authenticated", False) and bool(get_sticky_cache().get(_sticky_key(user.pk)))
+
+
+def choose_read_alias(request):
+    """A healthy replica for ``request``'s reads, or None for the primary."""
+    if request.method not in permissions.SAFE_METHODS or not replica_aliases() or is_sticky(request.user):
+        return None
+    healthy = health.healthy()
+    return random.choice(healthy) if healthy else None
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica picked for the current request by
+    ReplicaReadMixin, everything else to the primary. Replicas are copies of
+    the primary, so nothing is migrated on them.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # Reads inside a transaction on the primary must see its uncommitted writes
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Explicit: otherwise saving an instance read from a replica would write to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve a view's safe requests from a healthy read replica, unless the user
+    wrote something within the last REPLICA_STICKY_SECONDS. Successful writes
+    through the view start that window.
+
+    Goes before CachedResponseMixin: a response read from a replica isn't
+    stored in the shared response cache. The replica may not have replayed the
+    write that advanced the cache version yet (measured lag is both sampled and
+    blind to WAL it hasn't received), and the stale page would then be served
+    to everyone under the new version.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # After authentication, so stickiness can be looked up for the user
+        self.read_alias = choose_read_alias(request)
+        self._read_alias_token = _read_alias.set(self.read_alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in permissions.SAFE_METHODS and response.status_code < 400:
+            mark_sticky(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            token = getattr(self, "_read_alias_token", None)
+            if token is not None:
+                _read_alias.reset(token)
+                self._read_alias_token = None
+
+    def get_cache_timeout(self):
+        if getattr(self, "read_alias", None) is not None:
+            return 0
+        return super().get_cache_timeout()
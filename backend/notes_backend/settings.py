@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'notes_backend.metrics.InstrumentationMiddleware',
+    'notes_backend.querybudget.QueryAuditMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'notes_backend.throttling.RateLimitHeadersMiddleware',
 ]
 
 ROOT_URLCONF = 'notes_backend.urls'
@@ -108,6 +112,143 @@ else:
         }
     }
 
+# Tuned SQLite (SQLITE_TUNED): WAL lets readers run alongside the single writer,
+# synchronous=NORMAL is durable in WAL mode up to the last checkpoint, busy_timeout
+# makes writers wait for the lock instead of failing with "database is locked", and
+# mmap/cache/temp_store keep hot pages and temporary b-trees in memory. Write
+# transactions start with BEGIN IMMEDIATE: a deferred transaction that reads first
+# and then writes can't wait for the lock (the busy handler isn't called for lock
+# upgrades) and fails outright. Connections are kept across requests, checked
+# before reuse. Off unless enabled (see .env.example): WAL leaves -wal/-shm files
+# next to the database and doesn't work on network filesystems.
+SQLITE_TUNED = config('SQLITE_TUNED', default=False, cast=bool)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int),
+    # Negative: KiB rather than pages
+    'cache_size': -config('SQLITE_CACHE_KIB', default=20000, cast=int),
+    'temp_store': 'MEMORY',
+}
+SQLITE_TUNED_DATABASE = {
+    'OPTIONS': {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+    },
+    'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+    'CONN_HEALTH_CHECKS': True,
+}
+if SQLITE_TUNED and not USE_POSTGRES:
+    DATABASES['default'].update(SQLITE_TUNED_DATABASE)
+
+# Read replicas: comma-separated hosts (host or host:port) with USE_POSTGRES, SQLite
+# files otherwise. Safe NoteViewSet/TagViewSet requests read from a healthy replica
+# (notes_backend.replicas) and their responses skip the API response cache; tests
+# run them against the default database.
+for number, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), 1):
+    if USE_POSTGRES:
+        host, _, port = replica.partition(':')
+        location = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    else:
+        location = {'NAME': replica}
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['notes_backend.replicas.ReplicaRouter']
+# Replicas further behind than this are skipped; how often each replica's health and
+# lag are checked; how long a user's reads stay on the primary after they write.
+# Keep the window above twice the lag so responses read before the write are gone.
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=5, cast=float)
+REPLICA_HEALTH_CHECK_INTERVAL = config('REPLICA_HEALTH_CHECK_INTERVAL', default=5, cast=float)
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=15, cast=int)
+REPLICA_STICKY_CACHE_ALIAS = config('REPLICA_STICKY_CACHE_ALIAS', default='default')
+
+# Cache
+# Local-memory (per process, LRU culled at MAX_ENTRIES) by default; point CACHE_BACKEND /
+# CACHE_LOCATION at e.g. django.core.cache.backends.redis.RedisCache to share across workers.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='notes-backend'),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int),
+        },
+    }
+}
+
+# Versioned per-user caching of notes/tags list and detail responses
+API_RESPONSE_CACHE = config('API_RESPONSE_CACHE', default=True, cast=bool)
+API_RESPONSE_CACHE_TIMEOUT = config('API_RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+API_CACHE_ALIAS = 'default'
+
+# Request instrumentation (notes_backend.metrics): fraction of requests measured,
+# Server-Timing header on measured responses (development only by default: it
+# tells clients how the time was spent), bearer token for /metrics (required
+# outside DEBUG: without one the endpoint isn't served) and the latency above which
+# a measured request is logged as slow
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=1.0, cast=float)
+METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', default=DEBUG, cast=bool)
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+METRICS_SLOW_REQUEST_MS = config('METRICS_SLOW_REQUEST_MS', default=1000, cast=int)
+
+# Query budgets and N+1 detection (notes_backend.querybudget): "raise" fails
+# requests in development (streamed ones are logged), "log" warns about a sample of
+# requests in production, "off" disables the check. Tests that rely on a mode
+# set it with override_settings.
+QUERY_AUDIT_MODE = config('QUERY_AUDIT_MODE', default='raise' if DEBUG else 'log')
+QUERY_AUDIT_SAMPLE_RATE = config('QUERY_AUDIT_SAMPLE_RATE', default=1.0 if QUERY_AUDIT_MODE == 'raise' else 0.05, cast=float)
+# Executions of one statement shape from one call site that count as an N+1
+QUERY_AUDIT_REPEAT_THRESHOLD = config('QUERY_AUDIT_REPEAT_THRESHOLD', default=5, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        app: {'handlers': ['console'], 'level': config('LOG_LEVEL', default='INFO'), 'propagate': False}
+        for app in ('notes_backend', 'notes', 'accounts')
+    },
+}
+
+# Sliding-window throttle counters; use a shared cache so all workers enforce the same limits
+THROTTLE_CACHE_ALIAS = config('THROTTLE_CACHE_ALIAS', default='default')
+
+# Seconds a JWT-authenticated request may reuse the cached user row (0 = query every time)
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+# Count its hits and misses in cache_stats() (two extra cache calls per request)
+AUTH_USER_CACHE_STATS = config('AUTH_USER_CACHE_STATS', default=False, cast=bool)
+
+# Upper bound on operations accepted by POST /api/notes/bulk/
+NOTES_BULK_MAX_OPERATIONS = config('NOTES_BULK_MAX_OPERATIONS', default=500, cast=int)
+
+# Render /api/notes/ lists from values() rows instead of NoteSerializer instances
+NOTES_FAST_LIST = config('NOTES_FAST_LIST', default=True, cast=bool)
+
+# Serve /api/notes/ and /api/tags/ with the native async views (notes.async_views);
+# only worth it under ASGI, where they avoid a thread hop per request
+NOTES_ASYNC_API = config('NOTES_ASYNC_API', default=False, cast=bool)
+
+# Characters of content returned as "preview" by /api/notes/?view=summary
+NOTES_PREVIEW_LENGTH = config('NOTES_PREVIEW_LENGTH', default=280, cast=int)
+
+# Deleted-note tombstones kept for /api/notes/sync/ (older tokens must resync)
+SYNC_TOMBSTONE_RETENTION_DAYS = config('SYNC_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Ranked ?q= search through the SQLite FTS5 index (falls back to icontains when off)
+SQLITE_FTS_SEARCH = config('SQLITE_FTS_SEARCH', default=True, cast=bool)
+
+
+# Login by email or username with a single user lookup
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailOrUsernameBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -153,16 +294,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when installed, DRF's stdlib json otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'notes_backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        # ?format=json-stream
+        'notes_backend.renderers.StreamingJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'notes_backend.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.ScopedRateThrottle',
+        'notes_backend.throttling.AnonRateThrottle',
+        'notes_backend.throttling.UserRateThrottle',
+        'notes_backend.throttling.ScopedRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
@@ -170,6 +323,7 @@ REST_FRAMEWORK = {
         # Scoped throttles
         'auth': '10/min',         # login/register/refresh
         'notes': '120/min',       # notes list/detail actions
+        'export': '30/hour',      # streamed full exports
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -199,6 +353,17 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-match',
+    'if-none-match',
+    'if-modified-since',
+    'if-unmodified-since',
+]
+
+# Let the frontend read validators for conditional requests (If-Match on writes)
+# and the rate limit headers
+CORS_EXPOSE_HEADERS = [
+    'etag', 'last-modified',
+    'retry-after', 'x-ratelimit-limit', 'x-ratelimit-remaining', 'x-ratelimit-reset',
 ]
 
 SIMPLE_JWT = {
@@ -206,9 +371,18 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(minutes=int(config('JWT_REFRESH_TOKEN_LIFETIME', default=60*24))),
     'SIGNING_KEY': config('JWT_SECRET_KEY', default=SECRET_KEY),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Each refresh returns a new refresh token and revokes the old one (accounts.revocation)
+    'ROTATE_REFRESH_TOKENS': config('JWT_ROTATE_REFRESH_TOKENS', default=True, cast=bool),
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Revoked-token lookups (accounts.revocation): per-process Bloom filter sizing,
+# how often it catches up with other workers' revocations when the cache isn't
+# shared, and how often it is rebuilt to drop pruned tokens
+TOKEN_REVOCATION_BLOOM_CAPACITY = config('TOKEN_REVOCATION_BLOOM_CAPACITY', default=100000, cast=int)
+TOKEN_REVOCATION_SYNC_INTERVAL = config('TOKEN_REVOCATION_SYNC_INTERVAL', default=5, cast=int)
+TOKEN_REVOCATION_REBUILD_INTERVAL = config('TOKEN_REVOCATION_REBUILD_INTERVAL', default=3600, cast=int)
+
 # drf-spectacular settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Simple Notes API',
@@ -233,4 +407,9 @@ PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
     'django.contrib.auth.hashers.Argon2PasswordHasher',
     'django.contrib.auth.hashers.ScryptPasswordHasher',
-]
\ No newline at end of file
+]
+
+# Pool used by the async register/login views (accounts.hashing): concurrent
+# hashes, and running + queued jobs before sign-ins get a 503
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=4, cast=int)
+PASSWORD_HASHING_MAX_PENDING = config('PASSWORD_HASHING_MAX_PENDING', default=64, cast=int)
\ No newline at end of file
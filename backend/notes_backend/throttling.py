@@ -0,0 +1,110 @@
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework import throttling
+
+
+def get_throttle_cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    """
+    Sliding-window counter: two integers per client and scope (this window's
+    and the previous window's request counts) instead of DRF's list of every
+    request timestamp. The previous window is weighted by how much of it still
+    overlaps the sliding window.
+
+    Counts are updated with the cache's atomic ``incr``, so with a shared
+    cache (THROTTLE_CACHE_ALIAS pointing at Redis or Memcached) every worker
+    enforces the same limit. The local-memory cache is the per-process
+    stand-in used in development and tests.
+    """
+
+    def get_window_keys(self):
+        window = int(self.now // self.duration)
+        return f'{self.key}:{window}', f'{self.key}:{window - 1}'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        cache = get_throttle_cache()
+        self.now = self.timer()
+        self.elapsed = self.now % self.duration
+        current_key, previous_key = self.get_window_keys()
+        # Count first and take it back if over the limit: incr is atomic, a read-then-write isn't
+        cache.add(current_key, 0, timeout=2 * self.duration + 1)
+        try:
+            self.current = cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(current_key, 1, timeout=2 * self.duration + 1)
+            self.current = 1
+        self.previous = cache.get(previous_key, 0)
+
+        allowed = self.estimate() <= self.num_requests
+        if not allowed:
+            cache.decr(current_key)
+            self.current -= 1
+        self.record_status(request)
+        return allowed
+
+    def estimate(self):
+        return self.previous * (1 - self.elapsed / self.duration) + self.current
+
+    def wait(self):
+        """Seconds until one more request fits in the sliding window."""
+        budget = self.num_requests - 1
+        if self.current <= budget and self.previous:
+            # Still this window, once enough of the previous one has slid out
+            wait = self.duration * (1 - (budget - self.current) / self.previous) - self.elapsed
+            if wait <= self.duration - self.elapsed:
+                return max(wait, 0)
+        wait = self.duration - self.elapsed
+        if self.current > budget:
+            # In the next window, this one's count takes the previous window's place
+            wait += self.duration * (1 - budget / self.current)
+        return wait
+
+    def record_status(self, request):
+        # Picked up by RateLimitHeadersMiddleware
+        status = {
+            'limit': self.num_requests,
+            'remaining': max(0, math.floor(self.num_requests - self.estimate())),
+            'reset': math.ceil(self.duration - self.elapsed),
+        }
+        http_request = getattr(request, '_request', request)
+        if not hasattr(http_request, 'rate_limits'):
+            http_request.rate_limits = []
+        http_request.rate_limits.append(status)
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class RateLimitHeadersMiddleware(MiddlewareMixin):
+    """Report the most restrictive throttle that checked the request in X-RateLimit-* headers."""
+
+    def process_response(self, request, response):
+        rate_limits = getattr(request, 'rate_limits', None)
+        if rate_limits:
+            status = min(rate_limits, key=lambda status: (status['remaining'], -status['reset']))
+            response['X-RateLimit-Limit'] = str(status['limit'])
+            response['X-RateLimit-Remaining'] = str(status['remaining'])
+            response['X-RateLimit-Reset'] = str(status['reset'])
+        return response
@@ -72,7 +72,7 @@ instance.interceptors.response.use(
       try {
         const { data } = await axios.post(`${API_BASE}/api/auth/refresh/`, { refresh });
         const newAccess = data?.access;
-        tokenStorage.setTokens({ access: newAccess });
+        tokenStorage.setTokens({ access: newAccess, refresh: data?.refresh });
         processQueue(null, newAccess);
         original.headers.Authorization = `Bearer ${newAccess}`;
         return instance(original);
@@ -102,7 +102,8 @@ export const api = {
     get: (id) => instance.get(`/notes/${id}/`).then((r) => r.data),
     create: (payload) => instance.post('/notes/', payload).then((r) => r.data),
     update: (id, payload) => instance.put(`/notes/${id}/`, payload).then((r) => r.data),
-    remove: (id) => instance.delete(`/notes/${id}/`).then((r) => r.data)
+    remove: (id) => instance.delete(`/notes/${id}/`).then((r) => r.data),
+    sync: (params) => instance.get('/notes/sync/', { params }).then((r) => r.data)
   },
   tags: {
     list: (params) => instance.get('/tags/', { params }).then((r) => r.data),